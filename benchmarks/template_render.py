@@ -0,0 +1,93 @@
+"""
+Микробенчмарк подстановки переменных в шаблон поста
+
+Сравнивает скомпилированный шаблон (handlers.template) с прежней построчной
+заменой и подстановку в заранее разобранный HTML с разбором при каждой отправке.
+
+Запуск из корня репозитория:
+    python benchmarks/template_render.py
+"""
+import random
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytz
+from telethon.extensions import html
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'bot'))
+
+from handlers.template import MOSCOW_TZ, RenderContext, compile_template
+
+
+def _legacy_replace_variables(text: str, chat_id: str = None, chat_title: str = None) -> str:
+    """Прежняя построчная замена переменных (только для сравнения в бенчмарке)"""
+    now = datetime.now(pytz.utc).astimezone(MOSCOW_TZ)
+    text = text.replace('{date}', now.strftime('%d.%m.%Y'))
+    text = text.replace('{time}', now.strftime('%H:%M'))
+    text = text.replace('{datetime}', now.strftime('%d.%m.%Y %H:%M'))
+    if chat_id:
+        text = text.replace('{chat_id}', str(chat_id))
+    if chat_title:
+        text = text.replace('{chat_title}', chat_title)
+    text = re.sub(r'\{random_number\}', lambda m: str(random.randint(1, 1000)), text)
+    
+    def replace_random_range(match):
+        try:
+            return str(random.randint(int(match.group(1)), int(match.group(2))))
+        except ValueError:
+            return match.group(0)
+    
+    return re.sub(r'\{random_number:(\d+):(\d+)\}', replace_random_range, text)
+
+
+def benchmark(renders: int = 10000, paragraphs: int = 40):
+    """
+    Сравнение скомпилированного шаблона с построчной заменой
+    
+    Args:
+        renders: Количество подстановок
+        paragraphs: Количество абзацев в шаблоне (определяет его размер)
+    """
+    paragraph = (
+        '<b>Акция {date}</b> для <i>{chat_title}</i>: скидка {random_number:5:50}% '
+        'до {time}! Промокод №{random_number}. Подробнее в описании канала. '
+    )
+    text = paragraph * paragraphs
+    
+    start = time.perf_counter()
+    for i in range(renders):
+        _legacy_replace_variables(text, str(i), 'Тестовая группа')
+    legacy = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    compiled = compile_template(text)
+    context = RenderContext()
+    for i in range(renders):
+        compiled.render(context, str(i), 'Тестовая группа')
+    fast = time.perf_counter() - start
+    
+    # Подстановка вместе с разбором HTML, который Telethon выполнял бы при каждой отправке
+    start = time.perf_counter()
+    for i in range(renders):
+        html.parse(compiled.render(context, str(i), 'Тестовая группа'))
+    parsed = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for i in range(renders):
+        compiled.render_message(context, str(i), 'Тестовая группа')
+    preparsed = time.perf_counter() - start
+    
+    print(f"Шаблон: {len(text)} символов, переменных: {len(compiled.slots)}, подстановок: {renders}")
+    print(f"Построчная замена:      {legacy:.3f} сек ({legacy / renders * 1e6:.1f} мкс на пост)")
+    print(f"Скомпилированный шаблон: {fast:.3f} сек ({fast / renders * 1e6:.1f} мкс на пост)")
+    print(f"Ускорение: x{legacy / fast:.1f}")
+    print(f"Подстановка + разбор HTML:      {parsed:.3f} сек ({parsed / renders * 1e6:.1f} мкс на пост)")
+    print(f"Подстановка в разобранный текст: {preparsed:.3f} сек ({preparsed / renders * 1e6:.1f} мкс на пост)")
+    print(f"Ускорение: x{parsed / preparsed:.1f}")
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,280 @@
+"""
+Архив истории публикаций (сжатые сегменты JSONL)
+"""
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# Слова для поиска: как в FTS5 (unicode61), подчеркивание считается разделителем
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+
+def search_words(search: str) -> List[str]:
+    """
+    Слова строки поиска в нижнем регистре
+    
+    Args:
+        search: Строка поиска пользователя
+    """
+    return WORD_PATTERN.findall((search or '').lower())
+
+
+def matches_search(record: Tuple, words: List[str]) -> bool:
+    """
+    Проверка записи истории на совпадение с поиском (каждое слово - начало слова
+    в названии, username или тексте ошибки), как при поиске по FTS5
+    
+    Args:
+        record: Кортеж (id, chat_id, chat_title, chat_username, status, error_message, published_at, retry_count)
+        words: Слова поиска (search_words)
+    """
+    text = ' '.join(value for value in (record[2], record[3], record[5]) if value)
+    tokens = WORD_PATTERN.findall(text.lower())
+    return all(any(token.startswith(word) for token in tokens) for word in words)
+
+
+class HistoryArchive:
+    """
+    Архив записей истории, вытесненных из базы данных
+    
+    Записи хранятся в неизменяемых сегментах history-YYYY-MM-<первый id>.jsonl.gz
+    (по одному сегменту на месяц публикации за проход архивации). Рядом с каждым
+    сегментом лежит индекс .idx.json: диапазоны id и дат, количество записей
+    по дням, чатам и статусам. Индексы позволяют не распаковывать сегменты,
+    которые не подходят под фильтры запроса.
+    
+    Методы синхронные (файловые операции), из корутин их вызывают через executor.
+    """
+    
+    SEGMENT_SUFFIX = '.jsonl.gz'
+    INDEX_SUFFIX = '.idx.json'
+    
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._segments = None
+        self._lock = threading.Lock()
+    
+    @property
+    def segments(self) -> List[dict]:
+        """Индексы всех сегментов (по возрастанию id)"""
+        with self._lock:
+            if self._segments is None:
+                self._segments = self._load_indexes()
+            return list(self._segments)
+    
+    def _load_indexes(self) -> List[dict]:
+        segments = []
+        if not self.directory.exists():
+            return segments
+        for index_file in self.directory.glob(f'*{self.INDEX_SUFFIX}'):
+            try:
+                index = json.loads(index_file.read_text(encoding='utf-8'))
+            except Exception as e:
+                print(f"Ошибка при чтении индекса архива {index_file.name}: {e}")
+                continue
+            # Сегмент без индекса (или индекс без сегмента) - незавершенная запись
+            if (self.directory / index['segment']).exists():
+                segments.append(index)
+        segments.sort(key=lambda index: index['min_id'])
+        return segments
+    
+    def _invalidate(self):
+        with self._lock:
+            self._segments = None
+    
+    def _write_segment(self, name: str, records: List[Tuple], cutoff: str) -> dict:
+        """Запись сегмента и его индекса (через временные файлы, чтобы не оставить половину)"""
+        days, chats, statuses = {}, {}, {}
+        for record in records:
+            day = time.strftime('%Y-%m-%d', time.gmtime(record[6]))
+            days[day] = days.get(day, 0) + 1
+            chats[record[1]] = chats.get(record[1], 0) + 1
+            statuses[record[4]] = statuses.get(record[4], 0) + 1
+        
+        index = {
+            'segment': name + self.SEGMENT_SUFFIX,
+            'rows': len(records),
+            'min_id': min(record[0] for record in records),
+            'max_id': max(record[0] for record in records),
+            'from': min(record[6] for record in records),
+            'to': max(record[6] for record in records),
+            'cutoff': cutoff,
+            'days': days,
+            'chats': chats,
+            'statuses': statuses
+        }
+        
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segment_path = self.directory / index['segment']
+        index_path = self.directory / (name + self.INDEX_SUFFIX)
+        
+        tmp_path = segment_path.with_name(segment_path.name + '.tmp')
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(list(record), ensure_ascii=False, separators=(',', ':')))
+                f.write('\n')
+        os.replace(tmp_path, segment_path)
+        
+        tmp_path = index_path.with_name(index_path.name + '.tmp')
+        tmp_path.write_text(json.dumps(index, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, index_path)
+        return index
+    
+    def append(self, records: List[Tuple], cutoff: str) -> List[dict]:
+        """
+        Добавление записей в архив новыми сегментами
+        
+        Args:
+            records: Записи истории по возрастанию id (время публикации - секунды Unix)
+            cutoff: Граница архивации в секундах Unix (все записи опубликованы раньше нее)
+        
+        Returns:
+            Индексы записанных сегментов
+        """
+        months = {}
+        for record in records:
+            months.setdefault(time.strftime('%Y-%m', time.gmtime(record[6])), []).append(record)
+        
+        written = []
+        for month, month_records in sorted(months.items()):
+            name = f'history-{month}-{month_records[0][0]}'
+            written.append(self._write_segment(name, month_records, cutoff))
+        self._invalidate()
+        return written
+    
+    def _read_segment(self, index: dict) -> List[Tuple]:
+        path = self.directory / index['segment']
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return [tuple(json.loads(line)) for line in f if line.strip()]
+    
+    def read(
+        self,
+        chat_id: str = None,
+        status: str = None,
+        start_date: str = None,
+        end_date: str = None,
+        search: str = None,
+        boundary: Optional[Tuple[str, int]] = None,
+        direction: str = 'next',
+        limit: int = None
+    ) -> List[Tuple]:
+        """
+        Чтение записей архива с фильтрами
+        
+        Args:
+            chat_id, status, search: Фильтры, как у истории в базе данных
+            start_date, end_date: Границы времени публикации (секунды Unix)
+            boundary: Граничная запись (published_at, id) для постраничного чтения
+            direction: 'next' - записи старше границы, 'prev' - новее
+            limit: Максимальное количество записей
+        
+        Returns:
+            Записи по убыванию (published_at, id) для 'next' и по возрастанию для 'prev'
+        """
+        words = search_words(search) if search else []
+        records = []
+        for index in self.segments:
+            # Отбрасываем сегменты по индексу, не распаковывая их
+            if start_date is not None and index['to'] < start_date:
+                continue
+            if end_date is not None and index['from'] > end_date:
+                continue
+            if chat_id and chat_id not in index['chats']:
+                continue
+            if status and status not in index['statuses']:
+                continue
+            if boundary and direction == 'next' and index['from'] > boundary[0]:
+                continue
+            if boundary and direction == 'prev' and index['to'] < boundary[0]:
+                continue
+            
+            for record in self._read_segment(index):
+                key = (record[6], record[0])
+                if chat_id and record[1] != chat_id:
+                    continue
+                if status and record[4] != status:
+                    continue
+                if start_date is not None and record[6] < start_date:
+                    continue
+                if end_date is not None and record[6] > end_date:
+                    continue
+                if boundary and direction == 'next' and not key < tuple(boundary):
+                    continue
+                if boundary and direction == 'prev' and not key > tuple(boundary):
+                    continue
+                if words and not matches_search(record, words):
+                    continue
+                records.append(record)
+        
+        records.sort(key=lambda record: (record[6], record[0]), reverse=(direction == 'next'))
+        return records[:limit] if limit is not None else records
+    
+    def delete_before(self, cutoff: int) -> int:
+        """
+        Удаление записей архива, опубликованных раньше cutoff (секунды Unix)
+        
+        Сегменты, целиком попадающие под удаление, удаляются; сегмент на границе
+        перезаписывается без удаленных записей.
+        
+        Returns:
+            Количество удаленных записей
+        """
+        removed = 0
+        for index in self.segments:
+            if index['from'] >= cutoff:
+                continue
+            name = index['segment'][:-len(self.SEGMENT_SUFFIX)]
+            if index['to'] < cutoff:
+                self._remove_segment(name)
+                removed += index['rows']
+                continue
+            records = self._read_segment(index)
+            kept = [record for record in records if record[6] >= cutoff]
+            self._write_segment(name, kept, index['cutoff'])
+            removed += len(records) - len(kept)
+        self._invalidate()
+        return removed
+    
+    def delete_all(self) -> int:
+        """
+        Удаление всего архива
+        
+        Returns:
+            Количество удаленных записей
+        """
+        removed = 0
+        for index in self.segments:
+            self._remove_segment(index['segment'][:-len(self.SEGMENT_SUFFIX)])
+            removed += index['rows']
+        self._invalidate()
+        return removed
+    
+    def _remove_segment(self, name: str):
+        # Сначала индекс: сегмент без индекса при загрузке игнорируется
+        for suffix in (self.INDEX_SUFFIX, self.SEGMENT_SUFFIX):
+            try:
+                (self.directory / (name + suffix)).unlink()
+            except FileNotFoundError:
+                pass
+    
+    def get_stats(self) -> dict:
+        """Статистика архива"""
+        segments = self.segments
+        size = 0
+        for index in segments:
+            try:
+                size += (self.directory / index['segment']).stat().st_size
+            except OSError:
+                pass
+        return {
+            'segments': len(segments),
+            'rows': sum(index['rows'] for index in segments),
+            'size_bytes': size,
+            'from': segments[0]['from'] if segments else None,
+            'to': max(index['to'] for index in segments) if segments else None
+        }
@@ -20,6 +20,12 @@ ADMIN_ID = int(os.getenv('ADMIN_ID', '0'))
 
 # Пароль для веб-интерфейса
 WEB_PASSWORD = os.getenv('WEB_PASSWORD', 'admin')
+# Максимальное время ожидания асинхронной операции веб-запроса в основном event loop (секунды)
+WEB_ASYNC_TIMEOUT = 120
+# Интервал пустых сообщений потока событий веб-интерфейса, чтобы соединение не закрывалось прокси (секунды)
+WEB_EVENTS_KEEPALIVE = 15
+# Количество последних ошибок публикации в событиях потока (полный список - в /api/status)
+WEB_EVENTS_ERRORS = 20
 
 # Пути к файлам
 BASE_DIR = Path(__file__).parent
@@ -29,12 +35,56 @@ POST_IMAGE_FILE = DATA_DIR / 'image.jpg'
 DATABASE_FILE = DATA_DIR / 'database.db'
 SESSION_FILE = DATA_DIR / 'session.session'
 
+# Настройки подключения к SQLite (одно соединение для записи и пул для чтения на все время работы)
+DB_READERS = int(os.getenv('DB_READERS', '3'))  # Количество соединений для чтения
+DB_CACHE_SIZE_KB = 8192  # Размер кэша страниц на соединение (КБ)
+DB_MMAP_SIZE = 64 * 1024 * 1024  # Размер отображения файла БД в память (байты)
+DB_BUSY_TIMEOUT = 5000  # Ожидание блокировки БД (мс)
+DB_CACHED_STATEMENTS = 256  # Количество подготовленных запросов в кэше соединения
+# Результаты публикаций записываются пачками: при накоплении N записей, через T секунд или в конце запуска
+PUBLICATION_BUFFER_SIZE = 50  # N: количество записей в пачке
+PUBLICATION_BUFFER_INTERVAL = 5  # T: максимальное время хранения записи в буфере (секунды)
+HISTORY_COUNT_LIMIT = 10000  # Точный подсчет истории с фильтрами, не покрытыми сводной статистикой, ограничен этим числом
+
+# Хранение истории публикаций: последние HISTORY_HOT_DAYS дней в базе, более старые записи -
+# в сжатых сегментах архива (0 - не архивировать)
+HISTORY_HOT_DAYS = int(os.getenv('HISTORY_HOT_DAYS', '90'))
+HISTORY_ARCHIVE_BATCH = 50000  # Записей в одной пачке архивации
+ARCHIVE_DIR = DATA_DIR / 'archive'
+
+# Дополнительные аккаунты для распределения групп (имена сессий через запятую).
+# Каждая сессия хранится в DATA_DIR/<имя>.session и должна быть авторизована заранее
+EXTRA_SESSIONS = [name.strip() for name in os.getenv('EXTRA_SESSIONS', '').split(',') if name.strip()]
+
 # Настройки публикации
 MIN_DELAY = 30  # Минимальная задержка между отправками (секунды)
 MAX_DELAY = 120  # Максимальная задержка между отправками (секунды)
 DEFAULT_INTERVAL = 24  # Интервал по умолчанию (часы)
 PUBLICATION_RETRY_ATTEMPTS = 3  # Количество попыток повторной отправки при ошибке
 PUBLICATION_RETRY_DELAY = 5  # Задержка между попытками (секунды)
+# Количество одновременных отправок (задержка MIN_DELAY..MAX_DELAY действует внутри каждого потока)
+PUBLICATION_CONCURRENCY = int(os.getenv('PUBLICATION_CONCURRENCY', '3'))
+# Окно публикации (минуты): если > 0, все группы равномерно распределяются по окну
+PUBLICATION_RUN_WINDOW = int(os.getenv('PUBLICATION_RUN_WINDOW', '0'))
+
+# Массовое добавление групп
+GROUP_IMPORT_MAX_ITEMS = 5000  # Максимальное количество элементов в одном запросе
+GROUP_IMPORT_CONCURRENCY = 5  # Количество одновременных запросов разрешения чатов
+GROUP_IMPORT_BATCH = 100  # Количество групп в одной транзакции записи
+
+# Настройки постоянного клиента отправки
+SENDER_KEEPALIVE_INTERVAL = 60  # Интервал проверки соединения с Telegram (секунды)
+SEND_TIMEOUT = 30  # Таймаут отправки одного сообщения (секунды)
+SEND_CHECK_MESSAGES = 10  # Сколько последних сообщений чата просматривать при проверке доставки после таймаута
+
+# Ограничение частоты запросов к Telegram
+RATE_LIMIT_RATE = 0.5  # Начальная скорость запросов аккаунта (в секунду)
+RATE_LIMIT_BURST = 3  # Размер корзины аккаунта (запросов подряд без ожидания)
+RATE_LIMIT_MIN_RATE = 0.05  # Минимальная скорость после FloodWait (в секунду)
+RATE_LIMIT_MAX_RATE = 1.0  # Максимальная скорость при адаптивном увеличении (в секунду)
+RATE_LIMIT_INCREASE_AFTER = 20  # Количество успешных запросов до увеличения скорости
+RATE_LIMIT_CHAT_INTERVAL = 3  # Минимальный интервал между запросами в один чат (секунды)
+RATE_LIMIT_MAX_WAIT = 900  # Максимальное ожидание FloodWait/медленного режима для одной группы (секунды)
 
 # Проверка обязательных параметров
 if API_ID == 0:
@@ -3,132 +3,732 @@
 """
 import aiosqlite
 import asyncio
+import base64
+import calendar
+import json
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import List, Optional, Tuple
-from config import DATABASE_FILE
+from config import (
+    DATABASE_FILE, POST_IMAGE_FILE, DB_READERS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE,
+    DB_BUSY_TIMEOUT, DB_CACHED_STATEMENTS, PUBLICATION_BUFFER_SIZE, PUBLICATION_BUFFER_INTERVAL,
+    HISTORY_COUNT_LIMIT, HISTORY_HOT_DAYS, HISTORY_ARCHIVE_BATCH, ARCHIVE_DIR
+)
+from archive import HistoryArchive
+from events import events
+from handlers.template import validate_template
+
+
+class SchemaVersionError(Exception):
+    """База данных создана более новой версией программы (схема неизвестна)"""
+
+
+class ConnectionPool:
+    """
+    Постоянные соединения с SQLite
+    
+    Одно соединение для записи (запись выполняется под общей блокировкой,
+    поэтому транзакции разных корутин не перемешиваются и не получают
+    SQLITE_BUSY) и несколько соединений только для чтения. Благодаря WAL
+    чтение не ждет записи. Соединения открываются при первом обращении
+    и живут до вызова close().
+    
+    Пул принадлежит основному event loop: веб-сервер выполняет корутины
+    в нем же (run_async), поэтому блокировки - обычные asyncio.Lock.
+    """
+    
+    def __init__(self, db_path, readers: int = DB_READERS):
+        self.db_path = db_path
+        self.readers_count = max(1, readers)
+        self._writer = None
+        self._readers = []
+        self._next_reader = 0
+        # asyncio.Lock привязывается к loop при первом ожидании, а не при создании
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+    
+    async def _connect(self, readonly: bool = False):
+        """Открытие соединения с настройкой pragma"""
+        # sqlite3 кэширует подготовленные запросы по тексту SQL
+        conn = aiosqlite.connect(self.db_path, cached_statements=DB_CACHED_STATEMENTS)
+        # Поток соединения не должен мешать завершению процесса
+        conn.daemon = True
+        await conn
+        await conn.execute(f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT}')
+        await conn.execute(f'PRAGMA cache_size = -{DB_CACHE_SIZE_KB}')
+        await conn.execute(f'PRAGMA mmap_size = {DB_MMAP_SIZE}')
+        await conn.execute('PRAGMA temp_store = MEMORY')
+        if readonly:
+            await conn.execute('PRAGMA query_only = 1')
+        else:
+            await conn.execute('PRAGMA journal_mode = WAL')
+            # В режиме WAL NORMAL не теряет целостность, но не делает fsync на каждый commit
+            await conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+    
+    async def open(self):
+        """Открытие соединений (если еще не открыты)"""
+        if self._writer is not None:
+            return
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            writer = await self._connect()
+            self._readers = [await self._connect(readonly=True) for _ in range(self.readers_count)]
+            self._writer = writer
+    
+    @asynccontextmanager
+    async def write(self):
+        """
+        Соединение для записи (монопольно на время блока)
+        
+        Незавершенная транзакция фиксируется при выходе из блока
+        и откатывается при исключении.
+        """
+        await self.open()
+        async with self._write_lock:
+            conn = self._writer
+            try:
+                yield conn
+                if conn.in_transaction:
+                    await conn.commit()
+            except BaseException:
+                if conn.in_transaction:
+                    await conn.rollback()
+                raise
+    
+    @asynccontextmanager
+    async def read(self):
+        """Соединение для чтения (соединения пула выдаются по очереди)"""
+        await self.open()
+        conn = self._readers[self._next_reader % len(self._readers)]
+        self._next_reader += 1
+        yield conn
+    
+    async def close(self):
+        """Закрытие всех соединений"""
+        async with self._open_lock:
+            async with self._write_lock:
+                connections = ([self._writer] if self._writer else []) + self._readers
+                self._writer = None
+                self._readers = []
+            for conn in connections:
+                try:
+                    await conn.close()
+                except Exception as e:
+                    print(f"Ошибка при закрытии соединения с БД: {e}")
+
+
+class GroupRegistry:
+    """
+    Реестр групп в памяти, общий для планировщика и веб-интерфейса
+    
+    Загружается из базы данных один раз и обновляется методами записи Database
+    после фиксации транзакции. Каждое изменение увеличивает version, поэтому
+    клиенты могут запрашивать только изменения после известной им версии.
+    Новая версия публикуется в поток событий веб-интерфейса (событие groups).
+    """
+    
+    FIELDS = ('chat_id', 'title', 'username', 'added_at', 'last_posted', 'is_disabled', 'account')
+    
+    def __init__(self):
+        # chat_id -> список значений FIELDS (порядок вставки - порядок добавления групп)
+        self._groups = {}
+        # chat_id -> версия последнего изменения (в том числе удаления)
+        self._changed = {}
+        # Версии отсчитываются от времени загрузки в миллисекундах, чтобы после
+        # перезапуска версия клиента не совпала с версией нового процесса
+        self._base = 0
+        self.version = 0
+        self.loaded = False
+        self._lock = threading.Lock()
+    
+    def load(self, rows: List[Tuple]):
+        """
+        Загрузка реестра
+        
+        Args:
+            rows: Строки групп в порядке FIELDS, по возрастанию added_at
+        """
+        with self._lock:
+            self._groups = {row[0]: list(row) for row in rows}
+            self._changed = {}
+            self._base = max(time.time_ns() // 1_000_000, self.version + 1)
+            self.version = self._base
+            self.loaded = True
+            self._publish()
+    
+    def _touch(self, chat_id: str):
+        self.version += 1
+        self._changed[chat_id] = self.version
+        self._publish()
+    
+    def _publish(self):
+        # Вызывается под блокировкой реестра: версии публикуются по порядку
+        events.publish('groups', {'version': self.version, 'count': len(self._groups)})
+    
+    def put(self, row: Tuple):
+        """Добавление или замена группы (строка в порядке FIELDS)"""
+        with self._lock:
+            if not self.loaded:
+                return
+            self._groups[row[0]] = list(row)
+            self._touch(row[0])
+    
+    def update(self, chat_id: str, **fields):
+        """Изменение полей группы (неизвестные группы пропускаются)"""
+        with self._lock:
+            group = self._groups.get(chat_id)
+            if group is None:
+                return
+            changed = False
+            for name, value in fields.items():
+                index = self.FIELDS.index(name)
+                if group[index] != value:
+                    group[index] = value
+                    changed = True
+            if changed:
+                self._touch(chat_id)
+    
+    def remove(self, chat_id: str):
+        """Удаление группы"""
+        with self._lock:
+            if self._groups.pop(chat_id, None) is not None:
+                self._touch(chat_id)
+    
+    def get(self, chat_id: str) -> Optional[Tuple]:
+        """Группа в порядке FIELDS или None"""
+        with self._lock:
+            group = self._groups.get(chat_id)
+            return tuple(group) if group else None
+    
+    def all(self) -> List[Tuple]:
+        """Все группы: (chat_id, title, username, added_at, last_posted, is_disabled)"""
+        with self._lock:
+            return [tuple(group[:6]) for group in self._groups.values()]
+    
+    def active(self) -> List[Tuple]:
+        """Группы не из черного списка: (chat_id, title, username, added_at, last_posted)"""
+        with self._lock:
+            return [tuple(group[:5]) for group in self._groups.values() if not group[5]]
+    
+    def accounts(self) -> dict:
+        """Закрепленные аккаунты {chat_id: account}"""
+        with self._lock:
+            return {chat_id: group[6] for chat_id, group in self._groups.items() if group[6] is not None}
+    
+    def count(self) -> int:
+        """Количество групп"""
+        return len(self._groups)
+    
+    def changes_since(self, version: Optional[int] = None) -> dict:
+        """
+        Изменения реестра после версии version
+        
+        Args:
+            version: Версия, известная клиенту (None - нужен полный список)
+        
+        Returns:
+            Словарь {'version', 'full', 'groups', 'removed'}: при full=True в groups
+            весь список, иначе только измененные группы, а в removed - id удаленных
+        """
+        with self._lock:
+            # Версия другого процесса (до перезапуска) или из будущего - отдаем все
+            if version is None or version < self._base or version > self.version:
+                return {
+                    'version': self.version,
+                    'full': True,
+                    'groups': [tuple(group[:6]) for group in self._groups.values()],
+                    'removed': []
+                }
+            changed = {chat_id for chat_id, changed_at in self._changed.items() if changed_at > version}
+            return {
+                'version': self.version,
+                'full': False,
+                'groups': [tuple(group[:6]) for chat_id, group in self._groups.items() if chat_id in changed],
+                'removed': [chat_id for chat_id in changed if chat_id not in self._groups]
+            }
 
 
 class Database:
     """Класс для работы с базой данных"""
     
+    # Поля групп в порядке GroupRegistry.FIELDS
+    GROUP_COLUMNS = 'chat_id, title, username, added_at, last_posted, COALESCE(is_disabled, 0), account'
+    
     def __init__(self):
         self.db_path = DATABASE_FILE
+        self.pool = ConnectionPool(self.db_path)
+        # Полнотекстовый поиск (FTS5) может отсутствовать в сборке SQLite
+        self.fts_enabled = False
+        # Архив истории: записи, опубликованные раньше archived_before ('YYYY-MM-DD'), хранятся в сегментах
+        self.archive = HistoryArchive(ARCHIVE_DIR)
+        self.archived_before = None
+        # Миграции проверены в этом процессе: повторная инициализация их не выполняет
+        self.schema_ready = False
+        # Кэш настроек и активного расписания: загружается один раз и обновляется
+        # методами записи, поэтому чтение не обращается к SQLite
+        self.post_interval_minutes = None
+        self._active_schedule = None
+        self._active_schedule_loaded = False
+        # Группы в памяти: счетчики и списки не читают таблицу groups
+        self.groups = GroupRegistry()
+    
+    async def close(self):
+        """Закрытие соединений с базой данных"""
+        await self.pool.close()
     
     async def init_db(self):
-        """Инициализация базы данных и создание таблиц"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Таблица групп
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS groups (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id TEXT UNIQUE NOT NULL,
-                    title TEXT,
-                    username TEXT,
-                    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_posted TIMESTAMP
-                )
-            ''')
+        """
+        Инициализация базы данных: применение миграций схемы и загрузка состояния
+        
+        Raises:
+            SchemaVersionError: Если база данных создана более новой версией программы
+        """
+        if not self.schema_ready:
+            await self.migrate()
+            self.schema_ready = True
+        
+        async with self.pool.read() as db:
+            # FTS5 может отсутствовать в сборке SQLite: тогда миграция пропускает индексы
+            cursor = await db.execute(
+                'SELECT 1 FROM sqlite_master WHERE type = "table" AND name = "publication_history_fts"'
+            )
+            self.fts_enabled = await cursor.fetchone() is not None
             
-            # Таблица настроек
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS settings (
-                    key TEXT PRIMARY KEY,
-                    value TEXT NOT NULL
-                )
-            ''')
+            cursor = await db.execute('SELECT key, value FROM settings')
+            settings = dict(await cursor.fetchall())
+            self.archived_before = settings.get('history_archived_before')
+            self.post_interval_minutes = int(settings.get('post_interval_minutes', 1440))
             
-            # Таблица шаблонов постов
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS post_templates (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    is_active INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            self._active_schedule = await self._read_active_schedule(db)
+            self._active_schedule_loaded = True
             
-            # Таблица расписаний публикаций
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS publication_schedules (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    schedule_type TEXT NOT NULL,
-                    schedule_data TEXT NOT NULL,
-                    is_active INTEGER DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            await self._load_groups(db)
+        
+        # Проверяем шаблоны заново: изображение поста могло появиться или исчезнуть
+        await self.revalidate_templates()
+    
+    async def migrate(self) -> int:
+        """
+        Применение недостающих миграций схемы
+        
+        Номер примененной миграции хранится в PRAGMA user_version. Если схема
+        актуальна, читается только он. Каждая миграция выполняется в своей
+        транзакции вместе с обновлением user_version.
+        
+        Returns:
+            Количество примененных миграций
             
-            # Таблица истории публикаций
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS publication_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id TEXT NOT NULL,
-                    chat_title TEXT,
-                    chat_username TEXT,
-                    status TEXT NOT NULL,
-                    error_message TEXT,
-                    published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    retry_count INTEGER DEFAULT 0
+        Raises:
+            SchemaVersionError: Если версия схемы больше известной этой программе
+        """
+        migrations = self._check_migrations()
+        latest = len(migrations)
+        
+        async with self.pool.write() as db:
+            cursor = await db.execute('PRAGMA user_version')
+            version = (await cursor.fetchone())[0]
+            if version == latest:
+                return 0
+            if version > latest:
+                raise SchemaVersionError(
+                    f"Версия схемы базы данных ({version}) новее поддерживаемой ({latest}). "
+                    f"Обновите программу или используйте другую базу данных"
                 )
-            ''')
             
-            # Индексы для быстрого поиска
-            await db.execute('''
-                CREATE INDEX IF NOT EXISTS idx_publication_history_chat_id 
-                ON publication_history(chat_id)
-            ''')
-            await db.execute('''
-                CREATE INDEX IF NOT EXISTS idx_publication_history_status 
-                ON publication_history(status)
-            ''')
-            await db.execute('''
-                CREATE INDEX IF NOT EXISTS idx_publication_history_published_at 
-                ON publication_history(published_at)
-            ''')
-            
-            # Вставляем настройки по умолчанию
+            for number, description, migration, transactional in migrations[version:]:
+                print(f"Миграция базы данных {number}: {description}")
+                if not transactional:
+                    # VACUUM и подобные команды не выполняются внутри транзакции
+                    await migration(db)
+                    await db.execute(f'PRAGMA user_version = {number}')
+                    continue
+                await db.execute('BEGIN IMMEDIATE')
+                try:
+                    await migration(db)
+                    await db.execute(f'PRAGMA user_version = {number}')
+                    await db.commit()
+                except BaseException:
+                    await db.rollback()
+                    raise
+        return latest - version
+    
+    def _check_migrations(self) -> List[Tuple]:
+        """
+        Список миграций (номер, описание, функция, в транзакции)
+        
+        Raises:
+            RuntimeError: Если номера миграций идут не подряд с 1
+        """
+        migrations = [
+            (1, 'базовая схема', self._migration_base, True),
+            (2, 'username групп', self._migration_group_username, True),
+            (3, 'интервал публикации в минутах', self._migration_interval_minutes, True),
+            (4, 'черный список групп', self._migration_group_disabled, True),
+            (5, "кэш peer'ов по аккаунтам", self._migration_peer_cache, True),
+            (6, 'результат проверки шаблонов', self._migration_template_validation, True),
+            (7, 'закрепление групп за аккаунтами', self._migration_group_account, True),
+            (8, 'время публикаций в секундах Unix', self._migration_epoch_timestamps, True),
+            (9, 'сводная статистика публикаций', self._migration_statistics, True),
+            (10, 'полнотекстовый поиск', self._migration_search_index, True),
+            (11, 'составные индексы истории', self._migration_history_indexes, True),
+            (12, 'инкрементальная очистка файла БД', self._migration_incremental_vacuum, False),
+        ]
+        for expected, migration in enumerate(migrations, start=1):
+            if migration[0] != expected:
+                raise RuntimeError(f"Миграции базы данных должны идти подряд: ожидалась {expected}, найдена {migration[0]}")
+        return migrations
+    
+    @staticmethod
+    async def _has_column(db, table: str, column: str) -> bool:
+        """Проверка наличия поля в таблице"""
+        cursor = await db.execute(f'PRAGMA table_info({table})')
+        return column in [row[1] for row in await cursor.fetchall()]
+    
+    async def _migration_base(self, db):
+        """
+        Таблицы исходной схемы
+        
+        Базы, созданные до появления миграций, уже содержат эти таблицы (возможно,
+        в старом виде) - их доводят до текущего вида следующие миграции.
+        """
+        # Таблица групп
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS groups (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id TEXT UNIQUE NOT NULL,
+                title TEXT,
+                username TEXT,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_posted INTEGER
+            )
+        ''')
+        
+        # Таблица настроек
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+        
+        # Таблица шаблонов постов
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS post_templates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                content TEXT NOT NULL,
+                is_active INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Таблица расписаний публикаций
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS publication_schedules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                schedule_type TEXT NOT NULL,
+                schedule_data TEXT NOT NULL,
+                is_active INTEGER DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Таблица истории публикаций
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS publication_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id TEXT NOT NULL,
+                chat_title TEXT,
+                chat_username TEXT,
+                status TEXT NOT NULL,
+                error_message TEXT,
+                published_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+                retry_count INTEGER DEFAULT 0
+            )
+        ''')
+        
+        # Индексы для быстрого поиска (составные - в миграции 11)
+        await db.execute('''
+            CREATE INDEX IF NOT EXISTS idx_publication_history_published_at 
+            ON publication_history(published_at)
+        ''')
+        
+        # Вставляем настройки по умолчанию
+        await db.execute('''
+            INSERT OR IGNORE INTO settings (key, value) 
+            VALUES ('post_interval_minutes', '1440')
+        ''')
+    
+    async def _migration_group_username(self, db):
+        """Поле username у групп"""
+        if not await self._has_column(db, 'groups', 'username'):
+            await db.execute('ALTER TABLE groups ADD COLUMN username TEXT')
+    
+    async def _migration_interval_minutes(self, db):
+        """Старый интервал публикации в часах переводим в минуты"""
+        cursor = await db.execute('SELECT value FROM settings WHERE key = "post_interval"')
+        old_interval = await cursor.fetchone()
+        if old_interval:
+            # Конвертируем часы в минуты
+            minutes = int(old_interval[0]) * 60
+            await db.execute(
+                'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                ('post_interval_minutes', str(minutes))
+            )
+            # Удаляем старый ключ
+            await db.execute('DELETE FROM settings WHERE key = "post_interval"')
+    
+    async def _migration_group_disabled(self, db):
+        """Поле is_disabled для черного списка групп"""
+        if not await self._has_column(db, 'groups', 'is_disabled'):
+            await db.execute('ALTER TABLE groups ADD COLUMN is_disabled INTEGER DEFAULT 0')
+    
+    async def _migration_peer_cache(self, db):
+        """
+        Кэш разрешенных peer'ов (чтобы не вызывать get_entity при каждой отправке)
+        
+        access_hash у каждого аккаунта свой, поэтому кэш раздельный по аккаунтам.
+        Кэш без разделения по аккаунтам переносится в аккаунт 'main'.
+        """
+        cursor = await db.execute('SELECT 1 FROM sqlite_master WHERE type = "table" AND name = "peer_cache"')
+        if await cursor.fetchone() and not await self._has_column(db, 'peer_cache', 'account'):
+            await db.execute('ALTER TABLE peer_cache RENAME TO peer_cache_old')
+            await db.execute('DROP INDEX IF EXISTS idx_peer_cache_username')
+        
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS peer_cache (
+                account TEXT NOT NULL DEFAULT 'main',
+                chat_id TEXT NOT NULL,
+                username TEXT,
+                peer_id INTEGER NOT NULL,
+                access_hash INTEGER,
+                peer_type TEXT NOT NULL,
+                title TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (account, chat_id)
+            )
+        ''')
+        
+        cursor = await db.execute('SELECT 1 FROM sqlite_master WHERE type = "table" AND name = "peer_cache_old"')
+        if await cursor.fetchone():
             await db.execute('''
-                INSERT OR IGNORE INTO settings (key, value) 
-                VALUES ('post_interval_minutes', '1440')
+                INSERT INTO peer_cache 
+                (account, chat_id, username, peer_id, access_hash, peer_type, title, updated_at)
+                SELECT 'main', chat_id, username, peer_id, access_hash, peer_type, title, updated_at
+                FROM peer_cache_old
             ''')
-            
-            # Миграция: добавляем поле username если его нет
-            try:
-                await db.execute('ALTER TABLE groups ADD COLUMN username TEXT')
-            except Exception:
-                # Поле уже существует
-                pass
-            
-            # Миграция: обновляем старый формат интервала на новый (минуты)
-            try:
-                # Проверяем, есть ли старый формат
-                cursor = await db.execute('SELECT value FROM settings WHERE key = "post_interval"')
-                old_interval = await cursor.fetchone()
-                if old_interval:
-                    # Конвертируем часы в минуты
-                    hours = int(old_interval[0])
-                    minutes = hours * 60
-                    await db.execute(
-                        'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
-                        ('post_interval_minutes', str(minutes))
+            await db.execute('DROP TABLE peer_cache_old')
+        
+        await db.execute('''
+            CREATE INDEX IF NOT EXISTS idx_peer_cache_username 
+            ON peer_cache(account, username)
+        ''')
+    
+    async def _migration_template_validation(self, db):
+        """Результат проверки шаблона (лимиты Telegram и разметка)"""
+        if not await self._has_column(db, 'post_templates', 'is_valid'):
+            await db.execute('ALTER TABLE post_templates ADD COLUMN is_valid INTEGER DEFAULT 1')
+        if not await self._has_column(db, 'post_templates', 'validation'):
+            await db.execute('ALTER TABLE post_templates ADD COLUMN validation TEXT')
+    
+    async def _migration_group_account(self, db):
+        """Поле account для закрепления группы за аккаунтом"""
+        if not await self._has_column(db, 'groups', 'account'):
+            await db.execute('ALTER TABLE groups ADD COLUMN account TEXT')
+    
+    async def _migration_epoch_timestamps(self, db):
+        """
+        Время публикации и последней публикации группы - целое число секунд Unix (UTC)
+        вместо текста CURRENT_TIMESTAMP
+        """
+        # В SQLite текст сортируется после чисел, поэтому условие >= '' выбирает по индексу
+        # только еще не преобразованные строки
+        await db.execute('''
+            UPDATE publication_history
+            SET published_at = CAST(strftime('%s', published_at) AS INTEGER)
+            WHERE published_at >= ''
+        ''')
+        await db.execute('''
+            UPDATE groups
+            SET last_posted = CAST(strftime('%s', last_posted) AS INTEGER)
+            WHERE last_posted >= ''
+        ''')
+    
+    async def _migration_statistics(self, db):
+        """
+        Сводная статистика публикаций (обновляется при записи истории):
+        по дням и группам - для топа групп, по часам - для итогов и графиков
+        """
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS publication_stats_daily (
+                day TEXT NOT NULL,
+                chat_id TEXT NOT NULL,
+                chat_title TEXT,
+                total INTEGER NOT NULL DEFAULT 0,
+                successful INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, chat_id)
+            )
+        ''')
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS publication_stats_hourly (
+                day TEXT NOT NULL,
+                hour INTEGER NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                successful INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, hour)
+            )
+        ''')
+        
+        # Однократно заполняем статистику по существующей истории
+        cursor = await db.execute('SELECT 1 FROM publication_stats_hourly LIMIT 1')
+        if not await cursor.fetchone():
+            await self._rebuild_statistics(db)
+    
+    async def _migration_search_index(self, db):
+        """
+        Полнотекстовые индексы FTS5 по истории публикаций и группам
+        
+        Индексы хранят только токены (content-таблицы - сами publication_history
+        и groups) и обновляются триггерами при изменении строк. Если SQLite
+        собран без FTS5, миграция ничего не создает и поиск работает через LIKE.
+        """
+        indexes = (
+            ('publication_history_fts', 'publication_history', ('chat_title', 'chat_username', 'error_message')),
+            ('groups_fts', 'groups', ('title', 'username')),
+        )
+        try:
+            for fts, table, columns in indexes:
+                cursor = await db.execute(
+                    'SELECT 1 FROM sqlite_master WHERE type = "table" AND name = ?', (fts,)
+                )
+                exists = await cursor.fetchone()
+                
+                column_list = ', '.join(columns)
+                new_values = ', '.join(f'new.{column}' for column in columns)
+                old_values = ', '.join(f'old.{column}' for column in columns)
+                await db.execute(f'''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                        {column_list},
+                        content='{table}', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2'
                     )
-                    # Удаляем старый ключ
-                    await db.execute('DELETE FROM settings WHERE key = "post_interval"')
-            except Exception:
-                # Миграция не нужна или уже выполнена
-                pass
+                ''')
+                await db.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+                        INSERT INTO {fts} (rowid, {column_list}) VALUES (new.id, {new_values});
+                    END
+                ''')
+                await db.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+                        INSERT INTO {fts} ({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                    END
+                ''')
+                await db.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {column_list} ON {table} BEGIN
+                        INSERT INTO {fts} ({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                        INSERT INTO {fts} (rowid, {column_list}) VALUES (new.id, {new_values});
+                    END
+                ''')
+                
+                if not exists:
+                    # Индексируем строки, добавленные до появления индекса
+                    await db.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+        except Exception as e:
+            print(f"Полнотекстовый поиск недоступен, используется LIKE: {e}")
+    
+    async def _migration_history_indexes(self, db):
+        """
+        Составные индексы для выборки по (published_at, id) с фильтром по статусу или чату
+        
+        id входит в индекс как rowid, поэтому подсчет и сортировка не читают таблицу;
+        они же заменяют отдельные индексы по status и chat_id.
+        """
+        await db.execute('''
+            CREATE INDEX IF NOT EXISTS idx_publication_history_status_published_at 
+            ON publication_history(status, published_at)
+        ''')
+        await db.execute('''
+            CREATE INDEX IF NOT EXISTS idx_publication_history_chat_id_published_at 
+            ON publication_history(chat_id, published_at)
+        ''')
+        await db.execute('DROP INDEX IF EXISTS idx_publication_history_chat_id')
+        await db.execute('DROP INDEX IF EXISTS idx_publication_history_status')
+    
+    async def _migration_incremental_vacuum(self, db):
+        """
+        Инкрементальная очистка, чтобы после архивации возвращать свободные
+        страницы без полного VACUUM (режим меняется только через VACUUM)
+        """
+        cursor = await db.execute('PRAGMA auto_vacuum')
+        if (await cursor.fetchone())[0] != 2:
+            await db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            await db.execute('VACUUM')
+    
+    @staticmethod
+    def _fts_query(search: str) -> Optional[str]:
+        """
+        Запрос FTS5 по строке поиска: все слова должны встречаться, каждое как префикс
+        
+        Args:
+            search: Строка поиска пользователя
             
-            # Миграция: добавляем поле is_disabled для черного списка
-            try:
-                await db.execute('ALTER TABLE groups ADD COLUMN is_disabled INTEGER DEFAULT 0')
-            except Exception:
-                # Поле уже существует
-                pass
+        Returns:
+            Выражение MATCH или None, если в строке нет слов
+        """
+        words = re.findall(r'\w+', search or '')
+        if not words:
+            return None
+        return ' '.join(f'"{word}"*' for word in words)
+    
+    async def search_groups(self, search: str, limit: int = 100) -> List[Tuple[str, str, str, str, str, int]]:
+        """
+        Поиск групп по названию и username (по началу слов, сначала лучшие совпадения)
+        
+        Args:
+            search: Строка поиска
+            limit: Максимальное количество групп
             
-            await db.commit()
+        Returns:
+            Список кортежей (chat_id, title, username, added_at, last_posted, is_disabled)
+        """
+        query = self._fts_query(search)
+        if not query:
+            return []
+        try:
+            async with self.pool.read() as db:
+                if self.fts_enabled:
+                    # Совпадение в названии весит больше, чем в username
+                    cursor = await db.execute('''
+                        SELECT g.chat_id, g.title, g.username, g.added_at, g.last_posted,
+                               COALESCE(g.is_disabled, 0) as is_disabled
+                        FROM groups_fts
+                        JOIN groups g ON g.id = groups_fts.rowid
+                        WHERE groups_fts MATCH ?
+                        ORDER BY bm25(groups_fts, 2.0, 1.0)
+                        LIMIT ?
+                    ''', (query, limit))
+                else:
+                    search_pattern = f'%{search}%'
+                    cursor = await db.execute('''
+                        SELECT chat_id, title, username, added_at, last_posted, COALESCE(is_disabled, 0) as is_disabled
+                        FROM groups
+                        WHERE title LIKE ? OR username LIKE ?
+                        ORDER BY added_at
+                        LIMIT ?
+                    ''', (search_pattern, search_pattern, limit))
+                return await cursor.fetchall()
+        except Exception as e:
+            print(f"Ошибка при поиске групп: {e}")
+            return []
     
     async def add_group(self, chat_id: str, title: str = None, username: str = None) -> bool:
         """
@@ -143,17 +743,62 @@ class Database:
             True если группа добавлена, False если уже существует
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute(
+            async with self.pool.write() as db:
+                cursor = await db.execute(
                     'INSERT OR IGNORE INTO groups (chat_id, title, username) VALUES (?, ?, ?)',
                     (chat_id, title, username)
                 )
                 await db.commit()
+                if cursor.rowcount > 0:
+                    cursor = await db.execute(
+                        f'SELECT {self.GROUP_COLUMNS} FROM groups WHERE chat_id = ?', (chat_id,)
+                    )
+                    row = await cursor.fetchone()
+                    if row:
+                        self.groups.put(row)
                 return True
         except Exception as e:
             print(f"Ошибка при добавлении группы: {e}")
             return False
     
+    async def add_groups(self, groups: List[Tuple[str, str, str]]) -> Optional[List[str]]:
+        """
+        Добавление пачки групп одной транзакцией
+        
+        Args:
+            groups: Список кортежей (chat_id, title, username)
+            
+        Returns:
+            Список chat_id добавленных групп (уже существующие пропускаются)
+            или None, если записать пачку не удалось
+        """
+        if not groups:
+            return []
+        try:
+            added = []
+            async with self.pool.write() as db:
+                for chat_id, title, username in groups:
+                    cursor = await db.execute(
+                        'INSERT OR IGNORE INTO groups (chat_id, title, username) VALUES (?, ?, ?)',
+                        (chat_id, title, username)
+                    )
+                    if cursor.rowcount > 0:
+                        added.append(chat_id)
+                await db.commit()
+                
+                if added:
+                    placeholders = ', '.join('?' * len(added))
+                    cursor = await db.execute(
+                        f'SELECT {self.GROUP_COLUMNS} FROM groups WHERE chat_id IN ({placeholders}) ORDER BY added_at, id',
+                        added
+                    )
+                    for row in await cursor.fetchall():
+                        self.groups.put(row)
+            return added
+        except Exception as e:
+            print(f"Ошибка при добавлении групп: {e}")
+            return None
+    
     async def remove_group(self, chat_id: str) -> bool:
         """
         Удаление группы из базы данных
@@ -165,17 +810,32 @@ class Database:
             True если группа удалена, False если не найдена
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 cursor = await db.execute(
                     'DELETE FROM groups WHERE chat_id = ?',
                     (chat_id,)
                 )
                 await db.commit()
+                self.groups.remove(chat_id)
                 return cursor.rowcount > 0
         except Exception as e:
             print(f"Ошибка при удалении группы: {e}")
             return False
     
+    async def _load_groups(self, db):
+        """Загрузка реестра групп из базы данных"""
+        cursor = await db.execute(
+            f'SELECT {self.GROUP_COLUMNS} FROM groups ORDER BY added_at, id'
+        )
+        self.groups.load(await cursor.fetchall())
+    
+    async def _group_registry(self) -> GroupRegistry:
+        """Реестр групп (загружается при первом обращении)"""
+        if not self.groups.loaded:
+            async with self.pool.read() as db:
+                await self._load_groups(db)
+        return self.groups
+    
     async def get_all_groups(self) -> List[Tuple[str, str, str, str, str, int]]:
         """
         Получение списка всех групп (включая отключенные)
@@ -184,11 +844,7 @@ class Database:
             Список кортежей (chat_id, title, username, added_at, last_posted, is_disabled)
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                cursor = await db.execute(
-                    'SELECT chat_id, title, username, added_at, last_posted, COALESCE(is_disabled, 0) as is_disabled FROM groups ORDER BY added_at'
-                )
-                return await cursor.fetchall()
+            return (await self._group_registry()).all()
         except Exception as e:
             print(f"Ошибка при получении списка групп: {e}")
             return []
@@ -201,11 +857,7 @@ class Database:
             Список кортежей (chat_id, title, username, added_at, last_posted)
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                cursor = await db.execute(
-                    'SELECT chat_id, title, username, added_at, last_posted FROM groups WHERE COALESCE(is_disabled, 0) = 0 ORDER BY added_at'
-                )
-                return await cursor.fetchall()
+            return (await self._group_registry()).active()
         except Exception as e:
             print(f"Ошибка при получении списка активных групп: {e}")
             return []
@@ -222,19 +874,16 @@ class Database:
             True если успешно обновлено
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute(
+            async with self.pool.write() as db:
+                cursor = await db.execute(
                     'UPDATE groups SET is_disabled = ? WHERE chat_id = ?',
                     (1 if is_disabled else 0, chat_id)
                 )
                 await db.commit()
+                self.groups.update(chat_id, is_disabled=1 if is_disabled else 0)
                 
                 # Проверяем, что группа была обновлена
-                cursor = await db.execute(
-                    'SELECT chat_id FROM groups WHERE chat_id = ?',
-                    (chat_id,)
-                )
-                return (await cursor.fetchone()) is not None
+                return cursor.rowcount > 0
         except Exception as e:
             print(f"Ошибка при изменении статуса группы: {e}")
             return False
@@ -250,13 +899,8 @@ class Database:
             True если группа в черном списке, False если активна
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                cursor = await db.execute(
-                    'SELECT COALESCE(is_disabled, 0) FROM groups WHERE chat_id = ?',
-                    (chat_id,)
-                )
-                result = await cursor.fetchone()
-                return bool(result[0]) if result else False
+            group = (await self._group_registry()).get(chat_id)
+            return bool(group[5]) if group else False
         except Exception as e:
             print(f"Ошибка при проверке статуса группы: {e}")
             return False
@@ -269,12 +913,14 @@ class Database:
             chat_id: ID чата
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            posted_at = int(time.time())
+            async with self.pool.write() as db:
                 await db.execute(
-                    'UPDATE groups SET last_posted = CURRENT_TIMESTAMP WHERE chat_id = ?',
-                    (chat_id,)
+                    'UPDATE groups SET last_posted = ? WHERE chat_id = ?',
+                    (posted_at, chat_id)
                 )
                 await db.commit()
+            self.groups.update(chat_id, last_posted=posted_at)
         except Exception as e:
             print(f"Ошибка при обновлении времени публикации: {e}")
     
@@ -285,13 +931,16 @@ class Database:
         Returns:
             Интервал в минутах
         """
+        if self.post_interval_minutes is not None:
+            return self.post_interval_minutes
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.read() as db:
                 cursor = await db.execute(
                     'SELECT value FROM settings WHERE key = "post_interval_minutes"'
                 )
                 result = await cursor.fetchone()
-                return int(result[0]) if result else 1440  # 24 часа по умолчанию
+                self.post_interval_minutes = int(result[0]) if result else 1440  # 24 часа по умолчанию
+                return self.post_interval_minutes
         except Exception as e:
             print(f"Ошибка при получении интервала: {e}")
             return 1440
@@ -308,144 +957,714 @@ class Database:
     
     async def set_post_interval_minutes(self, minutes: int) -> bool:
         """
-        Установка интервала публикации в минутах
+        Установка интервала публикации в минутах
+        
+        Args:
+            minutes: Интервал в минутах
+            
+        Returns:
+            True если успешно установлено
+        """
+        try:
+            async with self.pool.write() as db:
+                await db.execute(
+                    'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                    ('post_interval_minutes', str(minutes))
+                )
+                await db.commit()
+            self.post_interval_minutes = int(minutes)
+            return True
+        except Exception as e:
+            print(f"Ошибка при установке интервала: {e}")
+            return False
+    
+    async def set_post_interval(self, hours: int) -> bool:
+        """
+        Установка интервала публикации в часах (для обратной совместимости)
+        
+        Args:
+            hours: Интервал в часах
+            
+        Returns:
+            True если успешно установлено
+        """
+    async def set_post_interval(self, hours: int) -> bool:
+        """
+        Установка интервала публикации в часах (для обратной совместимости)
+        
+        Args:
+            hours: Интервал в часах
+            
+        Returns:
+            True если успешно установлено
+        """
+        minutes = hours * 60
+        return await self.set_post_interval_minutes(minutes)
+    
+    async def get_all_peers(self, account: str = 'main') -> List[Tuple]:
+        """
+        Получение всех записей кэша peer'ов аккаунта
+        
+        Args:
+            account: Имя аккаунта
+            
+        Returns:
+            Список кортежей (chat_id, username, peer_id, access_hash, peer_type, title)
+        """
+        try:
+            async with self.pool.read() as db:
+                cursor = await db.execute(
+                    'SELECT chat_id, username, peer_id, access_hash, peer_type, title FROM peer_cache WHERE account = ?',
+                    (account,)
+                )
+                return await cursor.fetchall()
+        except Exception as e:
+            print(f"Ошибка при получении кэша peer'ов: {e}")
+            return []
+    
+    async def save_peer(
+        self,
+        account: str,
+        chat_id: str,
+        username: str,
+        peer_id: int,
+        access_hash: int,
+        peer_type: str,
+        title: str = None
+    ) -> bool:
+        """
+        Сохранение разрешенного peer'а в кэш
+        
+        Args:
+            account: Имя аккаунта
+            chat_id: ID чата
+            username: Username чата (без @, в нижнем регистре)
+            peer_id: ID peer'а в Telegram
+            access_hash: access_hash peer'а (None для обычных групп)
+            peer_type: Тип peer'а (Channel, Chat, User)
+            title: Название чата
+            
+        Returns:
+            True если успешно сохранено
+        """
+        try:
+            async with self.pool.write() as db:
+                await db.execute('''
+                    INSERT OR REPLACE INTO peer_cache 
+                    (account, chat_id, username, peer_id, access_hash, peer_type, title, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ''', (account, chat_id, username, peer_id, access_hash, peer_type, title))
+                await db.commit()
+                return True
+        except Exception as e:
+            print(f"Ошибка при сохранении peer'а: {e}")
+            return False
+    
+    async def save_peers(self, account: str, records: List[Tuple]) -> bool:
+        """
+        Сохранение пачки peer'ов в кэш одной транзакцией
+        
+        Args:
+            account: Имя аккаунта
+            records: Список кортежей (chat_id, username, peer_id, access_hash, peer_type, title)
+            
+        Returns:
+            True если успешно сохранено
+        """
+        if not records:
+            return True
+        try:
+            async with self.pool.write() as db:
+                await db.executemany('''
+                    INSERT OR REPLACE INTO peer_cache 
+                    (account, chat_id, username, peer_id, access_hash, peer_type, title, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ''', [(account, *record) for record in records])
+                await db.commit()
+                return True
+        except Exception as e:
+            print(f"Ошибка при сохранении peer'ов: {e}")
+            return False
+    
+    async def delete_peer(self, account: str, chat_id: str) -> bool:
+        """
+        Удаление peer'а из кэша (например, если Telegram отклонил сохраненный access_hash)
+        
+        Args:
+            account: Имя аккаунта
+            chat_id: ID чата
+            
+        Returns:
+            True если запись удалена
+        """
+        try:
+            async with self.pool.write() as db:
+                cursor = await db.execute(
+                    'DELETE FROM peer_cache WHERE account = ? AND chat_id = ?',
+                    (account, chat_id)
+                )
+                await db.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            print(f"Ошибка при удалении peer'а: {e}")
+            return False
+    
+    async def get_group_accounts(self) -> dict:
+        """
+        Получение закрепленных за группами аккаунтов
+        
+        Returns:
+            Словарь {chat_id: account} (только группы с назначенным аккаунтом)
+        """
+        try:
+            return (await self._group_registry()).accounts()
+        except Exception as e:
+            print(f"Ошибка при получении аккаунтов групп: {e}")
+            return {}
+    
+    async def set_group_accounts(self, assignments: List[Tuple[str, str]]) -> bool:
+        """
+        Закрепление групп за аккаунтами
+        
+        Args:
+            assignments: Список кортежей (chat_id, account)
+            
+        Returns:
+            True если успешно обновлено
+        """
+        try:
+            async with self.pool.write() as db:
+                await db.executemany(
+                    'UPDATE groups SET account = ? WHERE chat_id = ?',
+                    [(account, chat_id) for chat_id, account in assignments]
+                )
+                await db.commit()
+            for chat_id, account in assignments:
+                self.groups.update(chat_id, account=account)
+            return True
+        except Exception as e:
+            print(f"Ошибка при назначении аккаунтов группам: {e}")
+            return False
+    
+    async def add_publication_history(
+        self, 
+        chat_id: str, 
+        chat_title: str = None, 
+        chat_username: str = None,
+        status: str = 'success',
+        error_message: str = None,
+        retry_count: int = 0
+    ) -> bool:
+        """
+        Добавление записи в историю публикаций
+        
+        Args:
+            chat_id: ID чата
+            chat_title: Название чата
+            chat_username: Username чата
+            status: Статус публикации ('success' или 'error')
+            error_message: Сообщение об ошибке (если есть)
+            retry_count: Количество попыток
+            
+        Returns:
+            True если успешно добавлено
+        """
+        published_at = int(time.time())
+        try:
+            async with self.pool.write() as db:
+                await db.execute('''
+                    INSERT INTO publication_history 
+                    (chat_id, chat_title, chat_username, status, error_message, retry_count, published_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (chat_id, chat_title, chat_username, status, error_message, retry_count, published_at))
+                await self._add_to_statistics(db, [(chat_id, chat_title, status, published_at)])
+                await db.commit()
+                return True
+        except Exception as e:
+            print(f"Ошибка при добавлении в историю публикаций: {e}")
+            return False
+    
+    async def add_publication_results(self, records: List[Tuple]) -> bool:
+        """
+        Запись пачки результатов публикаций одной транзакцией
+        
+        Args:
+            records: Список кортежей (chat_id, chat_title, chat_username, status,
+                error_message, retry_count, published_at). Для успешных публикаций
+                также обновляется время последней публикации группы
+            
+        Returns:
+            True если успешно записано
+        """
+        if not records:
+            return True
+        try:
+            async with self.pool.write() as db:
+                await db.executemany('''
+                    INSERT INTO publication_history 
+                    (chat_id, chat_title, chat_username, status, error_message, retry_count, published_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', records)
+                await db.executemany(
+                    'UPDATE groups SET last_posted = ? WHERE chat_id = ?',
+                    [(record[6], record[0]) for record in records if record[3] == 'success']
+                )
+                await self._add_to_statistics(
+                    db, [(record[0], record[1], record[3], record[6]) for record in records]
+                )
+                await db.commit()
+            for record in records:
+                if record[3] == 'success':
+                    self.groups.update(record[0], last_posted=record[6])
+            return True
+        except Exception as e:
+            print(f"Ошибка при записи результатов публикаций: {e}")
+            return False
+    
+    async def _add_to_statistics(self, db, records: List[Tuple]):
+        """
+        Обновление сводной статистики новыми записями истории (в транзакции вызывающего)
+        
+        Args:
+            db: Соединение для записи
+            records: Список кортежей (chat_id, chat_title, status, published_at)
+        """
+        daily = {}
+        hourly = {}
+        for chat_id, chat_title, status, published_at in records:
+            day, hour = self._day_of(published_at), published_at % 86400 // 3600
+            successful = 1 if status == 'success' else 0
+            failed = 1 if status == 'error' else 0
+            
+            row = daily.setdefault((day, chat_id), [day, chat_id, chat_title, 0, 0, 0])
+            row[2] = chat_title
+            row[3] += 1
+            row[4] += successful
+            row[5] += failed
+            
+            row = hourly.setdefault((day, hour), [day, hour, 0, 0, 0])
+            row[2] += 1
+            row[3] += successful
+            row[4] += failed
+        
+        await db.executemany('''
+            INSERT INTO publication_stats_daily (day, chat_id, chat_title, total, successful, failed)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (day, chat_id) DO UPDATE SET
+                chat_title = excluded.chat_title,
+                total = total + excluded.total,
+                successful = successful + excluded.successful,
+                failed = failed + excluded.failed
+        ''', list(daily.values()))
+        await db.executemany('''
+            INSERT INTO publication_stats_hourly (day, hour, total, successful, failed)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (day, hour) DO UPDATE SET
+                total = total + excluded.total,
+                successful = successful + excluded.successful,
+                failed = failed + excluded.failed
+        ''', list(hourly.values()))
+    
+    async def _rebuild_statistics(self, db, day: str = None):
+        """
+        Пересчет сводной статистики по истории публикаций (в транзакции вызывающего)
+        
+        Args:
+            db: Соединение для записи
+            day: Пересчитать только указанный день ('YYYY-MM-DD'), если None - всю статистику
+        """
+        if day:
+            # Диапазон по published_at, чтобы использовался индекс
+            day_start = self._to_epoch(day)
+            history_filter = 'WHERE published_at >= ? AND published_at < ?'
+            history_params = (day_start, day_start + 86400)
+            await db.execute('DELETE FROM publication_stats_daily WHERE day = ?', (day,))
+            await db.execute('DELETE FROM publication_stats_hourly WHERE day = ?', (day,))
+        else:
+            history_filter = ''
+            history_params = ()
+            await db.execute('DELETE FROM publication_stats_daily')
+            await db.execute('DELETE FROM publication_stats_hourly')
+        
+        await db.execute(f'''
+            INSERT INTO publication_stats_daily (day, chat_id, chat_title, total, successful, failed)
+            SELECT DATE(published_at, 'unixepoch'), chat_id, chat_title, COUNT(*),
+                   SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN status = 'error' THEN 1 ELSE 0 END)
+            FROM publication_history
+            {history_filter}
+            GROUP BY 1, chat_id
+        ''', history_params)
+        await db.execute(f'''
+            INSERT INTO publication_stats_hourly (day, hour, total, successful, failed)
+            SELECT DATE(published_at, 'unixepoch'), published_at % 86400 / 3600, COUNT(*),
+                   SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN status = 'error' THEN 1 ELSE 0 END)
+            FROM publication_history
+            {history_filter}
+            GROUP BY 1, 2
+        ''', history_params)
+    
+    def _history_filters(
+        self,
+        chat_id: str = None,
+        status: str = None,
+        start_date: str = None,
+        end_date: str = None,
+        search: str = None
+    ) -> Tuple[str, list]:
+        """
+        Условия WHERE для выборки истории публикаций
+        
+        Returns:
+            Кортеж (условия, начинающиеся с ' AND ', параметры)
+        """
+        conditions = ''
+        params = []
+        
+        if chat_id:
+            conditions += ' AND chat_id = ?'
+            params.append(chat_id)
+        
+        if status:
+            conditions += ' AND status = ?'
+            params.append(status)
+        
+        if start_date:
+            conditions += ' AND published_at >= ?'
+            params.append(self._to_epoch(start_date))
+        
+        if end_date:
+            conditions += ' AND published_at <= ?'
+            params.append(self._to_epoch(end_date))
+        
+        if search:
+            fts_query = self._fts_query(search)
+            if self.fts_enabled and fts_query:
+                # Поиск по индексу FTS5 (название, username и текст ошибки)
+                conditions += ' AND id IN (SELECT rowid FROM publication_history_fts WHERE publication_history_fts MATCH ?)'
+                params.append(fts_query)
+            else:
+                conditions += ' AND (chat_title LIKE ? OR chat_username LIKE ?)'
+                search_pattern = f'%{search}%'
+                params.extend([search_pattern, search_pattern])
+        
+        return conditions, params
+    
+    async def get_publication_history(
+        self, 
+        limit: int = 100,
+        offset: int = 0,
+        chat_id: str = None,
+        status: str = None,
+        start_date: str = None,
+        end_date: str = None,
+        search: str = None
+    ) -> List[Tuple]:
+        """
+        Получение истории публикаций с фильтрами
+        
+        Для постраничного просмотра используйте get_publication_history_page:
+        OFFSET заставляет SQLite прочитать и отбросить все предыдущие записи.
         
         Args:
-            minutes: Интервал в минутах
+            limit: Максимальное количество записей
+            offset: Смещение для пагинации
+            chat_id: Фильтр по ID чата
+            status: Фильтр по статусу ('success' или 'error')
+            start_date: Начальная дата (UTC, формат: 'YYYY-MM-DD HH:MM:SS', или секунды Unix)
+            end_date: Конечная дата (UTC, формат: 'YYYY-MM-DD HH:MM:SS', или секунды Unix)
+            search: Поиск по названию чата, username или тексту ошибки (по началу слов)
             
         Returns:
-            True если успешно установлено
+            Список кортежей (id, chat_id, chat_title, chat_username, status, error_message, published_at, retry_count)
         """
+        use_archive = self._reaches_archive(start_date)
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute(
-                    'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
-                    ('post_interval_minutes', str(minutes))
+            async with self.pool.read() as db:
+                conditions, params = self._history_filters(chat_id, status, start_date, end_date, search)
+                query = f'SELECT id, chat_id, chat_title, chat_username, status, error_message, published_at, retry_count FROM publication_history WHERE 1=1{conditions}'
+                query += ' ORDER BY published_at DESC, id DESC LIMIT ? OFFSET ?'
+                if use_archive:
+                    # Записи архива старше всех записей базы: берем из базы все до конца страницы
+                    params.extend([offset + limit, 0])
+                else:
+                    params.extend([limit, offset])
+                
+                cursor = await db.execute(query, params)
+                rows = await cursor.fetchall()
+            
+            if use_archive and len(rows) < offset + limit:
+                rows += await self._read_archive(
+                    chat_id=chat_id, status=status, start_date=self._to_epoch(start_date),
+                    end_date=self._to_epoch(end_date), search=search, limit=offset + limit - len(rows)
                 )
-                await db.commit()
-                return True
+                return rows[offset:offset + limit]
+            return rows
         except Exception as e:
-            print(f"Ошибка при установке интервала: {e}")
+            print(f"Ошибка при получении истории публикаций: {e}")
+            return []
+    
+    def _reaches_archive(self, start_date=None) -> bool:
+        """Нужно ли читать архив для запроса с такой начальной датой"""
+        if not self.archived_before or not start_date:
             return False
+        return self._to_epoch(start_date) < self._to_epoch(self.archived_before)
     
-    async def set_post_interval(self, hours: int) -> bool:
+    @staticmethod
+    def _to_epoch(value) -> Optional[int]:
         """
-        Установка интервала публикации в часах (для обратной совместимости)
+        Секунды Unix для границы фильтра
         
         Args:
-            hours: Интервал в часах
+            value: Секунды Unix или дата UTC ('YYYY-MM-DD' или 'YYYY-MM-DD HH:MM:SS')
             
-        Returns:
-            True если успешно установлено
+        Raises:
+            ValueError: Если дата в неизвестном формате
         """
-    async def set_post_interval(self, hours: int) -> bool:
+        if value is None or value == '':
+            return None
+        if isinstance(value, int):
+            return value
+        value = value.strip()
+        for date_format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+            try:
+                return calendar.timegm(time.strptime(value, date_format))
+            except ValueError:
+                continue
+        raise ValueError(f'Некорректная дата: {value}')
+    
+    @staticmethod
+    def _day_of(timestamp: int) -> str:
+        """День UTC ('YYYY-MM-DD') для секунд Unix"""
+        return time.strftime('%Y-%m-%d', time.gmtime(timestamp))
+    
+    async def _read_archive(self, **kwargs) -> List[Tuple]:
+        """Чтение архива истории (в потоке executor'а, распаковка блокирует)"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, lambda: self.archive.read(**kwargs))
+    
+    @staticmethod
+    def encode_history_cursor(direction: str, published_at: int, record_id: int) -> str:
         """
-        Установка интервала публикации в часах (для обратной совместимости)
+        Токен позиции в истории публикаций
         
         Args:
-            hours: Интервал в часах
-            
+            direction: 'next' (более старые записи) или 'prev' (более новые записи)
+            published_at: Время публикации граничной записи (секунды Unix)
+            record_id: ID граничной записи
+        """
+        raw = json.dumps([direction, published_at, record_id], separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+    
+    @staticmethod
+    def decode_history_cursor(token: str) -> Tuple[str, int, int]:
+        """
+        Разбор токена позиции в истории публикаций
+        
         Returns:
-            True если успешно установлено
+            Кортеж (direction, published_at, record_id)
+            
+        Raises:
+            ValueError: Если токен поврежден
         """
-        minutes = hours * 60
-        return await self.set_post_interval_minutes(minutes)
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            direction, published_at, record_id = json.loads(raw)
+        except Exception:
+            raise ValueError('Некорректный курсор истории')
+        if direction not in ('next', 'prev') or not isinstance(published_at, int) or not isinstance(record_id, int):
+            raise ValueError('Некорректный курсор истории')
+        return direction, published_at, record_id
     
-    async def add_publication_history(
-        self, 
-        chat_id: str, 
-        chat_title: str = None, 
-        chat_username: str = None,
-        status: str = 'success',
-        error_message: str = None,
-        retry_count: int = 0
-    ) -> bool:
+    async def get_publication_history_page(
+        self,
+        limit: int = 100,
+        cursor: str = None,
+        chat_id: str = None,
+        status: str = None,
+        start_date: str = None,
+        end_date: str = None,
+        search: str = None
+    ) -> dict:
         """
-        Добавление записи в историю публикаций
+        Страница истории публикаций (keyset-пагинация по (published_at, id))
+        
+        Страница начинается сразу за граничной записью курсора, поэтому
+        стоимость не зависит от того, насколько далеко пролистана история.
         
         Args:
-            chat_id: ID чата
-            chat_title: Название чата
-            chat_username: Username чата
-            status: Статус публикации ('success' или 'error')
-            error_message: Сообщение об ошибке (если есть)
-            retry_count: Количество попыток
+            limit: Количество записей на странице
+            cursor: Токен next_cursor или prev_cursor предыдущей страницы (None - первая страница)
+            chat_id, status, start_date, end_date, search: Фильтры, как в get_publication_history
             
         Returns:
-            True если успешно добавлено
+            Словарь {'records': [...], 'next_cursor': str или None, 'prev_cursor': str или None}
+            
+        Raises:
+            ValueError: Если курсор поврежден
         """
+        direction, boundary = 'next', None
+        if cursor:
+            direction, published_at, record_id = self.decode_history_cursor(cursor)
+            boundary = (published_at, record_id)
+        
+        conditions, params = self._history_filters(chat_id, status, start_date, end_date, search)
+        if boundary and direction == 'next':
+            conditions += ' AND (published_at, id) < (?, ?)'
+            params.extend(boundary)
+        elif boundary:
+            conditions += ' AND (published_at, id) > (?, ?)'
+            params.extend(boundary)
+        order = 'DESC' if direction == 'next' else 'ASC'
+        
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute('''
-                    INSERT INTO publication_history 
-                    (chat_id, chat_title, chat_username, status, error_message, retry_count)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (chat_id, chat_title, chat_username, status, error_message, retry_count))
-                await db.commit()
-                return True
+            async with self.pool.read() as db:
+                # Лишняя запись показывает, есть ли еще страница в этом направлении
+                cursor_db = await db.execute(f'''
+                    SELECT id, chat_id, chat_title, chat_username, status, error_message, published_at, retry_count
+                    FROM publication_history
+                    WHERE 1=1{conditions}
+                    ORDER BY published_at {order}, id {order}
+                    LIMIT ?
+                ''', params + [limit + 1])
+                rows = await cursor_db.fetchall()
+            
+            if self._reaches_archive(start_date):
+                # Архив продолжает историю базы в сторону старых записей
+                rows += await self._read_archive(
+                    chat_id=chat_id, status=status, start_date=self._to_epoch(start_date),
+                    end_date=self._to_epoch(end_date), search=search, boundary=boundary,
+                    direction=direction, limit=limit + 1
+                )
+                rows.sort(key=lambda row: (row[6], row[0]), reverse=(direction == 'next'))
+                rows = rows[:limit + 1]
         except Exception as e:
-            print(f"Ошибка при добавлении в историю публикаций: {e}")
-            return False
+            print(f"Ошибка при получении истории публикаций: {e}")
+            return {'records': [], 'next_cursor': None, 'prev_cursor': None}
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if direction == 'prev':
+            rows.reverse()
+        
+        if direction == 'next':
+            has_next, has_prev = has_more, boundary is not None
+        else:
+            has_next, has_prev = True, has_more
+        
+        next_cursor = prev_cursor = None
+        if rows:
+            first, last = rows[0], rows[-1]
+            if has_next:
+                next_cursor = self.encode_history_cursor('next', last[6], last[0])
+            if has_prev:
+                prev_cursor = self.encode_history_cursor('prev', first[6], first[0])
+        
+        return {'records': rows, 'next_cursor': next_cursor, 'prev_cursor': prev_cursor}
     
-    async def get_publication_history(
+    async def count_publication_history(
         self,
-        limit: int = 100,
-        offset: int = 0,
         chat_id: str = None,
         status: str = None,
         start_date: str = None,
         end_date: str = None,
         search: str = None
-    ) -> List[Tuple]:
+    ) -> dict:
         """
-        Получение истории публикаций с фильтрами
+        Количество записей истории публикаций, подходящих под фильтры
+        
+        Фильтры по статусу, чату и целым дням считаются по сводной статистике.
+        Остальные запросы (поиск, даты с точностью до секунд) считаются по истории,
+        но не дальше HISTORY_COUNT_LIMIT записей.
         
-        Args:
-            limit: Максимальное количество записей
-            offset: Смещение для пагинации
-            chat_id: Фильтр по ID чата
-            status: Фильтр по статусу ('success' или 'error')
-            start_date: Начальная дата (формат: 'YYYY-MM-DD HH:MM:SS')
-            end_date: Конечная дата (формат: 'YYYY-MM-DD HH:MM:SS')
-            search: Поиск по названию чата или username
-            
         Returns:
-            Список кортежей (id, chat_id, chat_title, chat_username, status, error_message, published_at, retry_count)
+            Словарь {'total': количество, 'exact': False если подсчет остановлен на лимите}
         """
+        start_day = self._whole_day(start_date, '00:00:00')
+        end_day = self._whole_day(end_date, '23:59:59')
+        # Счетчики сводной статистики: успешные, ошибки и остальные ('unknown')
+        status_columns = {
+            None: 'total',
+            'success': 'successful',
+            'error': 'failed',
+            'unknown': 'total - successful - failed'
+        }
+        use_rollups = (
+            not search
+            and (status or None) in status_columns
+            and (not start_date or start_day)
+            and (not end_date or end_day)
+        )
+        
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                query = 'SELECT id, chat_id, chat_title, chat_username, status, error_message, published_at, retry_count FROM publication_history WHERE 1=1'
-                params = []
-                
-                if chat_id:
-                    query += ' AND chat_id = ?'
-                    params.append(chat_id)
-                
-                if status:
-                    query += ' AND status = ?'
-                    params.append(status)
-                
-                if start_date:
-                    query += ' AND published_at >= ?'
-                    params.append(start_date)
-                
-                if end_date:
-                    query += ' AND published_at <= ?'
-                    params.append(end_date)
-                
-                if search:
-                    query += ' AND (chat_title LIKE ? OR chat_username LIKE ?)'
-                    search_pattern = f'%{search}%'
-                    params.extend([search_pattern, search_pattern])
-                
-                query += ' ORDER BY published_at DESC LIMIT ? OFFSET ?'
-                params.extend([limit, offset])
+            async with self.pool.read() as db:
+                if use_rollups:
+                    table = 'publication_stats_daily' if chat_id else 'publication_stats_hourly'
+                    column = status_columns[status or None]
+                    conditions = ''
+                    params = []
+                    if chat_id:
+                        conditions += ' AND chat_id = ?'
+                        params.append(chat_id)
+                    if start_day:
+                        conditions += ' AND day >= ?'
+                        params.append(start_day)
+                    if self.archived_before and not self._reaches_archive(start_date):
+                        # Архивные дни учитываются, только если запрос читает архив
+                        conditions += ' AND day >= ?'
+                        params.append(self.archived_before)
+                    if end_day:
+                        conditions += ' AND day <= ?'
+                        params.append(end_day)
+                    cursor = await db.execute(
+                        f'SELECT COALESCE(SUM({column}), 0) FROM {table} WHERE 1=1{conditions}',
+                        params
+                    )
+                    return {'total': (await cursor.fetchone())[0], 'exact': True}
                 
-                cursor = await db.execute(query, params)
-                return await cursor.fetchall()
+                conditions, params = self._history_filters(chat_id, status, start_date, end_date, search)
+                cursor = await db.execute(f'''
+                    SELECT COUNT(*) FROM (
+                        SELECT 1 FROM publication_history WHERE 1=1{conditions} LIMIT ?
+                    )
+                ''', params + [HISTORY_COUNT_LIMIT + 1])
+                total = (await cursor.fetchone())[0]
+            
+            if total <= HISTORY_COUNT_LIMIT and self._reaches_archive(start_date):
+                total += len(await self._read_archive(
+                    chat_id=chat_id, status=status, start_date=self._to_epoch(start_date),
+                    end_date=self._to_epoch(end_date), search=search, limit=HISTORY_COUNT_LIMIT + 1 - total
+                ))
+            if total > HISTORY_COUNT_LIMIT:
+                return {'total': HISTORY_COUNT_LIMIT, 'exact': False}
+            return {'total': total, 'exact': True}
         except Exception as e:
-            print(f"Ошибка при получении истории публикаций: {e}")
-            return []
+            print(f"Ошибка при подсчете истории публикаций: {e}")
+            return {'total': 0, 'exact': False}
+    
+    @staticmethod
+    def _whole_day(value: str, time_part: str) -> Optional[str]:
+        """
+        Дата ('YYYY-MM-DD'), если граница фильтра совпадает с границей дня
+        
+        Args:
+            value: Граница фильтра ('YYYY-MM-DD', 'YYYY-MM-DD HH:MM:SS' или секунды Unix)
+            time_part: Время границы дня ('00:00:00' для начала, '23:59:59' для конца)
+        """
+        if not value:
+            return None
+        if isinstance(value, int):
+            value = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(value))
+        try:
+            day = datetime.strptime(value[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+        except ValueError:
+            return None
+        rest = value[10:].strip()
+        # Дата без времени сравнивается как начало дня
+        if rest == time_part or (not rest and time_part == '00:00:00'):
+            return day
+        return None
     
     async def get_publication_statistics(
         self,
@@ -463,43 +1682,31 @@ class Database:
             Словарь со статистикой
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.read() as db:
+                # Статистика берется из сводных таблиц, поэтому фильтр работает с точностью до дня
                 date_filter = ''
                 params = []
                 
                 if start_date:
-                    date_filter += ' AND published_at >= ?'
+                    date_filter += ' AND day >= DATE(?)'
                     params.append(start_date)
                 
                 if end_date:
-                    date_filter += ' AND published_at <= ?'
+                    date_filter += ' AND day <= DATE(?)'
                     params.append(end_date)
                 
-                # Общее количество публикаций
-                cursor = await db.execute(
-                    f'SELECT COUNT(*) FROM publication_history WHERE 1=1 {date_filter}',
-                    params
-                )
-                total = (await cursor.fetchone())[0]
-                
-                # Успешные публикации
-                cursor = await db.execute(
-                    f'SELECT COUNT(*) FROM publication_history WHERE status = "success" {date_filter}',
-                    params
-                )
-                successful = (await cursor.fetchone())[0]
-                
-                # Неудачные публикации
-                cursor = await db.execute(
-                    f'SELECT COUNT(*) FROM publication_history WHERE status = "error" {date_filter}',
-                    params
-                )
-                failed = (await cursor.fetchone())[0]
+                # Общее количество, успешные и неудачные публикации
+                cursor = await db.execute(f'''
+                    SELECT COALESCE(SUM(total), 0), COALESCE(SUM(successful), 0), COALESCE(SUM(failed), 0)
+                    FROM publication_stats_hourly
+                    WHERE 1=1 {date_filter}
+                ''', params)
+                total, successful, failed = await cursor.fetchone()
                 
                 # Топ групп по публикациям
                 cursor = await db.execute(f'''
-                    SELECT chat_id, chat_title, COUNT(*) as count 
-                    FROM publication_history 
+                    SELECT chat_id, chat_title, SUM(total) as count 
+                    FROM publication_stats_daily 
                     WHERE 1=1 {date_filter}
                     GROUP BY chat_id 
                     ORDER BY count DESC 
@@ -509,23 +1716,22 @@ class Database:
                 
                 # Статистика по дням для графика активности
                 cursor = await db.execute(f'''
-                    SELECT DATE(published_at) as date, 
-                           COUNT(*) as total,
-                           SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as successful,
-                           SUM(CASE WHEN status = 'error' THEN 1 ELSE 0 END) as failed
-                    FROM publication_history 
+                    SELECT day as date, 
+                           SUM(total) as total,
+                           SUM(successful) as successful,
+                           SUM(failed) as failed
+                    FROM publication_stats_hourly 
                     WHERE 1=1 {date_filter}
-                    GROUP BY DATE(published_at)
-                    ORDER BY date DESC
+                    GROUP BY day
+                    ORDER BY day DESC
                     LIMIT 30
                 ''', params)
                 daily_stats = await cursor.fetchall()
                 
                 # Статистика по часам для графика активности по времени суток
                 cursor = await db.execute(f'''
-                    SELECT CAST(strftime('%H', published_at) AS INTEGER) as hour,
-                           COUNT(*) as count
-                    FROM publication_history 
+                    SELECT hour, SUM(total) as count
+                    FROM publication_stats_hourly 
                     WHERE 1=1 {date_filter}
                     GROUP BY hour
                     ORDER BY hour
@@ -563,24 +1769,139 @@ class Database:
         Returns:
             True если успешно очищено
         """
+        loop = asyncio.get_event_loop()
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 if days:
+                    cutoff = int(time.time()) - days * 86400
+                    cutoff_day = self._day_of(cutoff)
                     await db.execute(
-                        'DELETE FROM publication_history WHERE published_at < datetime("now", ?)',
-                        (f'-{days} days',)
+                        'DELETE FROM publication_history WHERE published_at < ?',
+                        (cutoff,)
                     )
+                    # Сводная статистика: удаляем прошедшие дни, день границы пересчитываем
+                    await db.execute('DELETE FROM publication_stats_daily WHERE day < ?', (cutoff_day,))
+                    await db.execute('DELETE FROM publication_stats_hourly WHERE day < ?', (cutoff_day,))
+                    await self._rebuild_statistics(db, day=cutoff_day)
+                    if self.archived_before and cutoff_day < self.archived_before:
+                        # День границы хранится в архиве, а не в базе (записи до cutoff
+                        # еще в архиве: он очищается после фиксации транзакции)
+                        day_start = self._to_epoch(cutoff_day)
+                        archived = await self._read_archive(start_date=cutoff, end_date=day_start + 86399)
+                        await self._add_to_statistics(
+                            db, [(record[1], record[2], record[4], record[6]) for record in archived]
+                        )
                 else:
                     await db.execute('DELETE FROM publication_history')
+                    await db.execute('DELETE FROM publication_stats_daily')
+                    await db.execute('DELETE FROM publication_stats_hourly')
+                    await db.execute('DELETE FROM settings WHERE key = "history_archived_before"')
                 await db.commit()
-                return True
+            # Архив очищается только после фиксации транзакции: если запись в базу
+            # не удалась, файлы архива и граница архивации остаются как были
+            if days:
+                await loop.run_in_executor(None, self.archive.delete_before, cutoff)
+            else:
+                self.archived_before = None
+                await loop.run_in_executor(None, self.archive.delete_all)
+            await self._vacuum()
+            return True
         except Exception as e:
             print(f"Ошибка при очистке истории: {e}")
             return False
     
+    async def archive_publication_history(self, hot_days: int = HISTORY_HOT_DAYS) -> int:
+        """
+        Перенос записей истории старше hot_days дней в архив
+        
+        Записи читаются пачками, записываются в сегменты архива и только после
+        этого удаляются из базы. Если процесс прервется между записью сегмента
+        и удалением, следующий проход удалит уже заархивированные записи.
+        Сводная статистика не меняется: она продолжает учитывать архив.
+        
+        Args:
+            hot_days: Сколько последних дней истории хранить в базе (0 - не архивировать)
+            
+        Returns:
+            Количество перенесенных записей
+        """
+        if hot_days <= 0:
+            return 0
+        # Граница - начало дня, чтобы сводная статистика делилась на базу и архив по дням
+        cutoff_day = self._day_of(int(time.time()) - hot_days * 86400)
+        cutoff = self._to_epoch(cutoff_day)
+        loop = asyncio.get_event_loop()
+        archived = 0
+        try:
+            # Записи, уже попавшие в архив при прерванном проходе
+            await self._delete_archived(self.archive.segments)
+            
+            while True:
+                async with self.pool.read() as db:
+                    cursor = await db.execute('''
+                        SELECT id, chat_id, chat_title, chat_username, status, error_message, published_at, retry_count
+                        FROM publication_history
+                        WHERE published_at < ?
+                        ORDER BY id
+                        LIMIT ?
+                    ''', (cutoff, HISTORY_ARCHIVE_BATCH))
+                    records = await cursor.fetchall()
+                if not records:
+                    break
+                
+                segments = await loop.run_in_executor(None, self.archive.append, records, cutoff)
+                await self._delete_archived(segments)
+                archived += len(records)
+            
+            if not self.archived_before or cutoff_day > self.archived_before:
+                async with self.pool.write() as db:
+                    await db.execute(
+                        'INSERT OR REPLACE INTO settings (key, value) VALUES ("history_archived_before", ?)',
+                        (cutoff_day,)
+                    )
+                    await db.commit()
+                self.archived_before = cutoff_day
+            
+            if archived:
+                await self._vacuum()
+            return archived
+        except Exception as e:
+            print(f"Ошибка при архивации истории: {e}")
+            return archived
+    
+    async def _delete_archived(self, segments: List[dict]):
+        """Удаление из базы записей, сохраненных в сегментах архива"""
+        async with self.pool.write() as db:
+            await db.executemany(
+                'DELETE FROM publication_history WHERE id BETWEEN ? AND ? AND published_at < ?',
+                [(segment['min_id'], segment['max_id'], segment['cutoff']) for segment in segments]
+            )
+            await db.commit()
+    
+    async def _vacuum(self):
+        """Возврат свободных страниц файлу БД и сброс журнала WAL"""
+        try:
+            async with self.pool.write() as db:
+                # execute() делает только один шаг incremental_vacuum (одна страница),
+                # executescript выполняет pragma до конца
+                await db.executescript('PRAGMA incremental_vacuum;')
+                await db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        except Exception as e:
+            print(f"Ошибка при очистке файла БД: {e}")
+    
+    def _validate_template(self, content: str) -> Tuple[int, str]:
+        """
+        Проверка содержимого шаблона для сохранения вместе с ним
+        
+        Returns:
+            Кортеж (is_valid, validation в формате JSON)
+        """
+        validation = validate_template(content, POST_IMAGE_FILE.exists())
+        return int(validation['valid']), json.dumps(validation, ensure_ascii=False)
+    
     async def add_post_template(self, name: str, content: str) -> int:
         """
-        Добавление шаблона поста
+        Добавление шаблона поста (с проверкой содержимого)
         
         Args:
             name: Название шаблона
@@ -590,11 +1911,12 @@ class Database:
             ID созданного шаблона
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            is_valid, validation = self._validate_template(content)
+            async with self.pool.write() as db:
                 cursor = await db.execute('''
-                    INSERT INTO post_templates (name, content)
-                    VALUES (?, ?)
-                ''', (name, content))
+                    INSERT INTO post_templates (name, content, is_valid, validation)
+                    VALUES (?, ?, ?, ?)
+                ''', (name, content, is_valid, validation))
                 await db.commit()
                 return cursor.lastrowid
         except Exception as e:
@@ -606,12 +1928,13 @@ class Database:
         Получение списка всех шаблонов
         
         Returns:
-            Список кортежей (id, name, content, is_active, created_at, updated_at)
+            Список кортежей (id, name, content, is_active, created_at, updated_at, is_valid, validation)
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.read() as db:
                 cursor = await db.execute('''
-                    SELECT id, name, content, is_active, created_at, updated_at
+                    SELECT id, name, content, is_active, created_at, updated_at,
+                           COALESCE(is_valid, 1), validation
                     FROM post_templates
                     ORDER BY is_active DESC, created_at DESC
                 ''')
@@ -625,12 +1948,13 @@ class Database:
         Получение активного шаблона
         
         Returns:
-            Кортеж (id, name, content, is_active, created_at, updated_at) или None
+            Кортеж (id, name, content, is_active, created_at, updated_at, is_valid, validation) или None
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.read() as db:
                 cursor = await db.execute('''
-                    SELECT id, name, content, is_active, created_at, updated_at
+                    SELECT id, name, content, is_active, created_at, updated_at,
+                           COALESCE(is_valid, 1), validation
                     FROM post_templates
                     WHERE is_active = 1
                     LIMIT 1
@@ -642,7 +1966,7 @@ class Database:
     
     async def update_template(self, template_id: int, name: str = None, content: str = None) -> bool:
         """
-        Обновление шаблона
+        Обновление шаблона (при изменении содержимого оно проверяется заново)
         
         Args:
             template_id: ID шаблона
@@ -653,7 +1977,7 @@ class Database:
             True если успешно обновлено
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 updates = []
                 params = []
                 
@@ -662,8 +1986,13 @@ class Database:
                     params.append(name)
                 
                 if content is not None:
+                    is_valid, validation = self._validate_template(content)
                     updates.append('content = ?')
                     params.append(content)
+                    updates.append('is_valid = ?')
+                    params.append(is_valid)
+                    updates.append('validation = ?')
+                    params.append(validation)
                 
                 if not updates:
                     return False
@@ -682,6 +2011,53 @@ class Database:
             print(f"Ошибка при обновлении шаблона: {e}")
             return False
     
+    async def get_template_validation(self, template_id: int) -> Optional[dict]:
+        """
+        Получение сохраненного результата проверки шаблона
+        
+        Args:
+            template_id: ID шаблона
+            
+        Returns:
+            Словарь с результатом проверки или None
+        """
+        try:
+            async with self.pool.read() as db:
+                cursor = await db.execute(
+                    'SELECT validation FROM post_templates WHERE id = ?',
+                    (template_id,)
+                )
+                row = await cursor.fetchone()
+                return json.loads(row[0]) if row and row[0] else None
+        except Exception as e:
+            print(f"Ошибка при получении проверки шаблона: {e}")
+            return None
+    
+    async def revalidate_templates(self) -> int:
+        """
+        Повторная проверка всех шаблонов (например, после появления или удаления изображения)
+        
+        Returns:
+            Количество шаблонов с ошибками
+        """
+        try:
+            async with self.pool.write() as db:
+                cursor = await db.execute('SELECT id, content FROM post_templates')
+                rows = await cursor.fetchall()
+                updates = []
+                for template_id, content in rows:
+                    is_valid, validation = self._validate_template(content)
+                    updates.append((is_valid, validation, template_id))
+                await db.executemany(
+                    'UPDATE post_templates SET is_valid = ?, validation = ? WHERE id = ?',
+                    updates
+                )
+                await db.commit()
+                return sum(1 for is_valid, _, _ in updates if not is_valid)
+        except Exception as e:
+            print(f"Ошибка при проверке шаблонов: {e}")
+            return 0
+    
     async def set_active_template(self, template_id: int) -> bool:
         """
         Установка активного шаблона (деактивирует остальные)
@@ -693,7 +2069,7 @@ class Database:
             True если успешно установлено
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 # Деактивируем все шаблоны
                 await db.execute('UPDATE post_templates SET is_active = 0')
                 # Активируем выбранный
@@ -715,7 +2091,7 @@ class Database:
             True если успешно удалено
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 await db.execute('DELETE FROM post_templates WHERE id = ?', (template_id,))
                 await db.commit()
                 return True
@@ -736,12 +2112,13 @@ class Database:
         """
         try:
             import json
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 cursor = await db.execute('''
                     INSERT INTO publication_schedules (schedule_type, schedule_data)
                     VALUES (?, ?)
                 ''', (schedule_type, json.dumps(schedule_data)))
                 await db.commit()
+                await self._refresh_active_schedule(db)
                 return cursor.lastrowid
         except Exception as e:
             print(f"Ошибка при добавлении расписания: {e}")
@@ -756,7 +2133,7 @@ class Database:
         """
         try:
             import json
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.read() as db:
                 cursor = await db.execute('''
                     SELECT id, schedule_type, schedule_data, is_active, created_at, updated_at
                     FROM publication_schedules
@@ -779,32 +2156,54 @@ class Database:
     
     async def get_active_schedule(self) -> Optional[Tuple]:
         """
-        Получение активного расписания
+        Получение активного расписания (из кэша)
         
         Returns:
             Кортеж (id, schedule_type, schedule_data, is_active, created_at, updated_at) или None
         """
-        try:
-            import json
-            async with aiosqlite.connect(self.db_path) as db:
-                cursor = await db.execute('''
-                    SELECT id, schedule_type, schedule_data, is_active, created_at, updated_at
-                    FROM publication_schedules
-                    WHERE is_active = 1
-                    LIMIT 1
-                ''')
-                result = await cursor.fetchone()
-                if result:
-                    id, schedule_type, schedule_data_json, is_active, created_at, updated_at = result
-                    try:
-                        schedule_data = json.loads(schedule_data_json)
-                    except:
-                        schedule_data = {}
-                    return (id, schedule_type, schedule_data, is_active, created_at, updated_at)
+        if not self._active_schedule_loaded:
+            try:
+                async with self.pool.read() as db:
+                    self._active_schedule = await self._read_active_schedule(db)
+                    self._active_schedule_loaded = True
+            except Exception as e:
+                print(f"Ошибка при получении активного расписания: {e}")
                 return None
-        except Exception as e:
-            print(f"Ошибка при получении активного расписания: {e}")
+        
+        schedule = self._active_schedule
+        if schedule is None:
+            return None
+        # Копия данных: вызывающий код не должен менять закэшированный словарь
+        return schedule[:2] + (dict(schedule[2]),) + schedule[3:]
+    
+    @staticmethod
+    async def _read_active_schedule(db) -> Optional[Tuple]:
+        """Чтение активного расписания из базы данных (JSON данных разбирается один раз)"""
+        cursor = await db.execute('''
+            SELECT id, schedule_type, schedule_data, is_active, created_at, updated_at
+            FROM publication_schedules
+            WHERE is_active = 1
+            LIMIT 1
+        ''')
+        result = await cursor.fetchone()
+        if not result:
             return None
+        id, schedule_type, schedule_data_json, is_active, created_at, updated_at = result
+        try:
+            schedule_data = json.loads(schedule_data_json)
+        except:
+            schedule_data = {}
+        return (id, schedule_type, schedule_data, is_active, created_at, updated_at)
+    
+    async def _refresh_active_schedule(self, db):
+        """Обновление кэша активного расписания после изменения расписаний"""
+        try:
+            self._active_schedule = await self._read_active_schedule(db)
+            self._active_schedule_loaded = True
+        except Exception as e:
+            # Следующее чтение загрузит расписание заново
+            self._active_schedule_loaded = False
+            print(f"Ошибка при обновлении кэша расписания: {e}")
     
     async def update_schedule(self, schedule_id: int, schedule_type: str = None, schedule_data: dict = None) -> bool:
         """
@@ -820,7 +2219,7 @@ class Database:
         """
         try:
             import json
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 updates = []
                 params = []
                 
@@ -844,6 +2243,7 @@ class Database:
                     WHERE id = ?
                 ''', params)
                 await db.commit()
+                await self._refresh_active_schedule(db)
                 return True
         except Exception as e:
             print(f"Ошибка при обновлении расписания: {e}")
@@ -860,12 +2260,13 @@ class Database:
             True если успешно установлено
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 # Деактивируем все расписания
                 await db.execute('UPDATE publication_schedules SET is_active = 0')
                 # Активируем выбранное
                 await db.execute('UPDATE publication_schedules SET is_active = 1 WHERE id = ?', (schedule_id,))
                 await db.commit()
+                await self._refresh_active_schedule(db)
                 return True
         except Exception as e:
             print(f"Ошибка при установке активного расписания: {e}")
@@ -882,14 +2283,121 @@ class Database:
             True если успешно удалено
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 await db.execute('DELETE FROM publication_schedules WHERE id = ?', (schedule_id,))
                 await db.commit()
+                await self._refresh_active_schedule(db)
                 return True
         except Exception as e:
             print(f"Ошибка при удалении расписания: {e}")
             return False
 
 
+class PublicationResultBuffer:
+    """
+    Буфер результатов публикаций (отложенная запись)
+    
+    Результаты накапливаются в памяти и записываются одной транзакцией,
+    когда в буфере набирается max_records записей, через max_delay секунд
+    после первой незаписанной записи или при явном вызове flush()
+    (в конце запуска и при остановке системы).
+    """
+    
+    def __init__(self, database: Database, max_records: int = PUBLICATION_BUFFER_SIZE,
+                 max_delay: float = PUBLICATION_BUFFER_INTERVAL):
+        self.database = database
+        self.max_records = max(1, max_records)
+        self.max_delay = max_delay
+        self.records = []
+        self.flushes = 0
+        self._lock = threading.Lock()
+        self._timer = None
+    
+    async def add(
+        self,
+        chat_id: str,
+        chat_title: str = None,
+        chat_username: str = None,
+        status: str = 'success',
+        error_message: str = None,
+        retry_count: int = 0
+    ):
+        """
+        Добавление результата публикации в буфер
+        
+        Args:
+            chat_id: ID чата
+            chat_title: Название чата
+            chat_username: Username чата
+            status: Статус публикации ('success', 'error' или 'unknown')
+            error_message: Сообщение об ошибке (если есть)
+            retry_count: Количество попыток
+        """
+        # Время фиксируется в момент публикации, а не записи (секунды Unix)
+        published_at = int(time.time())
+        with self._lock:
+            self.records.append(
+                (chat_id, chat_title, chat_username, status, error_message, retry_count, published_at)
+            )
+            pending = len(self.records)
+        
+        if pending >= self.max_records:
+            await self.flush()
+        elif pending == 1:
+            self._schedule_flush()
+    
+    def _schedule_flush(self):
+        """Запуск отложенной записи через max_delay секунд"""
+        if self._timer is not None and not self._timer.done():
+            return
+        self._timer = asyncio.ensure_future(self._flush_later())
+    
+    async def _flush_later(self):
+        await asyncio.sleep(self.max_delay)
+        self._timer = None
+        await self.flush()
+    
+    def _cancel_timer(self):
+        timer, self._timer = self._timer, None
+        if timer is None or timer.done():
+            return
+        try:
+            if timer.get_loop() is asyncio.get_running_loop():
+                if timer is not asyncio.current_task():
+                    timer.cancel()
+            else:
+                # Таймер создан в loop'е другого потока
+                timer.get_loop().call_soon_threadsafe(timer.cancel)
+        except RuntimeError:
+            # Loop таймера уже закрыт
+            pass
+    
+    async def flush(self) -> bool:
+        """
+        Запись накопленных результатов
+        
+        Returns:
+            True если буфер пуст или записан успешно
+        """
+        self._cancel_timer()
+        with self._lock:
+            records, self.records = self.records, []
+        if not records:
+            return True
+        
+        if await self.database.add_publication_results(records):
+            self.flushes += 1
+            return True
+        
+        # Не теряем результаты: вернем их в буфер и повторим запись через max_delay
+        with self._lock:
+            self.records = records + self.records
+        self._schedule_flush()
+        return False
+
+
 # Глобальный экземпляр базы данных
 db = Database()
+
+# Глобальный буфер результатов публикаций
+publication_results = PublicationResultBuffer(db)
@@ -0,0 +1,70 @@
+"""
+Общий снимок состояния для потока событий веб-интерфейса (Server-Sent Events)
+"""
+import threading
+from typing import List, Optional, Tuple
+
+
+class EventHub:
+    """
+    Последние события каждого типа и ожидание новых
+    
+    Источники (планировщик, реестр групп) публикуют события из любого потока.
+    Хранится только последнее событие каждого типа: подписчик, не успевший
+    прочитать промежуточные состояния, сразу получает актуальное. Данные
+    события формируются один раз и общие для всех подписчиков.
+    """
+    
+    def __init__(self):
+        self._condition = threading.Condition()
+        # Тип события -> (версия, данные)
+        self._latest = {}
+        self.version = 0
+    
+    def publish(self, event: str, data=None):
+        """
+        Публикация события
+        
+        Args:
+            event: Тип события
+            data: Данные события (сериализуемые в JSON)
+        """
+        with self._condition:
+            self.version += 1
+            self._latest[event] = (self.version, data)
+            self._condition.notify_all()
+    
+    def changes_since(self, version: int) -> Tuple[int, List[Tuple[str, object]]]:
+        """
+        События, опубликованные после версии version
+        
+        Returns:
+            Кортеж (текущая версия, список (тип, данные) по порядку публикации)
+        """
+        with self._condition:
+            return self.version, self._collect(version)
+    
+    def wait(self, version: int, timeout: Optional[float] = None) -> Tuple[int, List[Tuple[str, object]]]:
+        """
+        Ожидание событий после версии version
+        
+        Args:
+            version: Последняя версия, полученная подписчиком
+            timeout: Максимальное время ожидания (секунды)
+        
+        Returns:
+            Кортеж (текущая версия, список (тип, данные)); пустой список - истек timeout
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.version > version, timeout)
+            return self.version, self._collect(version)
+    
+    def _collect(self, version: int) -> List[Tuple[str, object]]:
+        changed = [(event_version, event, data) for event, (event_version, data) in self._latest.items()
+                   if event_version > version]
+        changed.sort(key=lambda item: item[0])
+        return [(event, data) for _, event, data in changed]
+
+
+# Глобальный экземпляр для всего процесса
+events = EventHub()
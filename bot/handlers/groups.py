@@ -0,0 +1,324 @@
+"""
+Модуль для добавления групп: проверка ввода и массовый импорт
+"""
+import asyncio
+import re
+import time
+from telethon.tl.types import Channel, Chat
+from config import GROUP_IMPORT_CONCURRENCY, GROUP_IMPORT_BATCH
+from telegram_client import telegram_client, PeerCache, ChatLookupError
+from db import db
+
+
+def validate_group_input(group_input):
+    """
+    Валидация и санитизация входных данных для группы/канала
+    
+    Args:
+        group_input: Входная строка (username, ID, ссылка)
+    
+    Returns:
+        tuple: (is_valid, sanitized_input, error_message)
+    """
+    if not group_input or not isinstance(group_input, str):
+        return False, None, "Пустой ввод"
+    
+    # Удаляем пробелы
+    group_input = group_input.strip()
+    
+    if not group_input:
+        return False, None, "Пустой ввод"
+    
+    # Проверяем длину
+    if len(group_input) > 255:
+        return False, None, "Слишком длинный ввод (максимум 255 символов)"
+    
+    # Проверяем формат: username, ID или ссылка
+    # Username: @username или username
+    # ID: числовой ID (может быть отрицательным для групп)
+    # Ссылка: https://t.me/username или t.me/username
+    
+    # Очищаем от потенциально опасных символов
+    dangerous_chars = ['<', '>', '"', "'", '&', '\n', '\r']
+    for char in dangerous_chars:
+        if char in group_input:
+            return False, None, f"Недопустимый символ: {char}"
+    
+    # Нормализуем username (убираем @ если есть)
+    if group_input.startswith('@'):
+        sanitized = group_input[1:]
+    elif group_input.startswith('https://t.me/'):
+        sanitized = group_input.replace('https://t.me/', '').strip()
+    elif group_input.startswith('t.me/'):
+        sanitized = group_input.replace('t.me/', '').strip()
+    elif group_input.startswith('http://t.me/'):
+        sanitized = group_input.replace('http://t.me/', '').strip()
+    else:
+        # Проверяем, является ли это числовым ID
+        try:
+            int(group_input)
+            sanitized = group_input
+        except ValueError:
+            # Если не число, считаем что это username без @
+            sanitized = group_input
+    
+    # Проверяем формат username (только буквы, цифры, подчеркивание)
+    if sanitized and not sanitized.startswith('-') and not sanitized.lstrip('-').isdigit():
+        if not all(c.isalnum() or c == '_' for c in sanitized):
+            return False, None, "Недопустимый формат username (только буквы, цифры и подчеркивание)"
+    
+    return True, sanitized, None
+
+
+def username_from_input(sanitized_input: str):
+    """
+    Username группы по очищенному вводу
+    
+    Returns:
+        '@username' или None, если ввод - числовой ID
+    """
+    try:
+        int(sanitized_input.lstrip('-'))
+        return None
+    except ValueError:
+        return sanitized_input if sanitized_input.startswith('@') else '@' + sanitized_input
+
+
+async def import_groups(items, on_result, concurrency: int = GROUP_IMPORT_CONCURRENCY,
+                        batch_size: int = GROUP_IMPORT_BATCH) -> dict:
+    """
+    Массовое добавление групп
+    
+    Ввод проверяется и очищается от повторов, чаты разрешаются параллельно
+    (запросы к Telegram проходят через ограничитель частоты клиента), найденные
+    группы записываются пачками по batch_size в одной транзакции.
+    
+    Args:
+        items: Список username, ID и ссылок t.me
+        on_result: Функция, получающая результат по каждому элементу по мере готовности:
+            сначала {'type': 'start', 'total'}, затем {'type': 'item', 'input', 'status', ...},
+            где status - added, exists, duplicate, invalid, not_found или error (чат не удалось
+            проверить из-за ограничения частоты запросов или нет соединения, либо не удалось
+            записать группу в базу данных); в конце -
+            {'type': 'done', ...итоги}
+        concurrency: Количество одновременных запросов к Telegram
+        batch_size: Количество групп в одной транзакции записи
+    
+    Returns:
+        Итоги импорта {'total', 'added', 'exists', 'duplicate', 'invalid', 'not_found', 'error'}
+    """
+    summary = {'total': len(items), 'added': 0, 'exists': 0, 'duplicate': 0, 'invalid': 0, 'not_found': 0, 'error': 0}
+    
+    def report(item, status, **fields):
+        summary[status] += 1
+        on_result({'type': 'item', 'input': item, 'status': status, **fields})
+    
+    on_result({'type': 'start', 'total': len(items)})
+    
+    # Проверка ввода и удаление повторов (username сравниваются без учета регистра и @)
+    pending = []
+    seen = set()
+    for item in items:
+        item = str(item).strip()
+        is_valid, sanitized, error = validate_group_input(item)
+        if not is_valid:
+            report(item, 'invalid', error=error)
+            continue
+        key = PeerCache.normalize_key(sanitized)
+        if key in seen:
+            report(item, 'duplicate')
+            continue
+        seen.add(key)
+        pending.append((item, sanitized))
+    
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    batch = []
+    batch_lock = asyncio.Lock()
+    # Разрешенные chat_id в очереди: разный ввод (username и ID) может указывать на один чат
+    queued = set()
+    
+    async def flush():
+        rows = list(batch)
+        batch.clear()
+        added = await db.add_groups([(chat_id, title, username) for _, chat_id, title, username in rows])
+        if added is None:
+            # Пачка не записана: ни одна группа не добавлена, элементы можно повторить
+            for item, chat_id, title, username in rows:
+                report(item, 'error', chat_id=chat_id, title=title, error="Ошибка записи в базу данных")
+            return
+        added = set(added)
+        for item, chat_id, title, username in rows:
+            if chat_id in added:
+                report(item, 'added', chat_id=chat_id, title=title, username=username)
+            else:
+                report(item, 'exists', chat_id=chat_id, title=title)
+    
+    async def resolve(item, sanitized):
+        async with semaphore:
+            try:
+                info = await telegram_client.get_chat_info(sanitized)
+            except ChatLookupError as e:
+                report(item, 'error', error=str(e))
+                return
+        if not info or info[0] is None:
+            report(item, 'not_found')
+            return
+        chat_id, title, _ = info
+        if db.groups.get(chat_id):
+            report(item, 'exists', chat_id=chat_id, title=title)
+            return
+        async with batch_lock:
+            if chat_id in queued:
+                report(item, 'duplicate', chat_id=chat_id, title=title)
+                return
+            queued.add(chat_id)
+            batch.append((item, chat_id, title, username_from_input(sanitized)))
+            if len(batch) >= batch_size:
+                await flush()
+    
+    await asyncio.gather(*(resolve(item, sanitized) for item, sanitized in pending))
+    async with batch_lock:
+        if batch:
+            await flush()
+    
+    on_result({'type': 'done', **summary})
+    return summary
+
+
+class DialogDiscovery:
+    """
+    Поиск групп среди диалогов аккаунта
+    
+    Диалоги читаются постранично (iter_dialogs), entity из того же ответа сразу
+    сохраняются в кэш peer'ов, поэтому отдельные запросы разрешения чатов не нужны.
+    Одновременно выполняется не больше одного поиска; ход выполнения - get_progress().
+    """
+    
+    TYPES = ('group', 'megagroup', 'channel')
+    
+    def __init__(self):
+        self.task = None
+        self.progress = {'running': False}
+    
+    def is_running(self) -> bool:
+        return self.task is not None and not self.task.done()
+    
+    @staticmethod
+    def chat_type(entity):
+        """Тип чата: group (обычная группа), megagroup (супергруппа), channel или None"""
+        if isinstance(entity, Chat):
+            return 'group'
+        if isinstance(entity, Channel):
+            return 'megagroup' if entity.megagroup else 'channel'
+        return None
+    
+    def matches(self, entity, types, min_members: int, title_pattern) -> bool:
+        """
+        Проверка чата по фильтрам
+        
+        Чаты с неизвестным числом участников (Telegram не всегда передает его
+        в списке диалогов) при min_members > 0 не подходят.
+        """
+        if self.chat_type(entity) not in types:
+            return False
+        if getattr(entity, 'left', False) or getattr(entity, 'deactivated', False):
+            return False
+        if getattr(entity, 'migrated_to', None) is not None:
+            # Группа преобразована в супергруппу - публикуем в супергруппу
+            return False
+        if min_members > 0 and (getattr(entity, 'participants_count', None) or 0) < min_members:
+            return False
+        if title_pattern is not None and not title_pattern.search(entity.title or ''):
+            return False
+        return True
+    
+    async def start(self, types=('group', 'megagroup'), min_members: int = 0, title_pattern: str = None) -> bool:
+        """
+        Запуск поиска (вызывается в event loop клиента Telegram)
+        
+        Args:
+            types: Типы чатов из TYPES
+            min_members: Минимальное число участников (0 - без ограничения)
+            title_pattern: Регулярное выражение для названия (без учета регистра)
+        
+        Returns:
+            False если поиск уже выполняется
+        
+        Raises:
+            ValueError: Неизвестный тип чата или неверное регулярное выражение
+        """
+        unknown = set(types) - set(self.TYPES)
+        if unknown or not types:
+            raise ValueError(f"Неизвестные типы чатов: {', '.join(sorted(unknown)) or 'не указаны'}")
+        try:
+            pattern = re.compile(title_pattern, re.IGNORECASE) if title_pattern else None
+        except re.error as e:
+            raise ValueError(f"Неверное регулярное выражение: {e}")
+        
+        if self.is_running():
+            return False
+        self.progress = {
+            'running': True,
+            'scanned': 0,
+            'matched': 0,
+            'added': 0,
+            'exists': 0,
+            'started_at': int(time.time()),
+            'finished_at': None,
+            'error': None
+        }
+        self.task = asyncio.create_task(self._run(set(types), max(0, int(min_members)), pattern))
+        return True
+    
+    async def _run(self, types, min_members: int, pattern):
+        progress = self.progress
+        try:
+            if not await telegram_client.ensure_connected():
+                raise Exception("Нет соединения с Telegram")
+            
+            batch = []
+            async for dialog in telegram_client.client.iter_dialogs():
+                progress['scanned'] += 1
+                entity = dialog.entity
+                if not self.matches(entity, types, min_members, pattern):
+                    continue
+                progress['matched'] += 1
+                batch.append(entity)
+                if len(batch) >= GROUP_IMPORT_BATCH:
+                    await self._save(batch)
+                    batch = []
+            await self._save(batch)
+            print(
+                f"Поиск групп в диалогах завершен: просмотрено {progress['scanned']}, "
+                f"подходит {progress['matched']}, добавлено {progress['added']}"
+            )
+        except Exception as e:
+            progress['error'] = str(e)
+            print(f"Ошибка поиска групп в диалогах: {e}")
+        finally:
+            progress['running'] = False
+            progress['finished_at'] = int(time.time())
+    
+    async def _save(self, entities):
+        """Запись пачки найденных чатов в группы и в кэш peer'ов"""
+        if not entities:
+            return
+        await telegram_client.remember_peers(entities)
+        new = [entity for entity in entities if not db.groups.get(str(entity.id))]
+        added = await db.add_groups([
+            (str(entity.id), entity.title, f'@{entity.username}' if getattr(entity, 'username', None) else None)
+            for entity in new
+        ])
+        if added is None:
+            # Ошибка записи завершает поиск: в progress['error'] попадет ее описание
+            raise Exception("Ошибка записи найденных групп в базу данных")
+        self.progress['added'] += len(added)
+        self.progress['exists'] += len(entities) - len(added)
+    
+    def get_progress(self) -> dict:
+        """Ход последнего поиска"""
+        return dict(self.progress)
+
+
+# Глобальный экземпляр поиска групп в диалогах
+dialog_discovery = DialogDiscovery()
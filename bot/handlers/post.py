@@ -2,15 +2,95 @@
 Модуль для публикации постов в группы и каналы
 """
 import asyncio
+import hashlib
 from pathlib import Path
-from datetime import datetime
-import random
-import pytz
+from telethon.errors import (
+    FileReferenceEmptyError, FileReferenceExpiredError, FileReferenceInvalidError, MediaEmptyError,
+    FloodWaitError, SlowModeWaitError
+)
 from config import POST_TEXT_FILE, POST_IMAGE_FILE
-from telegram_client import telegram_client
+from telegram_client import telegram_client, ACCOUNT_FAILED_ERRORS, SendStatusUnknownError
 from db import db
+from handlers.template import RenderContext, compile_template, template_cache, validate_template
 
-MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+# Ошибки, означающие, что сохраненное медиа больше нельзя переиспользовать
+MEDIA_EXPIRED_ERRORS = (
+    FileReferenceEmptyError, FileReferenceExpiredError, FileReferenceInvalidError, MediaEmptyError
+)
+
+# Ограничения частоты Telegram: не ошибка группы, отправку нужно повторить после паузы
+RATE_LIMIT_ERRORS = (FloodWaitError, SlowModeWaitError)
+
+
+class MediaCache:
+    """
+    Кэш загруженного изображения поста
+    
+    Изображение загружается в Telegram один раз на хэш содержимого и аккаунт,
+    после чего полученное медиа переиспользуется для всех групп и последующих
+    запусков, пока файл не изменится. Медиа, загруженное одним аккаунтом,
+    другим аккаунтам недоступно, поэтому оно хранится отдельно для каждого.
+    """
+    
+    def __init__(self):
+        self.content_hash = None
+        self.media = {}
+        self.uploads = 0
+        self.skipped_uploads = 0
+        self._file_state = None
+        self._current_hash = None
+    
+    def _get_content_hash(self, image_path: Path) -> str:
+        """Хэш содержимого файла (пересчитывается только при изменении файла)"""
+        stat = image_path.stat()
+        file_state = (str(image_path), stat.st_mtime_ns, stat.st_size)
+        if file_state != self._file_state:
+            with open(image_path, 'rb') as f:
+                self._current_hash = hashlib.sha256(f.read()).hexdigest()
+            self._file_state = file_state
+        return self._current_hash
+    
+    def get(self, image_path: Path, account: str = 'main'):
+        """
+        Получение сохраненного медиа для файла
+        
+        Args:
+            image_path: Путь к изображению
+            account: Имя аккаунта, который будет отправлять медиа
+            
+        Returns:
+            Медиа из предыдущей отправки или None, если файл нужно загрузить
+        """
+        content_hash = self._get_content_hash(image_path)
+        if content_hash == self.content_hash:
+            return self.media.get(account)
+        return None
+    
+    def store(self, image_path: Path, media, account: str = 'main'):
+        """Сохранение медиа, полученного после загрузки файла"""
+        content_hash = self._get_content_hash(image_path)
+        if content_hash != self.content_hash:
+            # Файл изменился: медиа других аккаунтов относится к старому файлу
+            self.media = {}
+            self.content_hash = content_hash
+        self.media[account] = media
+    
+    def invalidate(self, account: str = 'main'):
+        """Сброс сохраненного медиа аккаунта (например, истекла ссылка на файл)"""
+        self.media.pop(account, None)
+    
+    def get_stats(self) -> dict:
+        """Счетчики загрузок изображения"""
+        return {
+            'content_hash': self.content_hash,
+            'accounts': sorted(self.media),
+            'uploads': self.uploads,
+            'skipped_uploads': self.skipped_uploads
+        }
+
+
+# Общий кэш медиа для всех обработчиков постов
+media_cache = MediaCache()
 
 
 class PostHandler:
@@ -20,34 +100,31 @@ class PostHandler:
         self.post_text = None
         self.post_image_path = None
         self.use_template = False
-        self._load_post_content()
+        # Активный шаблон, из которого загружен текст (None - текст из файла)
+        self.template_id = None
+        self.template_name = None
+        # Скомпилированный активный шаблон и значения даты/времени текущего запуска
+        self.compiled_template = None
+        self.render_context = None
+        # Содержимое загружается load_post_content() в основном event loop
     
-    def _load_post_content(self):
-        """Загрузка содержимого поста из файлов или шаблона"""
+    async def load_post_content(self):
+        """
+        Загрузка содержимого поста из активного шаблона или файлов
+        
+        Вызывается в основном event loop (из веб-сервера - через run_async).
+        """
         try:
             # Проверяем, есть ли активный шаблон
-            # Используем более безопасный подход для работы с asyncio
-            template = None
-            try:
-                # Пытаемся получить event loop
-                try:
-                    loop = asyncio.get_running_loop()
-                    # Если event loop уже запущен, создаем задачу через create_task
-                    # Но это синхронный метод, поэтому используем другой подход
-                    import concurrent.futures
-                    with concurrent.futures.ThreadPoolExecutor() as executor:
-                        future = executor.submit(asyncio.run, db.get_active_template())
-                        template = future.result(timeout=1)
-                except RuntimeError:
-                    # Нет запущенного event loop, можно использовать asyncio.run
-                    template = asyncio.run(db.get_active_template())
-            except Exception:
-                # Если не удалось получить шаблон, просто пропускаем его
-                template = None
+            template = await db.get_active_template()
             
             if template:
                 self.post_text = template[2]  # content
                 self.use_template = True
+                self.template_id = template[0]
+                self.template_name = template[1]
+                # Шаблон компилируется один раз на версию (updated_at)
+                self.compiled_template = template_cache.get(template[0], template[5], self.post_text)
                 print(f"✓ Текст поста загружен из шаблона '{template[1]}' ({len(self.post_text)} символов)")
             else:
                 # Загружаем из файла
@@ -59,6 +136,10 @@ class PostHandler:
                     self.post_text = "Тестовый пост для автоматической публикации"
                     print(f"⚠ Файл с текстом поста не найден ({POST_TEXT_FILE}), используется текст по умолчанию")
                 self.use_template = False
+                self.template_id = None
+                self.template_name = None
+                # Переменные в тексте из файла не подставляются, но HTML разбирается заранее
+                self.compiled_template = compile_template(self.post_text, variables=False)
             
             # Проверяем наличие изображения
             if POST_IMAGE_FILE.exists():
@@ -75,6 +156,9 @@ class PostHandler:
             self.post_text = "Ошибка загрузки поста"
             self.post_image_path = None
             self.use_template = False
+            self.template_id = None
+            self.template_name = None
+            self.compiled_template = None
     
     def _replace_variables(self, text: str, chat_id: str = None, chat_title: str = None) -> str:
         """
@@ -97,37 +181,25 @@ class PostHandler:
         Returns:
             Текст с замененными переменными
         """
-        now = datetime.now(pytz.utc).astimezone(MOSCOW_TZ)
-        
-        # Заменяем переменные
-        text = text.replace('{date}', now.strftime('%d.%m.%Y'))
-        text = text.replace('{time}', now.strftime('%H:%M'))
-        text = text.replace('{datetime}', now.strftime('%d.%m.%Y %H:%M'))
-        
-        if chat_id:
-            text = text.replace('{chat_id}', str(chat_id))
-        
-        if chat_title:
-            text = text.replace('{chat_title}', chat_title)
-        
-        # Обработка {random_number}
-        import re
-        
-        # Заменяем {random_number}
-        text = re.sub(r'\{random_number\}', lambda m: str(random.randint(1, 1000)), text)
-        
-        # Заменяем {random_number:min:max}
-        def replace_random_range(match):
-            try:
-                min_val = int(match.group(1))
-                max_val = int(match.group(2))
-                return str(random.randint(min_val, max_val))
-            except:
-                return match.group(0)
-        
-        text = re.sub(r'\{random_number:(\d+):(\d+)\}', replace_random_range, text)
+        return compile_template(text).render(RenderContext(), chat_id, chat_title)
+    
+    def validate(self) -> dict:
+        """
+        Проверка текущего поста перед запуском публикации
         
-        return text
+        Returns:
+            Результат проверки (см. validate_template)
+        """
+        has_image = self.post_image_path is not None and self.post_image_path.exists()
+        return validate_template(self.post_text or '', has_image, variables=self.use_template)
+    
+    def start_run(self):
+        """Фиксация даты и времени для переменных на время запуска публикации"""
+        self.render_context = RenderContext()
+    
+    def finish_run(self):
+        """Сброс значений даты и времени запуска"""
+        self.render_context = None
     
     async def get_post_text(self, chat_id: str = None, chat_title: str = None) -> str:
         """
@@ -144,24 +216,44 @@ class PostHandler:
             return ""
         
         if self.use_template:
-            return self._replace_variables(self.post_text, chat_id, chat_title)
+            compiled = self.compiled_template or compile_template(self.post_text)
+            return compiled.render(self.render_context or RenderContext(), chat_id, chat_title)
         else:
             return self.post_text
     
-    async def send_post_to_group(self, chat_id: str, chat_title: str = None) -> bool:
+    async def get_post_message(self, chat_id: str = None, chat_title: str = None) -> tuple:
+        """
+        Получение поста в виде, готовом к отправке
+        
+        Args:
+            chat_id: ID чата (для переменных)
+            chat_title: Название чата (для переменных)
+            
+        Returns:
+            Кортеж (текст, entities); entities равен None, если текст
+            нужно отправить с разбором HTML
+        """
+        if not self.post_text:
+            return "", None
+        
+        compiled = self.compiled_template or compile_template(self.post_text, variables=self.use_template)
+        return compiled.render_message(self.render_context or RenderContext(), chat_id, chat_title)
+    
+    async def send_post_to_group(self, chat_id: str, chat_title: str = None, account=None) -> bool:
         """
         Отправка поста в группу или канал
         
         Args:
             chat_id: ID чата для отправки
             chat_title: Название чата (для переменных в шаблонах)
+            account: Аккаунт для отправки (по умолчанию основной клиент)
             
         Returns:
             True если пост отправлен успешно, False в противном случае
         """
         try:
-            # Получаем текст поста с заменой переменных
-            post_text = await self.get_post_text(chat_id, chat_title)
+            # Получаем текст поста с заменой переменных (HTML уже разобран)
+            post_text, entities = await self.get_post_message(chat_id, chat_title)
             
             # Проверяем, что у нас есть текст для отправки
             if not post_text:
@@ -169,10 +261,12 @@ class PostHandler:
                 return False
             
             # Отправляем пост через Telegram Client API
-            success = await self._send_message_sync(
+            success = await self._send_message(
                 chat_id=chat_id,
                 text=post_text,
-                image_path=self.post_image_path
+                image_path=self.post_image_path,
+                account=account,
+                entities=entities
             )
             
             if success:
@@ -184,6 +278,10 @@ class PostHandler:
             
             return success
             
+        except (*RATE_LIMIT_ERRORS, *ACCOUNT_FAILED_ERRORS, SendStatusUnknownError):
+            # Группа не виновата в ограничении, отключении аккаунта или таймауте,
+            # решение о повторе принимает планировщик
+            raise
         except Exception as e:
             print(f"Неожиданная ошибка при отправке в чат {chat_id}: {e}")
             # Удаляем группу из базы данных при ошибке
@@ -203,128 +301,80 @@ class PostHandler:
         print(f"Тестирование отправки поста в чат {chat_id}...")
         return await self.send_post_to_group(chat_id)
     
-    def reload_post_content(self):
+    async def reload_post_content(self):
         """Перезагрузка содержимого поста из файлов"""
         print("Перезагрузка содержимого поста...")
-        self._load_post_content()
+        await self.load_post_content()
     
-    async def _send_message_sync(self, chat_id: str, text: str, image_path: Path = None) -> bool:
-        """Упрощенная отправка сообщения через основной клиент"""
+    async def _send_message(self, chat_id: str, text: str, image_path: Path = None, account=None, entities=None) -> bool:
+        """Отправка сообщения через постоянный клиент аккаунта"""
+        account = account or telegram_client
         try:
-            # Используем основной клиент напрямую, но в новом event loop
-            import asyncio
-            import threading
-            from telethon import TelegramClient
-            from config import API_ID, API_HASH, SESSION_FILE
-            
-            def send_in_thread():
-                # Создаем новый event loop в отдельном потоке
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                async def send_async():
-                    # Создаем отдельную сессию для отправки
-                    send_session_file = str(SESSION_FILE).replace('.session', '_send.session')
-                    client = TelegramClient(send_session_file, API_ID, API_HASH)
-                    
-                    try:
-                        await client.connect()
-                        
-                        # Проверяем, авторизован ли клиент
-                        if not await client.is_user_authorized():
-                            # Копируем данные из основной сессии
-                            import shutil
-                            shutil.copy2(str(SESSION_FILE), send_session_file)
-                            await client.disconnect()
-                            client = TelegramClient(send_session_file, API_ID, API_HASH)
-                            await client.connect()
-                        
-                        # Отправляем сообщение
-                        # Пробуем разные способы получения entity
-                        entity = None
-                        
-                        # Сначала пробуем как числовой ID
-                        try:
-                            entity_id = int(chat_id)
-                            entity = await client.get_entity(entity_id)
-                        except (ValueError, Exception):
-                            pass
-                        
-                        # Если не получилось, пробуем как строку
-                        if entity is None:
-                            try:
-                                entity = await client.get_entity(chat_id)
-                            except Exception:
-                                pass
-                        
-                        # Если все еще не получилось, пробуем как username
-                        if entity is None:
-                            try:
-                                # Добавляем @ если его нет
-                                username = chat_id if chat_id.startswith('@') else f'@{chat_id}'
-                                entity = await client.get_entity(username)
-                            except Exception:
-                                pass
-                        
-                        if entity is None:
-                            raise Exception(f"Не удалось найти канал с ID: {chat_id}")
-                        
-                        if image_path and image_path.exists():
-                            await client.send_file(entity, file=str(image_path), caption=text, parse_mode='html')
-                        else:
-                            await client.send_message(entity, text, parse_mode='html')
-                        
-                        return True
-                        
-                    except Exception as e:
-                        print(f"Ошибка отправки в {chat_id}: {e}")
-                        return False
-                    finally:
-                        await client.disconnect()
-                
-                return loop.run_until_complete(send_async())
-            
-            # Запускаем в отдельном потоке
-            result = [False]
-            def run_send():
-                result[0] = send_in_thread()
-            
-            thread = threading.Thread(target=run_send)
-            thread.start()
-            thread.join(timeout=30)  # Таймаут 30 секунд
+            # Отправка выполняется в event loop основного клиента без создания
+            # новых потоков, loop'ов и подключений на каждое сообщение
+            if not image_path or not image_path.exists():
+                await self._send_post(chat_id, text, account=account, entities=entities)
+                return True
             
-            if thread.is_alive():
-                print(f"Таймаут отправки в {chat_id}")
-                return False
-            
-            return result[0]
+            media = media_cache.get(image_path, account.name)
+            if media is not None:
+                try:
+                    await self._send_post(chat_id, text, media, account, entities)
+                    media_cache.skipped_uploads += 1
+                    return True
+                except MEDIA_EXPIRED_ERRORS:
+                    # Ссылка на загруженный файл устарела, загружаем заново
+                    media_cache.invalidate(account.name)
             
+            message = await self._send_post(chat_id, text, str(image_path), account, entities)
+            media_cache.uploads += 1
+            if message is not None and getattr(message, 'photo', None) is not None:
+                media_cache.store(image_path, message.photo, account.name)
+            return True
+        except (*RATE_LIMIT_ERRORS, *ACCOUNT_FAILED_ERRORS, SendStatusUnknownError):
+            raise
+        except asyncio.TimeoutError:
+            print(f"Таймаут отправки в {chat_id}")
+            return False
         except Exception as e:
-            print(f"Ошибка в _send_message_sync для {chat_id}: {e}")
+            print(f"Ошибка отправки в {chat_id}: {e}")
             return False
+    
+    async def _send_post(self, chat_id: str, text: str, file=None, account=None, entities=None):
+        """Одна отправка через постоянный клиент (таймаут и ограничения частоты применяет клиент)"""
+        account = account or telegram_client
+        return await account.run(account.send_post(chat_id, text, file, entities))
 
+    async def check_delivery(self, chat_id: str, since, account=None):
+        """
+        Проверка, дошел ли пост, отправка которого завершилась таймаутом
+        
+        Args:
+            chat_id: ID чата или username
+            since: Время начала отправки (UTC)
+            account: Аккаунт, выполнявший отправку
+            
+        Returns:
+            True если пост найден в чате, False если нет, None если проверить не удалось
+        """
+        account = account or telegram_client
+        try:
+            message = await account.run(account.find_sent_message(chat_id, since))
+            return message is not None
+        except Exception as e:
+            print(f"Не удалось проверить доставку в {chat_id}: {e}")
+            return None
+    
     def get_post_info(self) -> dict:
         """
         Получение информации о текущем посте
         
+        Шаблон берется из загруженного содержимого поста (обновляется при
+        перезагрузке поста), поэтому вызов не обращается к базе данных.
+        
         Returns:
             Словарь с информацией о посте
         """
-        template = None
-        try:
-            try:
-                loop = asyncio.get_running_loop()
-                # Если event loop уже запущен, используем ThreadPoolExecutor
-                import concurrent.futures
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(asyncio.run, db.get_active_template())
-                    template = future.result(timeout=1)
-            except RuntimeError:
-                # Нет запущенного event loop, можно использовать asyncio.run
-                template = asyncio.run(db.get_active_template())
-        except Exception:
-            template = None
-        
         return {
             'text': self.post_text or '',
             'text_length': len(self.post_text) if self.post_text else 0,
@@ -332,6 +382,7 @@ class PostHandler:
             'image_path': str(self.post_image_path) if self.post_image_path else None,
             'text_preview': self.post_text[:100] + '...' if self.post_text and len(self.post_text) > 100 else (self.post_text or ''),
             'use_template': self.use_template,
-            'template_name': template[1] if template else None,
-            'template_id': template[0] if template else None
+            'template_name': self.template_name,
+            'template_id': self.template_id,
+            'media_cache': media_cache.get_stats()
         }
@@ -0,0 +1,412 @@
+"""
+Компиляция шаблонов постов с переменными
+
+Шаблон разбирается один раз в список фрагментов: неизменяемый текст и
+типизированные переменные. При отправке в группу остается только подставить
+значения переменных и склеить фрагменты одним join.
+
+Микробенчмарк: benchmarks/template_render.py
+"""
+import copy
+import random
+import re
+from bisect import bisect_left
+from datetime import datetime
+from html.parser import HTMLParser
+import pytz
+from telethon.extensions import html
+from telethon.tl.types import MessageEntityTextUrl
+
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+# Переменные шаблона: {name} или {random_number:min:max}
+VARIABLE_PATTERN = re.compile(
+    r'\{(?:(date|time|datetime|chat_id|chat_title|random_number)|random_number:(\d+):(\d+))\}'
+)
+
+# Типы переменных
+VAR_DATE = 1
+VAR_TIME = 2
+VAR_DATETIME = 3
+VAR_CHAT_ID = 4
+VAR_CHAT_TITLE = 5
+VAR_RANDOM = 6
+
+# Ограничения Telegram на длину текста (после разбора разметки)
+MAX_MESSAGE_LENGTH = 4096
+MAX_CAPTION_LENGTH = 1024
+
+# Максимальная длина значений переменных при проверке шаблона
+VARIABLE_MAX_LENGTH = {
+    VAR_DATE: 10,
+    VAR_TIME: 5,
+    VAR_DATETIME: 16,
+    VAR_CHAT_ID: 20,
+    VAR_CHAT_TITLE: 128
+}
+
+# Теги, которые поддерживает разбор HTML в Telethon
+SUPPORTED_TAGS = {'b', 'strong', 'i', 'em', 'u', 's', 'del', 'blockquote', 'code', 'pre', 'a'}
+
+# Маркер переменной при предварительном разборе HTML (символ из области частного использования)
+SLOT_MARKER = '\ue000'
+
+VARIABLE_KINDS = {
+    'date': VAR_DATE,
+    'time': VAR_TIME,
+    'datetime': VAR_DATETIME,
+    'chat_id': VAR_CHAT_ID,
+    'chat_title': VAR_CHAT_TITLE,
+    'random_number': VAR_RANDOM
+}
+
+
+class RenderContext:
+    """
+    Значения даты и времени для одного запуска публикации
+    
+    Вычисляются один раз и используются для всех групп запуска.
+    """
+    
+    __slots__ = ('date', 'time', 'datetime')
+    
+    def __init__(self, now: datetime = None):
+        now = now or datetime.now(pytz.utc).astimezone(MOSCOW_TZ)
+        self.date = now.strftime('%d.%m.%Y')
+        self.time = now.strftime('%H:%M')
+        self.datetime = f'{self.date} {self.time}'
+
+
+class CompiledTemplate:
+    """
+    Шаблон, разобранный на фрагменты текста и переменные
+    
+    Кроме HTML-фрагментов хранит заранее разобранный текст без разметки и
+    список entities, чтобы при отправке не разбирать HTML для каждой группы:
+    после подстановки переменных сдвигаются только смещения entities.
+    """
+    
+    __slots__ = ('parts', 'slots', 'plain_parts', 'entities')
+    
+    def __init__(self, parts: list, slots: list, plain_parts: list = None, entities: list = None):
+        # parts - фрагменты текста; на местах переменных стоит исходный текст переменной
+        # slots - список (индекс в parts, тип переменной, аргумент)
+        # plain_parts - текст без разметки между переменными (len(slots) + 1 фрагментов)
+        # entities - список (entity, номер первой переменной внутри entity, номер первой после нее)
+        self.parts = parts
+        self.slots = slots
+        self.plain_parts = plain_parts
+        self.entities = entities
+    
+    @property
+    def has_variables(self) -> bool:
+        return bool(self.slots)
+    
+    @property
+    def is_preparsed(self) -> bool:
+        """Разметка разобрана заранее (иначе текст отправляется с parse_mode='html')"""
+        return self.plain_parts is not None
+    
+    def _values(self, context: RenderContext, chat_id: str = None, chat_title: str = None) -> list:
+        """Значения переменных в порядке их следования в шаблоне"""
+        values = []
+        for index, kind, arg in self.slots:
+            if kind == VAR_RANDOM:
+                values.append(str(random.randint(arg[0], arg[1])))
+            elif kind == VAR_DATE:
+                values.append(context.date)
+            elif kind == VAR_TIME:
+                values.append(context.time)
+            elif kind == VAR_DATETIME:
+                values.append(context.datetime)
+            elif kind == VAR_CHAT_ID and chat_id:
+                values.append(str(chat_id))
+            elif kind == VAR_CHAT_TITLE and chat_title:
+                values.append(chat_title)
+            else:
+                # Значение не задано: переменная остается как есть
+                values.append(self.parts[index])
+        return values
+    
+    def render(self, context: RenderContext, chat_id: str = None, chat_title: str = None) -> str:
+        """
+        Подстановка значений переменных
+        
+        Args:
+            context: Значения даты и времени запуска
+            chat_id: ID чата (если не задан, переменная остается как есть)
+            chat_title: Название чата (если не задано, переменная остается как есть)
+        
+        Returns:
+            Текст поста
+        """
+        if not self.slots:
+            return self.parts[0] if len(self.parts) == 1 else ''.join(self.parts)
+        
+        parts = self.parts[:]
+        for (index, _, _), value in zip(self.slots, self._values(context, chat_id, chat_title)):
+            parts[index] = value
+        return ''.join(parts)
+    
+    def render_message(self, context: RenderContext, chat_id: str = None, chat_title: str = None) -> tuple:
+        """
+        Подстановка значений переменных в заранее разобранный текст
+        
+        Args:
+            context: Значения даты и времени запуска
+            chat_id: ID чата (если не задан, переменная остается как есть)
+            chat_title: Название чата (если не задано, переменная остается как есть)
+        
+        Returns:
+            Кортеж (текст без разметки, список entities) или (HTML-текст, None),
+            если шаблон не удалось разобрать заранее
+        """
+        if self.plain_parts is None:
+            return self.render(context, chat_id, chat_title), None
+        
+        if not self.slots:
+            return self.plain_parts[0], [entity for entity, _, _ in self.entities]
+        
+        values = self._values(context, chat_id, chat_title)
+        
+        parts = [self.plain_parts[0]]
+        # shifts[k] - суммарный сдвиг (в UTF-16) от первых k переменных
+        shifts = [0]
+        for value, plain in zip(values, self.plain_parts[1:]):
+            parts.append(value)
+            parts.append(plain)
+            shifts.append(shifts[-1] + _utf16_len(value) - 1)
+        
+        entities = []
+        for entity, first, end in self.entities:
+            if shifts[first] == 0 and shifts[end] == 0:
+                entities.append(entity)
+                continue
+            entity = copy.copy(entity)
+            entity.offset += shifts[first]
+            entity.length += shifts[end] - shifts[first]
+            entities.append(entity)
+        return ''.join(parts), entities
+
+
+def _utf16_len(text: str) -> int:
+    """Длина строки в единицах UTF-16 (в них Telegram считает смещения entities)"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _preparse(parts: list, slots: list):
+    """
+    Разбор HTML шаблона с маркерами на местах переменных
+    
+    Returns:
+        Кортеж (plain_parts, entities) или (None, None), если переменные
+        попадают внутрь атрибутов разметки или разметку нельзя разобрать заранее
+    """
+    if any(SLOT_MARKER in part for part in parts):
+        return None, None
+    
+    marked = parts[:]
+    for index, _, _ in slots:
+        marked[index] = SLOT_MARKER
+    
+    try:
+        plain, entities = html.parse(''.join(marked))
+    except Exception:
+        return None, None
+    
+    plain_parts = plain.split(SLOT_MARKER)
+    if len(plain_parts) != len(slots) + 1:
+        return None, None
+    
+    for entity in entities:
+        # Упоминания по ID требуют запроса к Telegram при разборе, их оставляем Telethon
+        if isinstance(entity, MessageEntityTextUrl) and entity.url.startswith('tg://user?id='):
+            return None, None
+    
+    # Смещения маркеров в UTF-16 (каждый маркер занимает одну единицу)
+    marker_offsets = []
+    offset = 0
+    for plain_part in plain_parts[:-1]:
+        offset += _utf16_len(plain_part)
+        marker_offsets.append(offset)
+        offset += 1
+    
+    entity_slots = []
+    for entity in entities:
+        first = bisect_left(marker_offsets, entity.offset)
+        end = bisect_left(marker_offsets, entity.offset + entity.length)
+        entity_slots.append((entity, first, end))
+    return plain_parts, entity_slots
+
+
+def compile_template(text: str, variables: bool = True) -> CompiledTemplate:
+    """
+    Разбор текста шаблона
+    
+    Args:
+        text: Текст шаблона
+        variables: Подставлять ли переменные (False для текста поста из файла)
+    
+    Returns:
+        Скомпилированный шаблон
+    """
+    parts = []
+    slots = []
+    literal = []
+    position = 0
+    
+    for match in (VARIABLE_PATTERN.finditer(text) if variables else ()):
+        literal.append(text[position:match.start()])
+        position = match.end()
+        
+        name = match.group(1)
+        if name:
+            kind = VARIABLE_KINDS[name]
+            arg = (1, 1000) if kind == VAR_RANDOM else None
+        else:
+            min_val, max_val = int(match.group(2)), int(match.group(3))
+            if min_val > max_val:
+                # Некорректный диапазон остается в тексте как есть
+                literal.append(match.group(0))
+                continue
+            kind, arg = VAR_RANDOM, (min_val, max_val)
+        
+        parts.append(''.join(literal))
+        literal = []
+        slots.append((len(parts), kind, arg))
+        parts.append(match.group(0))
+    
+    literal.append(text[position:])
+    parts.append(''.join(literal))
+    return CompiledTemplate(parts, slots, *_preparse(parts, slots))
+
+
+class _MarkupChecker(HTMLParser):
+    """
+    Проверка HTML-разметки шаблона
+    
+    Незакрытые теги и нарушенная вложенность считаются ошибками, неподдерживаемые
+    теги - предупреждениями (Telethon их пропускает, но оформление теряется).
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.errors = []
+        self.warnings = []
+        self._open_tags = []
+    
+    def handle_starttag(self, tag, attrs):
+        if tag not in SUPPORTED_TAGS:
+            self.warnings.append(f"Неподдерживаемый тег <{tag}>")
+            return
+        if tag == 'a' and not dict(attrs).get('href'):
+            self.errors.append("Ссылка <a> без атрибута href")
+        self._open_tags.append(tag)
+    
+    def handle_startendtag(self, tag, attrs):
+        self.warnings.append(f"Неподдерживаемый тег <{tag}/>")
+    
+    def handle_endtag(self, tag):
+        if tag not in SUPPORTED_TAGS:
+            return
+        if not self._open_tags or self._open_tags[-1] != tag:
+            if tag in self._open_tags:
+                self.errors.append(f"Нарушена вложенность тегов: </{tag}> закрывает <{self._open_tags[-1]}>")
+                while self._open_tags.pop() != tag:
+                    pass
+            else:
+                self.errors.append(f"Закрывающий тег </{tag}> без открывающего")
+            return
+        self._open_tags.pop()
+    
+    def close(self):
+        super().close()
+        for tag in reversed(self._open_tags):
+            self.errors.append(f"Незакрытый тег <{tag}>")
+        self._open_tags = []
+
+
+def validate_template(text: str, has_image: bool, variables: bool = True) -> dict:
+    """
+    Проверка шаблона до отправки: разметка и длина текста с учетом худшего случая подстановки
+    
+    Args:
+        text: Текст шаблона
+        has_image: Отправляется ли пост с изображением (тогда действует лимит подписи)
+        variables: Подставляются ли переменные
+        
+    Returns:
+        Словарь с полями valid, errors, warnings, max_length, limit, has_image
+    """
+    errors = []
+    
+    checker = _MarkupChecker()
+    checker.feed(text or '')
+    checker.close()
+    errors.extend(checker.errors)
+    
+    # Подставляем значения максимальной длины
+    compiled = compile_template(text or '', variables)
+    parts = compiled.parts[:]
+    for index, kind, arg in compiled.slots:
+        width = len(str(arg[1])) if kind == VAR_RANDOM else VARIABLE_MAX_LENGTH[kind]
+        parts[index] = 'W' * width
+    
+    try:
+        plain, _ = html.parse(''.join(parts))
+    except Exception as e:
+        errors.append(f"Ошибка разбора HTML: {e}")
+        plain = ''
+    
+    max_length = _utf16_len(plain)
+    limit = MAX_CAPTION_LENGTH if has_image else MAX_MESSAGE_LENGTH
+    if not plain.strip():
+        errors.append("Текст поста пуст")
+    elif max_length > limit:
+        kind = "подписи к изображению" if has_image else "сообщения"
+        errors.append(f"Длина текста до {max_length} символов превышает лимит {kind} ({limit})")
+    
+    return {
+        'valid': not errors,
+        'errors': errors,
+        'warnings': checker.warnings,
+        'max_length': max_length,
+        'limit': limit,
+        'has_image': has_image
+    }
+
+
+class TemplateCache:
+    """Кэш скомпилированных шаблонов по ID и версии шаблона"""
+    
+    def __init__(self):
+        self._compiled = {}
+    
+    def get(self, template_id, version, text: str) -> CompiledTemplate:
+        """
+        Получение скомпилированного шаблона (компиляция при первом обращении)
+        
+        Args:
+            template_id: ID шаблона
+            version: Версия шаблона (время последнего изменения)
+            text: Текст шаблона
+        
+        Returns:
+            Скомпилированный шаблон
+        """
+        key = (template_id, version)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            # Старые версии шаблона больше не нужны
+            for old_key in [k for k in self._compiled if k[0] == template_id]:
+                del self._compiled[old_key]
+            compiled = compile_template(text)
+            self._compiled[key] = compiled
+        return compiled
+    
+    def clear(self):
+        self._compiled.clear()
+
+
+# Общий кэш скомпилированных шаблонов
+template_cache = TemplateCache()
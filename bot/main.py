@@ -9,9 +9,9 @@ import threading
 from pathlib import Path
 
 from config import API_ID, API_HASH, PHONE_NUMBER, ADMIN_ID, DATA_DIR
-from db import db
+from db import db, publication_results, SchemaVersionError
 from scheduler import PostScheduler
-from telegram_client import telegram_client
+from telegram_client import telegram_client, accounts
 from web_server import run_web_server
 
 
@@ -35,21 +35,40 @@ async def on_startup():
     DATA_DIR.mkdir(exist_ok=True)
     
     # Инициализируем базу данных
-    await db.init_db()
+    try:
+        await db.init_db()
+    except SchemaVersionError as e:
+        logger.error(str(e))
+        return False
     logger.info("База данных инициализирована")
     
+    # Переносим устаревшую историю публикаций в архив
+    archived = await db.archive_publication_history()
+    if archived:
+        logger.info(f"В архив перенесено записей истории: {archived}")
+    
     # Запускаем Telegram клиент
     success = await telegram_client.start()
     if not success:
         logger.error("Не удалось авторизоваться в Telegram")
         return False
     
+    # Загружаем кэш peer'ов, чтобы отправка не разрешала чаты заново
+    await telegram_client.load_peer_cache()
+    
+    # Запускаем дополнительные аккаунты для распределения групп
+    await accounts.start_extra()
+    logger.info(f"Доступно аккаунтов для публикации: {len(accounts.healthy())}")
+    
     # Создаем планировщик (не запускаем автоматически)
     scheduler = PostScheduler()
+    await scheduler.post_handler.load_post_content()
     
     # Передаем планировщик в веб-сервер
-    from web_server import set_scheduler
+    from web_server import set_scheduler, set_main_loop
     set_scheduler(scheduler)
+    # Корутины веб-запросов выполняются в этом event loop
+    set_main_loop(asyncio.get_running_loop())
     
     # Запускаем веб-сервер в отдельном потоке
     web_thread = threading.Thread(
@@ -75,8 +94,14 @@ async def on_shutdown():
     """Функция, выполняемая при остановке"""
     logger.info("Остановка системы...")
 
-    # Останавливаем Telegram клиент
-    await telegram_client.stop()
+    # Останавливаем Telegram клиенты всех аккаунтов
+    await accounts.stop()
+
+    # Записываем результаты публикаций, оставшиеся в буфере
+    await publication_results.flush()
+
+    # Закрываем соединения с базой данных
+    await db.close()
     logger.info("Система остановлена")
 
 
@@ -93,8 +118,9 @@ async def main():
         logger.info("Ожидание веб-запросов...")
 
         # Ожидаем до получения сигнала остановки
+        # (при обрыве соединения клиент переподключается сам)
         try:
-            while telegram_client.is_connected():
+            while telegram_client.is_running:
                 await asyncio.sleep(1)
         except KeyboardInterrupt:
             logger.info("Получен сигнал остановки (Ctrl+C)")
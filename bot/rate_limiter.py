@@ -0,0 +1,198 @@
+"""
+Адаптивный ограничитель частоты запросов к Telegram
+"""
+import asyncio
+import logging
+import time
+from telethon.errors import FloodWaitError, SlowModeWaitError
+from config import (
+    RATE_LIMIT_RATE, RATE_LIMIT_BURST, RATE_LIMIT_MIN_RATE, RATE_LIMIT_MAX_RATE,
+    RATE_LIMIT_CHAT_INTERVAL, RATE_LIMIT_INCREASE_AFTER
+)
+
+logger = logging.getLogger(__name__)
+
+# Максимальное количество хранимых корзин отдельных чатов
+MAX_CHAT_BUCKETS = 1000
+
+
+class TokenBucket:
+    """Корзина токенов с возможностью блокировки на заданное время"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+    
+    def _refill(self, now: float):
+        """Пополнение токенов с момента последнего обновления"""
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+    
+    def delay(self, now: float) -> float:
+        """
+        Время ожидания до появления свободного токена
+        
+        Returns:
+            Количество секунд (0 если токен доступен сразу)
+        """
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+    
+    def take(self, now: float):
+        """Списание одного токена"""
+        self._refill(now)
+        self.tokens -= 1
+    
+    def block(self, seconds: float, now: float):
+        """Блокировка корзины (например, на время FloodWait)"""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0
+        self.updated = now
+    
+    def is_idle(self, now: float) -> bool:
+        """Корзина полная и не заблокирована (ее можно удалить)"""
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+    
+    def get_state(self, now: float) -> dict:
+        """Состояние корзины для API (без изменения корзины, вызывается из веб-потока)"""
+        tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+        return {
+            'rate_per_minute': round(self.rate * 60, 2),
+            'capacity': self.capacity,
+            'tokens': round(tokens, 2),
+            'blocked_for': round(max(0.0, self.blocked_until - now), 1)
+        }
+
+
+class RateLimiter:
+    """
+    Общий ограничитель для всех исходящих запросов аккаунта
+    
+    Состоит из корзины на весь аккаунт и отдельных корзин для чатов.
+    Время ожидания берется из ошибок FloodWait и SlowModeWait; после
+    FloodWait скорость аккаунта уменьшается вдвое, а после серии успешных
+    запросов постепенно растет обратно до RATE_LIMIT_MAX_RATE.
+    """
+    
+    def __init__(self):
+        self.account = TokenBucket(RATE_LIMIT_RATE, RATE_LIMIT_BURST)
+        self.chats = {}
+        self.flood_waits = 0
+        self.slow_mode_waits = 0
+        self.last_flood_wait = None
+        self._success_streak = 0
+    
+    def _chat_bucket(self, chat_key: str, now: float) -> TokenBucket:
+        """Получение (или создание) корзины чата"""
+        bucket = self.chats.get(chat_key)
+        if bucket is None:
+            if len(self.chats) >= MAX_CHAT_BUCKETS:
+                # Удаляем корзины чатов, которые давно не использовались
+                for key in [k for k, b in self.chats.items() if b.is_idle(now)]:
+                    del self.chats[key]
+            bucket = TokenBucket(1 / RATE_LIMIT_CHAT_INTERVAL, 1)
+            self.chats[chat_key] = bucket
+        return bucket
+    
+    async def acquire(self, chat_key: str = None):
+        """
+        Ожидание разрешения на запрос
+        
+        Args:
+            chat_key: Ключ чата (None для запросов, не привязанных к чату)
+        """
+        while True:
+            now = time.monotonic()
+            wait = self.account.delay(now)
+            chat_bucket = self._chat_bucket(chat_key, now) if chat_key else None
+            if chat_bucket:
+                wait = max(wait, chat_bucket.delay(now))
+            
+            if wait <= 0:
+                self.account.take(now)
+                if chat_bucket:
+                    chat_bucket.take(now)
+                return
+            
+            await asyncio.sleep(wait)
+    
+    def on_success(self):
+        """Учет успешного запроса: постепенное увеличение скорости"""
+        self._success_streak += 1
+        if self._success_streak >= RATE_LIMIT_INCREASE_AFTER and self.account.rate < RATE_LIMIT_MAX_RATE:
+            self.account.rate = min(RATE_LIMIT_MAX_RATE, self.account.rate * 1.1)
+            self._success_streak = 0
+    
+    def on_flood_wait(self, seconds: int):
+        """Учет FloodWait: блокировка аккаунта и снижение скорости"""
+        now = time.monotonic()
+        self.account.block(seconds, now)
+        self.account.rate = max(RATE_LIMIT_MIN_RATE, self.account.rate / 2)
+        self._success_streak = 0
+        self.flood_waits += 1
+        self.last_flood_wait = seconds
+        logger.warning(
+            f"FloodWait {seconds} сек: отправка приостановлена, "
+            f"скорость снижена до {self.account.rate * 60:.1f} запросов/мин"
+        )
+    
+    def on_slow_mode(self, chat_key: str, seconds: int):
+        """Учет медленного режима в чате: блокировка только этого чата"""
+        now = time.monotonic()
+        self._chat_bucket(chat_key, now).block(seconds, now)
+        self.slow_mode_waits += 1
+        logger.warning(f"Медленный режим в чате {chat_key}: ожидание {seconds} сек")
+    
+    async def call(self, coro_factory, chat_key: str = None):
+        """
+        Выполнение запроса с учетом ограничений
+        
+        Args:
+            coro_factory: Функция без аргументов, возвращающая корутину запроса
+            chat_key: Ключ чата (опционально)
+        
+        Returns:
+            Результат запроса
+        """
+        await self.acquire(chat_key)
+        try:
+            result = await coro_factory()
+        except FloodWaitError as e:
+            self.on_flood_wait(e.seconds)
+            raise
+        except SlowModeWaitError as e:
+            if chat_key:
+                self.on_slow_mode(chat_key, e.seconds)
+            raise
+        self.on_success()
+        return result
+    
+    def get_state(self) -> dict:
+        """
+        Состояние ограничителя для API
+        
+        Returns:
+            Словарь с состоянием корзины аккаунта и заблокированных чатов
+        """
+        now = time.monotonic()
+        blocked_chats = {
+            key: bucket.get_state(now)
+            for key, bucket in list(self.chats.items())
+            if bucket.blocked_until > now
+        }
+        return {
+            'account': self.account.get_state(now),
+            'chat_buckets': len(self.chats),
+            'blocked_chats': blocked_chats,
+            'flood_waits': self.flood_waits,
+            'slow_mode_waits': self.slow_mode_waits,
+            'last_flood_wait': self.last_flood_wait
+        }
@@ -4,15 +4,21 @@
 import asyncio
 import random
 import logging
+from collections import deque
 from datetime import datetime, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.executors.asyncio import AsyncIOExecutor
 from apscheduler.jobstores.memory import MemoryJobStore
-from config import MIN_DELAY, MAX_DELAY, PUBLICATION_RETRY_ATTEMPTS, PUBLICATION_RETRY_DELAY
-from db import db
-from handlers.post import PostHandler
+from config import (
+    MIN_DELAY, MAX_DELAY, PUBLICATION_RETRY_ATTEMPTS, PUBLICATION_RETRY_DELAY,
+    PUBLICATION_CONCURRENCY, PUBLICATION_RUN_WINDOW, RATE_LIMIT_MAX_WAIT, WEB_EVENTS_ERRORS
+)
+from db import db, publication_results
+from events import events
+from handlers.post import PostHandler, media_cache, RATE_LIMIT_ERRORS
+from telegram_client import accounts, ACCOUNT_FAILED_ERRORS, SendStatusUnknownError
 
 # Используем pytz для работы с часовыми поясами (уже установлен как зависимость APScheduler)
 import pytz
@@ -58,14 +64,17 @@ class PostScheduler:
             'current_group': None,
             'start_time': None,
             'last_update': None,
-            'errors': []
+            'errors': [],
+            'unknown_groups': 0,
+            'concurrency': 0,
+            'accounts': {}
         }
     
-    def reload_post(self):
+    async def reload_post(self):
         """Перезагрузка содержимого поста из файлов"""
         logger.info("Перезагрузка поста в планировщике...")
         if self.post_handler:
-            self.post_handler._load_post_content()
+            await self.post_handler.load_post_content()
             logger.info("Пост успешно перезагружен в планировщике")
         else:
             logger.warning("post_handler не инициализирован в планировщике")
@@ -73,9 +82,7 @@ class PostScheduler:
     async def start(self):
         """Запуск планировщика с активным расписанием"""
         try:
-            # Инициализация базы данных
-            await db.init_db()
-            
+            # Схема базы данных уже проверена при запуске (on_startup)
             # Получаем активное расписание
             schedule = await db.get_active_schedule()
             
@@ -118,6 +125,7 @@ class PostScheduler:
             import traceback
             traceback.print_exc()
             self.is_running = False
+        events.publish('status')
     
     async def _setup_default_interval(self):
         """Настройка интервала по умолчанию (для обратной совместимости)"""
@@ -294,6 +302,7 @@ class PostScheduler:
             logger.error(f"💥 Критическая ошибка при остановке планировщика: {e}")
             print(f"💥 Критическая ошибка при остановке планировщика: {e}")
             self.is_running = False
+        events.publish('status')
     
     async def reload_schedule(self):
         """Перезагрузка расписания (например, после изменения в БД)"""
@@ -329,6 +338,7 @@ class PostScheduler:
             else:
                 # Если нет активного расписания, используем интервал по умолчанию
                 await self._setup_default_interval()
+            events.publish('status')
                 
         except Exception as e:
             logger.error(f"Ошибка перезагрузки расписания: {e}")
@@ -354,6 +364,7 @@ class PostScheduler:
                 id='post_job',
                 replace_existing=True
             )
+        events.publish('status')
         
         # Форматируем интервал для вывода
         if minutes < 60:
@@ -429,7 +440,9 @@ class PostScheduler:
             'current_group': None,
             'start_time': moscow_now,
             'last_update': moscow_now,
-            'errors': []
+            'errors': [],
+            'unknown_groups': 0,
+            'accounts': {}
         })
         
         try:
@@ -449,126 +462,50 @@ class PostScheduler:
                 self._update_status("Нет групп для публикации")
                 return
             
+            # Шаблон, нарушающий лимиты Telegram, не отправится ни в одну группу
+            validation = self.post_handler.validate()
+            if not validation['valid']:
+                error_msg = f"Пост не прошел проверку: {'; '.join(validation['errors'])}"
+                logger.error(f"❌ Публикация отменена. {error_msg}")
+                self.publication_status['errors'].append({
+                    'group': 'SYSTEM',
+                    'error': error_msg,
+                    'time': datetime.now(pytz.utc).astimezone(MOSCOW_TZ)
+                })
+                self._update_status(f"Публикация отменена: {error_msg}")
+                return
+            
             # Обновляем статус
             self.publication_status.update({
                 'total_groups': len(groups),
                 'current_step': f'Публикация в {len(groups)} групп'
             })
             
+            # Прогреваем постоянные соединения аккаунтов до первой отправки
+            for account in accounts.healthy():
+                if not await account.run(account.warm_up()):
+                    logger.warning(f"⚠️ [{account.name}] Соединение с Telegram не готово, отправка попробует переподключиться")
+            
             logger.info(f"📊 Начинаем публикацию в {len(groups)} групп...")
             self._update_status(f"Публикация в {len(groups)} групп")
             
-            for i, group in enumerate(groups):
-                # Проверяем статус перед каждой публикацией только для запланированных задач
-                if is_scheduled_job and not self.is_running:
-                    logger.warning(f"⚠️ Планировщик остановлен во время публикации. Остановлено на группе {i+1}/{len(groups)}")
-                    self._update_status(f"Публикация остановлена на группе {i+1}/{len(groups)}")
-                    break
-                
-                try:
-                    # Обрабатываем разные форматы данных
-                    if len(group) >= 5:
-                        chat_id, title, username, added_at, last_posted = group
-                    elif len(group) >= 4:
-                        chat_id, title, added_at, last_posted = group
-                        username = None
-                    else:
-                        chat_id, title = group[0], group[1] if len(group) > 1 else "Unknown"
-                        username = None
-                    
-                    # Обновляем текущую группу
-                    group_name = title or username or chat_id
-                    self.publication_status.update({
-                        'current_group': group_name,
-                        'current_step': f'Публикация в группу {i+1}/{len(groups)}: {group_name}'
-                    })
-                    
-                    logger.info(f"📤 [{i+1}/{len(groups)}] Публикация в группу: {group_name}")
-                    self._update_status(f"Публикация в группу {i+1}/{len(groups)}: {group_name}")
-                    
-                    # Публикуем пост, используя username если доступен
-                    target = username if username else chat_id
-                    
-                    # Пытаемся отправить пост с повторными попытками
-                    success, retry_count = await self._send_post_with_retry(target, group_name, i+1, len(groups))
-                    
-                    # Записываем в историю публикаций
-                    if success:
-                        # Обновляем время последней публикации
-                        await db.update_last_posted(chat_id)
-                        # Записываем успешную публикацию в историю
-                        await db.add_publication_history(
-                            chat_id=chat_id,
-                            chat_title=group_name,
-                            chat_username=username,
-                            status='success',
-                            retry_count=retry_count
-                        )
-                        logger.info(f"✅ [{i+1}/{len(groups)}] Пост отправлен в группу {group_name}")
-                        self._update_status(f"✅ Группа {i+1}/{len(groups)}: {group_name} - успешно")
-                    else:
-                        error_msg = f"Ошибка отправки в группу {group_name} после {PUBLICATION_RETRY_ATTEMPTS} попыток"
-                        logger.error(f"❌ [{i+1}/{len(groups)}] {error_msg}")
-                        # Записываем неудачную публикацию в историю
-                        await db.add_publication_history(
-                            chat_id=chat_id,
-                            chat_title=group_name,
-                            chat_username=username,
-                            status='error',
-                            error_message=error_msg,
-                            retry_count=retry_count
-                        )
-                        self.publication_status['errors'].append({
-                            'group': group_name,
-                            'error': error_msg,
-                            'time': datetime.now(pytz.utc).astimezone(MOSCOW_TZ)
-                        })
-                        self._update_status(f"❌ Группа {i+1}/{len(groups)}: {group_name} - ошибка")
-                    
-                    # Обновляем счетчик завершенных групп
-                    self.publication_status['completed_groups'] = i + 1
-                    
-                    # Добавляем случайную задержку между отправками (кроме последней)
-                    if i < len(groups) - 1:
-                        delay = random.randint(MIN_DELAY, MAX_DELAY)
-                        logger.info(f"⏳ Ожидание {delay} секунд перед следующей отправкой...")
-                        self._update_status(f"Ожидание {delay} секунд...")
-                        
-                        # Проверяем статус во время задержки только для запланированных задач
-                        if is_scheduled_job:
-                            for _ in range(delay):
-                                if not self.is_running:
-                                    logger.warning("⚠️ Планировщик остановлен во время задержки")
-                                    break
-                                await asyncio.sleep(1)
-                            
-                            # Если планировщик остановлен, прекращаем публикацию
-                            if not self.is_running:
-                                break
-                        else:
-                            # Для немедленной публикации просто ждем
-                            await asyncio.sleep(delay)
-                
-                except Exception as e:
-                    error_msg = f"Ошибка при публикации в группу {chat_id}: {e}"
-                    logger.error(f"❌ {error_msg}")
-                    # Записываем исключение в историю
-                    await db.add_publication_history(
-                        chat_id=chat_id,
-                        chat_title=chat_id,  # Если не удалось получить название
-                        chat_username=username,
-                        status='error',
-                        error_message=str(e),
-                        retry_count=0
-                    )
-                    self.publication_status['errors'].append({
-                        'group': chat_id,
-                        'error': error_msg,
-                            'time': datetime.now(pytz.utc).astimezone(MOSCOW_TZ)
-                    })
-                    continue
+            # Дата и время в переменных шаблона вычисляются один раз на запуск
+            self.post_handler.start_run()
+            try:
+                await self._dispatch_groups(groups, is_scheduled_job)
+            finally:
+                self.post_handler.finish_run()
+                # Записываем оставшиеся результаты запуска
+                await publication_results.flush()
+            
+            # Переносим устаревшую историю в архив, пока до следующего запуска есть время
+            archived = await db.archive_publication_history()
+            if archived:
+                logger.info(f"🗄 В архив перенесено записей истории: {archived}")
             
             # Завершаем публикацию
+            media_stats = media_cache.get_stats()
+            logger.info(f"🖼 Загрузок изображения: {media_stats['uploads']}, пропущено повторных загрузок: {media_stats['skipped_uploads']}")
             total_errors = len(self.publication_status['errors'])
             if is_scheduled_job and not self.is_running:
                 logger.warning("⚠️ Публикация прервана из-за остановки планировщика")
@@ -597,8 +534,364 @@ class PostScheduler:
                 'current_step': 'Завершено' if (not is_scheduled_job or self.is_running) else 'Прервано',
                 'last_update': datetime.now(pytz.utc).astimezone(MOSCOW_TZ)
             })
+            self._publish_status()
+            events.publish('run_finished', {
+                'total_groups': self.publication_status['total_groups'],
+                'completed_groups': self.publication_status['completed_groups'],
+                'unknown_groups': self.publication_status['unknown_groups'],
+                'errors': len(self.publication_status['errors']),
+                'finished_at': int(self.publication_status['last_update'].timestamp())
+            })
+    
+    async def _dispatch_groups(self, groups: list, is_scheduled_job: bool):
+        """
+        Рассылка по группам с ограниченным числом одновременных отправок
+        
+        Группы распределяются между аккаунтами пула (закрепление сохраняется
+        в БД), и каждый аккаунт рассылает свою часть параллельно с остальными
+        в PUBLICATION_CONCURRENCY потоков. Случайная задержка MIN_DELAY..MAX_DELAY
+        выдерживается внутри каждого потока между его отправками. Если задан
+        PUBLICATION_RUN_WINDOW, отправки равномерно распределяются по этому окну
+        вместо случайных задержек. Если аккаунт отключается во время рассылки,
+        его оставшиеся группы передаются работоспособным аккаунтам.
+        
+        Args:
+            groups: Список активных групп
+            is_scheduled_job: True для запланированной публикации
+        """
+        total = len(groups)
+        loop = asyncio.get_running_loop()
+        run_start = loop.time()
+        # Интервал между стартами отправок в режиме окна
+        slot = PUBLICATION_RUN_WINDOW * 60 / total if PUBLICATION_RUN_WINDOW > 0 else None
+        queues = await self._assign_accounts(groups)
+        running = set()
+        lane_counts = {}
+        # Фоновые записи закрепления групп, переданных другим аккаунтам
+        assignment_writes = []
+        
+        for name, pending in queues.items():
+            self.publication_status['accounts'][name] = {
+                'total': len(pending),
+                'completed': 0,
+                'errors': 0,
+                'unknown': 0,
+                'healthy': True
+            }
+        
+        async def lane(account):
+            pending = queues[account.name]
+            try:
+                while pending:
+                    if not account.is_healthy():
+                        write = self._requeue_groups(account.name, queues, start_lanes)
+                        if write:
+                            assignment_writes.append(write)
+                        return
+                    
+                    i, group = pending.popleft()
+                    if is_scheduled_job and not self.is_running:
+                        logger.warning(f"⚠️ Планировщик остановлен во время публикации. Остановлено на группе {i+1}/{total}")
+                        self._update_status(f"Публикация остановлена на группе {i+1}/{total}")
+                        return
+                    
+                    if slot:
+                        # Ждем назначенного группе времени старта
+                        delay = run_start + i * slot - loop.time()
+                        if delay > 0 and not await self._wait(delay, is_scheduled_job):
+                            return
+                    
+                    try:
+                        await self._publish_to_group(group, i + 1, total, account)
+                    except ACCOUNT_FAILED_ERRORS:
+                        # Группа не обработана: вернется в очередь вместе с остальными
+                        pending.appendleft((i, group))
+                        continue
+                    
+                    # Случайная задержка перед следующей отправкой этого потока
+                    if not slot and pending:
+                        delay = random.randint(MIN_DELAY, MAX_DELAY)
+                        logger.info(f"⏳ [{account.name}] Ожидание {delay} секунд перед следующей отправкой...")
+                        self._update_status(f"Ожидание {delay} секунд...")
+                        if not await self._wait(delay, is_scheduled_job):
+                            return
+            finally:
+                lane_counts[account.name] -= 1
+        
+        def start_lanes(name):
+            account = accounts.get(name)
+            wanted = max(1, min(PUBLICATION_CONCURRENCY, len(queues[name])))
+            while lane_counts.get(name, 0) < wanted:
+                lane_counts[name] = lane_counts.get(name, 0) + 1
+                running.add(asyncio.ensure_future(lane(account)))
+        
+        for name in queues:
+            start_lanes(name)
+        
+        self.publication_status['concurrency'] = len(running)
+        if slot:
+            logger.info(f"🪟 Режим окна: {total} групп за {PUBLICATION_RUN_WINDOW} минут (~{slot:.1f} сек на группу), потоков: {len(running)}")
+        else:
+            logger.info(f"🔀 Аккаунтов: {len(queues)}, параллельных потоков отправки: {len(running)}")
+        
+        # Потоки могут добавляться во время рассылки (при передаче групп другому аккаунту)
+        try:
+            while running:
+                done, _ = await asyncio.wait(running)
+                running -= done
+                for task in done:
+                    task.result()
+        except BaseException:
+            # Ошибка одного потока (или отмена рассылки): остальные потоки останавливаем
+            # до выхода, чтобы они не продолжали отправку после завершения запуска
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            raise
+        finally:
+            for saved in await asyncio.gather(*assignment_writes, return_exceptions=True):
+                if isinstance(saved, BaseException):
+                    logger.error(f"❌ Ошибка сохранения закрепления переданных групп: {saved}")
+                elif not saved:
+                    logger.error("❌ Закрепление переданных групп не сохранено, оно будет назначено заново при следующем запуске")
     
-    async def _send_post_with_retry(self, target: str, group_name: str, current: int, total: int) -> tuple:
+    async def _assign_accounts(self, groups: list) -> dict:
+        """
+        Распределение групп между работоспособными аккаунтами
+        
+        Группа остается за своим аккаунтом, пока он работоспособен. Новые группы
+        и группы отключенных аккаунтов получает наименее загруженный аккаунт,
+        новое закрепление сохраняется в БД.
+        
+        Args:
+            groups: Список активных групп
+            
+        Returns:
+            Словарь {имя аккаунта: deque((индекс, группа))}
+        """
+        healthy = [account.name for account in accounts.healthy()]
+        if not healthy:
+            raise Exception("Нет доступных аккаунтов Telegram")
+        
+        assigned = await db.get_group_accounts()
+        queues = {name: deque() for name in healthy}
+        moved = []
+        
+        for i, group in enumerate(groups):
+            name = assigned.get(group[0])
+            if name in queues:
+                queues[name].append((i, group))
+            else:
+                moved.append((i, group))
+        
+        changes = []
+        for i, group in moved:
+            name = min(queues, key=lambda n: len(queues[n]))
+            queues[name].append((i, group))
+            changes.append((group[0], name))
+        
+        if changes:
+            await db.set_group_accounts(changes)
+            logger.info(f"👥 Назначено аккаунтов группам: {len(changes)}")
+        
+        return {name: pending for name, pending in queues.items() if pending}
+    
+    def _requeue_groups(self, failed_name: str, queues: dict, start_lanes):
+        """
+        Передача оставшихся групп отключенного аккаунта работоспособным аккаунтам
+        
+        Args:
+            failed_name: Имя отключенного аккаунта
+            queues: Очереди групп по аккаунтам
+            start_lanes: Функция запуска потоков отправки аккаунта
+        
+        Returns:
+            Задача записи нового закрепления в БД (результат - True при успехе) или None
+        """
+        pending = queues[failed_name]
+        failed_status = self.publication_status['accounts'][failed_name]
+        failed_status['healthy'] = False
+        if not pending:
+            return None
+        
+        healthy = [account.name for account in accounts.healthy()]
+        if not healthy:
+            error_msg = f"Нет работоспособных аккаунтов, не отправлено групп: {len(pending)}"
+            logger.error(f"❌ {error_msg}")
+            self.publication_status['errors'].append({
+                'group': 'SYSTEM',
+                'error': error_msg,
+                'time': datetime.now(pytz.utc).astimezone(MOSCOW_TZ)
+            })
+            pending.clear()
+            return None
+        
+        changes = []
+        targets = set()
+        while pending:
+            i, group = pending.popleft()
+            name = min(healthy, key=lambda n: len(queues.get(n, ())))
+            queues.setdefault(name, deque()).append((i, group))
+            changes.append((group[0], name))
+            targets.add(name)
+            account_status = self.publication_status['accounts'].setdefault(
+                name, {'total': 0, 'completed': 0, 'errors': 0, 'unknown': 0, 'healthy': True}
+            )
+            account_status['total'] += 1
+            failed_status['total'] -= 1
+        
+        logger.warning(f"🔁 Аккаунт {failed_name} отключен, групп передано другим аккаунтам: {len(changes)}")
+        # Закрепление сохраняется в фоне, чтобы не задерживать рассылку;
+        # результат проверяется по завершении рассылки (_dispatch_groups)
+        write = asyncio.ensure_future(db.set_group_accounts(changes))
+        for name in targets:
+            start_lanes(name)
+        return write
+    
+    async def _wait(self, delay: float, is_scheduled_job: bool) -> bool:
+        """
+        Ожидание с проверкой остановки планировщика
+        
+        Returns:
+            False если планировщик был остановлен во время ожидания
+        """
+        if not is_scheduled_job:
+            # Для немедленной публикации просто ждем
+            await asyncio.sleep(delay)
+            return True
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + delay
+        while loop.time() < deadline:
+            if not self.is_running:
+                logger.warning("⚠️ Планировщик остановлен во время задержки")
+                return False
+            await asyncio.sleep(min(1, deadline - loop.time()))
+        return self.is_running
+    
+    async def _publish_to_group(self, group: tuple, current: int, total: int, account=None):
+        """
+        Публикация в одну группу с записью результата в историю
+        
+        Args:
+            group: Кортеж группы из БД
+            current: Порядковый номер группы
+            total: Всего групп
+            account: Аккаунт, за которым закреплена группа
+        """
+        chat_id = group[0]
+        username = None
+        account_status = self.publication_status['accounts'].get(account.name) if account else None
+        requeued = False
+        try:
+            # Обрабатываем разные форматы данных
+            if len(group) >= 5:
+                chat_id, title, username, added_at, last_posted = group
+            elif len(group) >= 4:
+                chat_id, title, added_at, last_posted = group
+                username = None
+            else:
+                chat_id, title = group[0], group[1] if len(group) > 1 else "Unknown"
+                username = None
+            
+            # Обновляем текущую группу
+            group_name = title or username or chat_id
+            self.publication_status.update({
+                'current_group': group_name,
+                'current_step': f'Публикация в группу {current}/{total}: {group_name}'
+            })
+            
+            logger.info(f"📤 [{current}/{total}] Публикация в группу: {group_name}")
+            self._update_status(f"Публикация в группу {current}/{total}: {group_name}")
+            
+            # Публикуем пост, используя username если доступен
+            target = username if username else chat_id
+            
+            # Пытаемся отправить пост с повторными попытками
+            status, retry_count = await self._send_post_with_retry(target, group_name, current, total, account)
+            
+            # Записываем в историю публикаций
+            if status == 'success':
+                # Записываем успешную публикацию в историю
+                # (время последней публикации группы обновится вместе с записью)
+                await publication_results.add(
+                    chat_id=chat_id,
+                    chat_title=group_name,
+                    chat_username=username,
+                    status='success',
+                    retry_count=retry_count
+                )
+                logger.info(f"✅ [{current}/{total}] Пост отправлен в группу {group_name}")
+                self._update_status(f"✅ Группа {current}/{total}: {group_name} - успешно")
+            elif status == 'unknown':
+                # Отправка прервана по таймауту, и доставку проверить не удалось:
+                # это не ошибка группы, повторная отправка могла бы продублировать пост
+                logger.warning(f"❔ [{current}/{total}] Доставка в группу {group_name} не подтверждена")
+                await publication_results.add(
+                    chat_id=chat_id,
+                    chat_title=group_name,
+                    chat_username=username,
+                    status='unknown',
+                    error_message='Таймаут отправки, доставка не подтверждена',
+                    retry_count=retry_count
+                )
+                self.publication_status['unknown_groups'] += 1
+                if account_status:
+                    account_status['unknown'] += 1
+                self._update_status(f"❔ Группа {current}/{total}: {group_name} - доставка не подтверждена")
+            else:
+                error_msg = f"Ошибка отправки в группу {group_name} после {PUBLICATION_RETRY_ATTEMPTS} попыток"
+                logger.error(f"❌ [{current}/{total}] {error_msg}")
+                # Записываем неудачную публикацию в историю
+                await publication_results.add(
+                    chat_id=chat_id,
+                    chat_title=group_name,
+                    chat_username=username,
+                    status='error',
+                    error_message=error_msg,
+                    retry_count=retry_count
+                )
+                self.publication_status['errors'].append({
+                    'group': group_name,
+                    'error': error_msg,
+                    'time': datetime.now(pytz.utc).astimezone(MOSCOW_TZ)
+                })
+                if account_status:
+                    account_status['errors'] += 1
+                self._update_status(f"❌ Группа {current}/{total}: {group_name} - ошибка")
+        
+        except ACCOUNT_FAILED_ERRORS:
+            # Аккаунт отключен: группа будет отправлена другим аккаунтом
+            requeued = True
+            raise
+        except Exception as e:
+            error_msg = f"Ошибка при публикации в группу {chat_id}: {e}"
+            logger.error(f"❌ {error_msg}")
+            # Записываем исключение в историю
+            await publication_results.add(
+                chat_id=chat_id,
+                chat_title=chat_id,  # Если не удалось получить название
+                chat_username=username,
+                status='error',
+                error_message=str(e),
+                retry_count=0
+            )
+            self.publication_status['errors'].append({
+                'group': chat_id,
+                'error': error_msg,
+                'time': datetime.now(pytz.utc).astimezone(MOSCOW_TZ)
+            })
+            if account_status:
+                account_status['errors'] += 1
+        finally:
+            # Обновляем счетчик завершенных групп
+            if not requeued:
+                self.publication_status['completed_groups'] += 1
+                if account_status:
+                    account_status['completed'] += 1
+                self._publish_status()
+    
+    async def _send_post_with_retry(self, target: str, group_name: str, current: int, total: int, account=None) -> tuple:
         """
         Отправка поста с повторными попытками при ошибках
         
@@ -607,19 +900,24 @@ class PostScheduler:
             group_name: Название группы для логирования
             current: Номер текущей группы
             total: Всего групп
+            account: Аккаунт для отправки
             
         Returns:
-            tuple: (success: bool, retry_count: int)
+            tuple: (status: str, retry_count: int), где status - 'success', 'error'
+            или 'unknown' (таймаут отправки, доставку проверить не удалось)
         """
         retry_count = 0
-        for attempt in range(1, PUBLICATION_RETRY_ATTEMPTS + 1):
+        attempt = 0
+        rate_limit_waits = 0
+        while attempt < PUBLICATION_RETRY_ATTEMPTS:
+            attempt += 1
             try:
-                success = await self.post_handler.send_post_to_group(target, group_name)
+                success = await self.post_handler.send_post_to_group(target, group_name, account)
                 
                 if success:
                     if attempt > 1:
                         logger.info(f"✅ [{current}/{total}] Пост отправлен в группу {group_name} после {attempt} попыток")
-                    return True, retry_count
+                    return 'success', retry_count
                 else:
                     retry_count = attempt
                     if attempt < PUBLICATION_RETRY_ATTEMPTS:
@@ -627,7 +925,34 @@ class PostScheduler:
                         await asyncio.sleep(PUBLICATION_RETRY_DELAY)
                     else:
                         logger.error(f"❌ [{current}/{total}] Все {PUBLICATION_RETRY_ATTEMPTS} попыток отправки в {group_name} не удались")
-                        return False, retry_count
+                        return 'error', retry_count
+            except RATE_LIMIT_ERRORS as e:
+                # Ограничение Telegram не расходует попытку: паузу выдержит
+                # ограничитель частоты перед следующим запросом
+                attempt -= 1
+                rate_limit_waits += 1
+                if e.seconds > RATE_LIMIT_MAX_WAIT or rate_limit_waits > PUBLICATION_RETRY_ATTEMPTS:
+                    logger.error(f"❌ [{current}/{total}] Telegram ограничил отправку в {group_name} на {e.seconds} сек, группа пропущена")
+                    return 'error', retry_count
+                logger.warning(f"⏳ [{current}/{total}] Telegram ограничил отправку в {group_name}: ожидание {e.seconds} сек")
+                self._update_status(f"Ожидание {e.seconds} секунд...")
+            except ACCOUNT_FAILED_ERRORS:
+                raise
+            except SendStatusUnknownError as e:
+                # Запрос отменен по таймауту, но мог дойти: проверяем чат перед повтором
+                retry_count = attempt
+                logger.warning(f"⌛ [{current}/{total}] Таймаут отправки в {group_name}, проверяем доставку...")
+                await asyncio.sleep(PUBLICATION_RETRY_DELAY)
+                delivered = await self.post_handler.check_delivery(target, e.started_at, account)
+                if delivered:
+                    logger.info(f"✅ [{current}/{total}] Пост в {group_name} доставлен, несмотря на таймаут")
+                    return 'success', retry_count
+                if delivered is None:
+                    return 'unknown', retry_count
+                if attempt >= PUBLICATION_RETRY_ATTEMPTS:
+                    logger.error(f"❌ [{current}/{total}] Все {PUBLICATION_RETRY_ATTEMPTS} попыток отправки в {group_name} завершились таймаутом")
+                    return 'error', retry_count
+                logger.warning(f"⚠️ [{current}/{total}] Пост в {group_name} не доставлен, повтор...")
             except Exception as e:
                 retry_count = attempt
                 if attempt < PUBLICATION_RETRY_ATTEMPTS:
@@ -635,9 +960,9 @@ class PostScheduler:
                     await asyncio.sleep(PUBLICATION_RETRY_DELAY)
                 else:
                     logger.error(f"❌ [{current}/{total}] Исключение после всех {PUBLICATION_RETRY_ATTEMPTS} попыток для {group_name}: {e}")
-                    return False, retry_count
+                    return 'error', retry_count
         
-        return False, retry_count
+        return 'error', retry_count
     
     def _update_status(self, step: str):
         """Обновление статуса публикации"""
@@ -645,7 +970,22 @@ class PostScheduler:
         # Получаем текущее время в UTC и конвертируем в московское
         utc_now = datetime.now(pytz.utc)
         self.publication_status['last_update'] = utc_now.astimezone(MOSCOW_TZ)
-        logger.info(f"📊 Статус: {step}")
+        logger.debug(f"📊 Статус: {step}")
+        self._publish_status()
+    
+    def _publish_status(self):
+        """
+        Публикация снимка статуса публикации в поток событий веб-интерфейса
+        
+        Снимок формируется один раз и отдается всем подписчикам. Вместо всего
+        списка ошибок (он растет с числом групп, а снимок публикуется на каждом
+        шаге) передаются их количество и последние WEB_EVENTS_ERRORS ошибок.
+        """
+        status = self.get_publication_status()
+        errors = status['errors']
+        status['errors_count'] = len(errors)
+        status['errors'] = errors[-WEB_EVENTS_ERRORS:]
+        events.publish('publication', status)
     
     def get_next_run_time(self) -> datetime:
         """
@@ -696,8 +1036,12 @@ class PostScheduler:
             'current_group': None,
             'start_time': None,
             'last_update': None,
-            'errors': []
+            'errors': [],
+            'unknown_groups': 0,
+            'concurrency': 0,
+            'accounts': {}
         })
+        self._publish_status()
     
     def get_publication_status(self) -> dict:
         """
@@ -707,6 +1051,7 @@ class PostScheduler:
             Словарь со статусом публикации
         """
         status = self.publication_status.copy()
+        status['accounts'] = {name: dict(stats) for name, stats in status['accounts'].items()}
         
         # Добавляем вычисляемые поля
         if status['is_publishing'] and status['total_groups'] > 0:
@@ -261,6 +261,17 @@ function updatePublicationStatus(publicationStatus) {
                     `;
                     errorsList.appendChild(errorItem);
                 });
+                
+                // В событиях потока передаются только последние ошибки
+                const errorsCount = publicationStatus.errors_count || publicationStatus.errors.length;
+                if (errorsCount > publicationStatus.errors.length) {
+                    const moreItem = document.createElement('div');
+                    moreItem.className = 'list-group-item text-muted small';
+                    moreItem.textContent = window.t('publication.moreErrors')
+                        .replace('{shown}', publicationStatus.errors.length)
+                        .replace('{total}', errorsCount);
+                    errorsList.appendChild(moreItem);
+                }
             } else {
                 errorsSection.style.display = 'none';
             }
@@ -274,8 +285,66 @@ function updatePublicationStatus(publicationStatus) {
     }
 }
 
+// Периодический опрос API - запасной вариант, пока поток событий недоступен
+let statusInterval = null;
+let groupsInterval = null;
+let eventsConnected = false;
+
+function startPolling() {
+    if (statusInterval) {
+        return;
+    }
+    statusInterval = setInterval(() => window.loadStatus(), 5000);
+    groupsInterval = setInterval(() => window.loadGroups(), 30000);
+}
+
+function stopPolling() {
+    clearInterval(statusInterval);
+    clearInterval(groupsInterval);
+    statusInterval = null;
+    groupsInterval = null;
+}
+
+// Подписка на поток событий сервера (Server-Sent Events)
+function subscribeEvents() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    
+    const source = new EventSource('/api/events');
+    source.onopen = () => {
+        stopPolling();
+        // После переподключения догружаем то, что могло измениться во время обрыва
+        if (eventsConnected) {
+            loadStatus();
+        }
+        eventsConnected = true;
+    };
+    source.onerror = () => {
+        // Браузер переподключается сам; до этого (или если поток закрыт) опрашиваем API
+        startPolling();
+    };
+    
+    source.addEventListener('publication', event => {
+        updatePublicationStatus(JSON.parse(event.data));
+    });
+    source.addEventListener('groups', event => {
+        const data = JSON.parse(event.data);
+        const groupsCount = document.getElementById('groupsCount');
+        if (groupsCount) {
+            groupsCount.textContent = data.count;
+        }
+        window.refreshGroups(data.version);
+    });
+    // Состояние планировщика и время следующего запуска
+    source.addEventListener('status', () => loadStatus());
+    source.addEventListener('run_finished', () => loadStatus());
+}
+
 // Экспортируем функции в глобальную область видимости
 window.loadStatus = loadStatus;
 window.updateStatus = updateStatus;
 window.updatePublicationStatus = updatePublicationStatus;
+window.subscribeEvents = subscribeEvents;
 
@@ -1,14 +1,55 @@
 // Groups module - функции для работы с группами
 
+// Список групп без поиска (id -> группа) и версия реестра групп на сервере:
+// повторные запросы получают только изменения после этой версии
+let groupsById = new Map();
+let groupsVersion = null;
+let groupsRefreshTimer = null;
+
+// Применение изменений реестра групп к сохраненному списку
+function mergeGroupChanges(data) {
+    if (data.full) {
+        groupsById = new Map();
+    }
+    (data.removed || []).forEach(id => groupsById.delete(id));
+    (data.groups || []).forEach(group => groupsById.set(group.id, group));
+    groupsVersion = data.version;
+    return Array.from(groupsById.values());
+}
+
+// Обновление списка по событию сервера: запрос выполняется, только если версия
+// реестра изменилась; серия событий (например, при публикации) дает один запрос
+function refreshGroups(version) {
+    if (version === groupsVersion || groupsRefreshTimer) {
+        return;
+    }
+    groupsRefreshTimer = setTimeout(() => {
+        groupsRefreshTimer = null;
+        loadGroups();
+    }, 1000);
+}
+
 // Загрузка списка групп
 async function loadGroups() {
     try {
-        const response = await window.safeFetch('/api/groups');
+        // Поиск по названию и username выполняется на сервере
+        const searchInput = document.getElementById('groupsSearchInput');
+        const search = searchInput ? searchInput.value.trim() : '';
+        let url = '/api/groups';
+        if (search) {
+            url = `/api/groups?search=${encodeURIComponent(search)}`;
+        } else if (groupsVersion !== null) {
+            url = `/api/groups?since=${groupsVersion}`;
+        }
+        const response = await window.safeFetch(url);
         const data = await response.json();
         
         if (response.ok) {
             // API возвращает объект с ключом 'groups' или массив напрямую
-            const groups = data.groups || (Array.isArray(data) ? data : []);
+            let groups = data.groups || (Array.isArray(data) ? data : []);
+            if (!search && data.version !== undefined) {
+                groups = mergeGroupChanges(data);
+            }
             updateGroupsList(groups);
         } else {
             console.error('Ошибка загрузки групп:', data.error);
@@ -60,6 +101,17 @@ function updateGroupsList(groups) {
     // Сохраняем новые данные
     window.lastGroupsData = groupsString;
     
+    const searchInput = document.getElementById('groupsSearchInput');
+    if (groups.length === 0 && searchInput && searchInput.value.trim()) {
+        groupsList.innerHTML = `
+            <div class="empty-state">
+                <i class="fas fa-search"></i>
+                <p>${window.t('groups.notFound')}</p>
+            </div>
+        `;
+        return;
+    }
+    
     if (groups.length === 0) {
         groupsList.innerHTML = `
             <div class="empty-state">
@@ -92,7 +144,7 @@ function updateGroupsList(groups) {
                             ${group.username ? `<small class="text-muted"><i class="fas fa-at me-1"></i>${group.username}</small>` : ''}
                         </div>
                         <small class="text-muted d-block">
-                            <i class="fas fa-clock me-1"></i><span data-i18n-key="groups.lastPost">${window.t('groups.lastPost')}</span> <strong>${group.last_post || window.t('groups.never')}</strong>
+                            <i class="fas fa-clock me-1"></i><span data-i18n-key="groups.lastPost">${window.t('groups.lastPost')}</span> <strong>${window.formatTimestamp(group.last_post) || window.t('groups.never')}</strong>
                         </small>
                     </div>
                     <div class="d-flex gap-2">
@@ -209,10 +261,152 @@ async function toggleGroupDisabled(chatId, isDisabled) {
     }
 }
 
+// Массовое добавление групп: результаты приходят строками JSON по мере готовности
+async function importGroups() {
+    const input = document.getElementById('groupsImportInput');
+    const fileInput = document.getElementById('groupsImportFile');
+    const importBtn = document.getElementById('importGroupsBtn');
+    const progress = document.getElementById('groupsImportProgress');
+    const file = fileInput.files[0];
+    
+    if (!file && !input.value.trim()) {
+        window.showToast(window.t('groups.importEmpty'), 'warning');
+        return;
+    }
+    
+    let options;
+    if (file) {
+        const formData = new FormData();
+        formData.append('file', file);
+        options = { method: 'POST', body: formData };
+    } else {
+        options = {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ items: input.value })
+        };
+    }
+    
+    const counts = { done: 0, total: 0, added: 0, exists: 0, duplicate: 0, invalid: 0, not_found: 0, error: 0 };
+    // Элементы, которые не удалось обработать (лимит запросов, нет связи, ошибка записи), остаются для повтора
+    const retry = [];
+    const showProgress = () => {
+        progress.textContent = window.t('groups.importProgress').replace(/\{(\w+)\}/g, (match, key) => counts[key]);
+    };
+    
+    window.setButtonLoading(importBtn, true);
+    progress.textContent = '';
+    
+    try {
+        const response = await window.safeFetch('/api/groups/import', options);
+        if (!response.ok) {
+            const data = await response.json();
+            window.showToast(data.error, 'error');
+            return;
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.filter(line => line.trim()).forEach(line => {
+                const result = JSON.parse(line);
+                if (result.type === 'start') {
+                    counts.total = result.total;
+                } else if (result.type === 'item') {
+                    counts.done += 1;
+                    counts[result.status] += 1;
+                    if (result.status === 'error') {
+                        retry.push(result.input);
+                    }
+                } else if (result.type === 'done') {
+                    Object.assign(counts, result, { done: result.total });
+                } else if (result.type === 'error') {
+                    window.showToast(result.error, 'error');
+                }
+            });
+            showProgress();
+        }
+        
+        input.value = retry.join('\n');
+        fileInput.value = '';
+        loadGroups();
+        window.loadStatus();
+    } catch (error) {
+        if (error.message !== 'Unauthorized') {
+            window.showToast(window.t('toast.errorAddGroup'), 'error');
+        }
+    } finally {
+        window.setButtonLoading(importBtn, false);
+    }
+}
+
+// Поиск групп среди диалогов аккаунта (ход выполнения запрашивается раз в секунду)
+async function discoverGroups() {
+    const discoverBtn = document.getElementById('discoverGroupsBtn');
+    const progress = document.getElementById('discoverProgress');
+    const types = ['group', 'megagroup'];
+    if (document.getElementById('discoverChannels').checked) {
+        types.push('channel');
+    }
+    
+    window.setButtonLoading(discoverBtn, true);
+    try {
+        const response = await window.safeFetch('/api/groups/discover', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                types: types,
+                min_members: parseInt(document.getElementById('discoverMinMembers').value, 10) || 0,
+                title_pattern: document.getElementById('discoverTitlePattern').value.trim()
+            })
+        });
+        const data = await response.json();
+        if (!response.ok && response.status !== 409) {
+            window.showToast(data.error, 'error');
+            window.setButtonLoading(discoverBtn, false);
+            return;
+        }
+        
+        const showProgress = (state) => {
+            progress.textContent = window.t('groups.discoverProgress').replace(/\{(\w+)\}/g, (match, key) => state[key] || 0);
+        };
+        let state = data.progress;
+        showProgress(state);
+        while (state.running) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            const progressResponse = await window.safeFetch('/api/groups/discover');
+            state = (await progressResponse.json()).progress;
+            showProgress(state);
+        }
+        if (state.error) {
+            window.showToast(state.error, 'error');
+        }
+        loadGroups();
+        window.loadStatus();
+    } catch (error) {
+        if (error.message !== 'Unauthorized') {
+            window.showToast(window.t('toast.errorAddGroup'), 'error');
+        }
+    } finally {
+        window.setButtonLoading(discoverBtn, false);
+    }
+}
+
 // Экспортируем функции в глобальную область видимости
 window.loadGroups = loadGroups;
+window.refreshGroups = refreshGroups;
 window.updateGroupsList = updateGroupsList;
 window.addGroup = addGroup;
 window.removeGroup = removeGroup;
 window.toggleGroupDisabled = toggleGroupDisabled;
+window.importGroups = importGroups;
+window.discoverGroups = discoverGroups;
 
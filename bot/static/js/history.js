@@ -20,9 +20,10 @@ async function loadHistory() {
     
     try {
         const params = new URLSearchParams({
-            limit: window.historyPageSize,
-            offset: (window.historyPage - 1) * window.historyPageSize
+            limit: window.historyPageSize
         });
+        // Курсор страницы (первая страница загружается без курсора)
+        if (window.historyCursor) params.append('cursor', window.historyCursor);
         
         if (window.historyFilters.status) params.append('status', window.historyFilters.status);
         if (window.historyFilters.search) params.append('search', window.historyFilters.search);
@@ -51,11 +52,13 @@ async function loadHistory() {
                 const html = data.history.map(record => {
                     const statusBadge = record.status === 'success' 
                         ? '<span class="badge bg-success">' + window.t('history.status.success') + '</span>'
-                        : '<span class="badge bg-danger">' + window.t('history.status.error') + '</span>';
+                        : record.status === 'unknown'
+                            ? '<span class="badge bg-warning text-dark">' + window.t('history.status.unknown') + '</span>'
+                            : '<span class="badge bg-danger">' + window.t('history.status.error') + '</span>';
                     
                     return `
                         <tr>
-                            <td>${record.published_at}</td>
+                            <td>${window.formatTimestamp(record.published_at)}</td>
                             <td>${record.chat_title || record.chat_username || record.chat_id}</td>
                             <td>${statusBadge}</td>
                             <td>${record.retry_count}</td>
@@ -88,16 +91,19 @@ async function loadHistory() {
                 }
                 tbody.style.display = 'table-row-group';
                 tbody.style.visibility = 'visible';
-                
-                // Обновляем пагинацию
-                const hasMore = data.history.length === window.historyPageSize;
-                const prevBtn = document.getElementById('historyPrevBtn');
-                const nextBtn = document.getElementById('historyNextBtn');
-                const pageInfo = document.getElementById('historyPageInfo');
-                if (prevBtn) prevBtn.disabled = window.historyPage === 1;
-                if (nextBtn) nextBtn.disabled = !hasMore;
-                if (pageInfo) pageInfo.textContent = `${window.historyPage} / ${hasMore ? window.historyPage + 1 : window.historyPage}`;
             }
+            
+            // Обновляем пагинацию
+            window.historyNextCursor = data.next_cursor;
+            window.historyPrevCursor = data.prev_cursor;
+            const totalPages = Math.max(1, Math.ceil(data.total / window.historyPageSize));
+            const prevBtn = document.getElementById('historyPrevBtn');
+            const nextBtn = document.getElementById('historyNextBtn');
+            const pageInfo = document.getElementById('historyPageInfo');
+            if (prevBtn) prevBtn.disabled = !data.prev_cursor;
+            if (nextBtn) nextBtn.disabled = !data.next_cursor;
+            if (pageInfo) pageInfo.textContent = `${window.historyPage} / ${totalPages}${data.total_exact ? '' : '+'}`;
+            tbody.dataset.loading = 'false';
         } else {
             tbody.innerHTML = '<tr><td colspan="5" class="text-center text-danger">' + (data.error || window.t('error.unknown')) + '</td></tr>';
             tbody.dataset.loading = 'false';
@@ -127,6 +133,7 @@ function clearHistory() {
         if (data.success) {
             window.showToast(data.message, 'success');
             window.historyPage = 1;
+            window.historyCursor = null;
             loadHistory();
         } else {
             window.showToast(data.error || window.t('error.unknown'), 'error');
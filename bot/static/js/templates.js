@@ -38,9 +38,13 @@ async function loadTemplates() {
                 tbody.style.visibility = 'visible';
             } else {
                 const html = data.templates.map(template => {
-                    const statusBadge = template.is_active 
+                    let statusBadge = template.is_active 
                         ? '<span class="badge bg-success">' + window.t('templates.status.active') + '</span>'
                         : '<span class="badge bg-secondary">' + window.t('templates.status.inactive') + '</span>';
+                    if (!template.is_valid) {
+                        const errors = template.validation ? template.validation.errors.join('; ') : '';
+                        statusBadge += ' <span class="badge bg-danger" title="' + errors.replace(/"/g, '&quot;') + '">' + window.t('templates.status.invalid') + '</span>';
+                    }
                     
                     const contentPreview = template.content.length > 50 
                         ? template.content.substring(0, 50) + '...' 
@@ -159,6 +163,9 @@ async function saveTemplate() {
         
         if (response.ok) {
             window.showToast(data.message, 'success');
+            if (data.validation && !data.validation.valid) {
+                window.showToast(window.t('templates.status.invalid') + ': ' + data.validation.errors.join('; '), 'error');
+            }
             const modal = bootstrap.Modal.getInstance(document.getElementById('templateModal'));
             modal.hide();
             loadTemplates();
@@ -27,6 +27,7 @@
             'publication.startTime': 'Время начала:',
             'publication.lastUpdate': 'Последнее обновление:',
             'publication.errors': 'Ошибки:',
+            'publication.moreErrors': 'Показаны последние {shown} из {total} ошибок',
             'actions.quick': 'Быстрые действия',
             'actions.publishNow': 'Опубликовать сейчас',
             'actions.startScheduler': 'Запустить планировщик',
@@ -39,9 +40,18 @@
             'groups.add': 'Добавить группу/канал',
             'groups.input': 'Ссылка, @username или ID',
             'groups.addButton': 'Добавить группу',
+            'groups.import': 'Массовое добавление',
+            'groups.importButton': 'Добавить списком',
+            'groups.importEmpty': 'Введите список групп или выберите файл',
+            'groups.importProgress': 'Обработано {done} из {total}: добавлено {added}, уже есть {exists}, не найдено {not_found}, не обработано (лимит запросов, нет связи или ошибка записи) {error}, ошибок ввода {invalid}, повторов {duplicate}',
+            'groups.discover': 'Добавить из диалогов аккаунта',
+            'groups.discoverChannels': 'Включая каналы',
+            'groups.discoverButton': 'Найти и добавить',
+            'groups.discoverProgress': 'Просмотрено диалогов {scanned}: подходит {matched}, добавлено {added}, уже есть {exists}',
             'groups.list': 'Список групп/каналов',
             'groups.empty': 'Нет добавленных групп',
             'groups.emptyDesc': 'Добавьте группу или канал для начала работы',
+            'groups.notFound': 'Группы не найдены',
             'groups.loading': 'Загрузка групп...',
             'groups.lastPost': 'Последняя публикация:',
             'groups.delete': 'Удалить группу',
@@ -114,6 +124,7 @@
             'history.clearConfirm': 'Вы уверены, что хотите очистить историю публикаций?',
             'history.status.success': 'Успешно',
             'history.status.error': 'Ошибка',
+            'history.status.unknown': 'Не подтверждено',
             'statistics.title': 'Статистика публикаций',
             'statistics.total': 'Всего публикаций',
             'statistics.successful': 'Успешных',
@@ -137,6 +148,7 @@
             'templates.table.actions': 'Действия',
             'templates.status.active': 'Активен',
             'templates.status.inactive': 'Неактивен',
+            'templates.status.invalid': 'Не пройдет отправку',
             'templates.actions.edit': 'Редактировать',
             'templates.actions.activate': 'Активировать',
             'templates.actions.delete': 'Удалить',
@@ -242,6 +254,7 @@
             'publication.startTime': 'Start Time:',
             'publication.lastUpdate': 'Last Update:',
             'publication.errors': 'Errors:',
+            'publication.moreErrors': 'Showing the last {shown} of {total} errors',
             'actions.quick': 'Quick Actions',
             'actions.publishNow': 'Publish Now',
             'actions.startScheduler': 'Start Scheduler',
@@ -254,9 +267,18 @@
             'groups.add': 'Add Group/Channel',
             'groups.input': 'Link, @username or ID',
             'groups.addButton': 'Add Group',
+            'groups.import': 'Bulk import',
+            'groups.importButton': 'Add list',
+            'groups.importEmpty': 'Enter a list of groups or choose a file',
+            'groups.importProgress': 'Processed {done} of {total}: added {added}, already present {exists}, not found {not_found}, failed (rate limit, no connection or write error) {error}, invalid {invalid}, duplicates {duplicate}',
+            'groups.discover': 'Add from account dialogs',
+            'groups.discoverChannels': 'Include channels',
+            'groups.discoverButton': 'Find and add',
+            'groups.discoverProgress': 'Dialogs scanned {scanned}: matching {matched}, added {added}, already present {exists}',
             'groups.list': 'Groups/Channels List',
             'groups.empty': 'No groups added',
             'groups.emptyDesc': 'Add a group or channel to get started',
+            'groups.notFound': 'No groups found',
             'groups.loading': 'Loading groups...',
             'groups.lastPost': 'Last publication:',
             'groups.delete': 'Delete group',
@@ -329,6 +351,7 @@
             'history.clearConfirm': 'Are you sure you want to clear publication history?',
             'history.status.success': 'Success',
             'history.status.error': 'Error',
+            'history.status.unknown': 'Unconfirmed',
             'statistics.title': 'Publication Statistics',
             'statistics.total': 'Total Publications',
             'statistics.successful': 'Successful',
@@ -352,6 +375,7 @@
             'templates.table.actions': 'Actions',
             'templates.status.active': 'Active',
             'templates.status.inactive': 'Inactive',
+            'templates.status.invalid': 'Will fail to send',
             'templates.actions.edit': 'Edit',
             'templates.actions.activate': 'Activate',
             'templates.actions.delete': 'Delete',
@@ -565,6 +589,17 @@
         return message;
     };
     
+    // Форматирование времени из API (секунды Unix) в московском часовом поясе
+    const timestampFormat = new Intl.DateTimeFormat('ru-RU', {
+        timeZone: 'Europe/Moscow',
+        day: '2-digit', month: '2-digit', year: 'numeric',
+        hour: '2-digit', minute: '2-digit', second: '2-digit'
+    });
+    window.formatTimestamp = function(epoch) {
+        if (!epoch) return null;
+        return timestampFormat.format(new Date(epoch * 1000)).replace(',', '');
+    };
+    
     // Форматирование текста для Telegram
     window.formatTelegramText = function(text) {
         if (!text) return '';
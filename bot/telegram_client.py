@@ -3,25 +3,221 @@
 """
 import asyncio
 import logging
+from datetime import datetime, timedelta, timezone
 from telethon import TelegramClient, events
-from telethon.errors import SessionPasswordNeededError, PhoneCodeInvalidError
-from telethon.tl.types import User, Channel, Chat
-from config import API_ID, API_HASH, PHONE_NUMBER, SESSION_FILE, ADMIN_ID
+from telethon.errors import (
+    SessionPasswordNeededError, PhoneCodeInvalidError, ChannelInvalidError, PeerIdInvalidError,
+    FloodWaitError, AuthKeyUnregisteredError, AuthKeyDuplicatedError, UserDeactivatedError,
+    UserDeactivatedBanError, SessionRevokedError
+)
+from telethon.tl.types import (
+    User, Channel, Chat, InputPeerChannel, InputPeerChat, InputPeerUser
+)
+from config import (
+    API_ID, API_HASH, PHONE_NUMBER, SESSION_FILE, ADMIN_ID, SENDER_KEEPALIVE_INTERVAL, SEND_TIMEOUT,
+    SEND_CHECK_MESSAGES, DATA_DIR, EXTRA_SESSIONS
+)
+from db import db
+from rate_limiter import RateLimiter
 
 logger = logging.getLogger(__name__)
 
+# Ошибки, при которых сохраненный в кэше peer считается устаревшим
+STALE_PEER_ERRORS = (ChannelInvalidError, PeerIdInvalidError)
+
+# Ошибки, после которых аккаунт больше не может отправлять сообщения
+ACCOUNT_FAILED_ERRORS = (
+    AuthKeyUnregisteredError, AuthKeyDuplicatedError, UserDeactivatedError,
+    UserDeactivatedBanError, SessionRevokedError
+)
+
+# Допустимое расхождение часов с сервером Telegram при проверке доставки
+SEND_CHECK_CLOCK_SKEW = timedelta(seconds=5)
+
+
+class SendStatusUnknownError(Exception):
+    """
+    Отправка прервана по таймауту
+    
+    Запрос отменяется, но Telegram мог успеть его выполнить, поэтому
+    перед повтором нужно проверить, не появилось ли сообщение в чате.
+    """
+    
+    def __init__(self, chat_id, started_at: datetime):
+        super().__init__(f"Таймаут отправки в {chat_id}: доставка не подтверждена")
+        self.chat_id = chat_id
+        self.started_at = started_at
+
+
+class ChatLookupError(Exception):
+    """
+    Чат не удалось проверить по временной причине
+    
+    Ограничение частоты запросов или нет соединения с Telegram: в отличие
+    от ответа get_chat_info None это не означает, что чата не существует.
+    """
+    
+    def __init__(self, message: str, retry_after: int = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PeerCache:
+    """
+    Кэш разрешенных peer'ов в памяти (с сохранением в таблицу peer_cache)
+    
+    Позволяет строить InputPeer по chat_id или username без запросов get_entity.
+    """
+    
+    def __init__(self):
+        self._by_key = {}
+    
+    @staticmethod
+    def normalize_key(identifier) -> str:
+        """
+        Приведение chat_id или username к ключу кэша
+        
+        Args:
+            identifier: ID чата (в т.ч. с префиксом -100) или username
+            
+        Returns:
+            Ключ кэша
+        """
+        key = str(identifier).strip()
+        try:
+            peer_id = int(key)
+        except ValueError:
+            return key.lstrip('@').lower()
+        
+        if peer_id < 0:
+            key = str(-peer_id)
+            # Маркированный ID канала: -100XXXXXXXXXX
+            if key.startswith('100') and len(key) > 10:
+                key = key[3:]
+        return key
+    
+    def load(self, rows):
+        """Загрузка записей из базы данных"""
+        self._by_key.clear()
+        for chat_id, username, peer_id, access_hash, peer_type, title in rows:
+            self._add(chat_id, username, peer_id, access_hash, peer_type, title)
+    
+    def _add(self, chat_id, username, peer_id, access_hash, peer_type, title):
+        record = (chat_id, username, peer_id, access_hash, peer_type, title)
+        self._by_key[chat_id] = record
+        if username:
+            self._by_key[self.normalize_key(username)] = record
+    
+    def get(self, identifier):
+        """
+        Получение записи кэша
+        
+        Returns:
+            Кортеж (chat_id, username, peer_id, access_hash, peer_type, title) или None
+        """
+        return self._by_key.get(self.normalize_key(identifier))
+    
+    def get_input_peer(self, identifier):
+        """
+        Построение InputPeer из кэша без обращения к Telegram
+        
+        Returns:
+            InputPeer или None, если peer'а нет в кэше
+        """
+        record = self.get(identifier)
+        if record is None:
+            return None
+        
+        _, _, peer_id, access_hash, peer_type, _ = record
+        if peer_type == 'Channel':
+            return InputPeerChannel(peer_id, access_hash)
+        if peer_type == 'Chat':
+            return InputPeerChat(peer_id)
+        if peer_type == 'User':
+            return InputPeerUser(peer_id, access_hash)
+        return None
+    
+    def put(self, entity, identifier=None):
+        """
+        Добавление разрешенной entity в кэш
+        
+        Args:
+            entity: Entity чата (Channel, Chat или User)
+            identifier: Идентификатор, по которому чат искали (username или ID)
+            
+        Returns:
+            Кортеж (chat_id, username, peer_id, access_hash, peer_type, title)
+        """
+        chat_id = str(entity.id)
+        username = getattr(entity, 'username', None)
+        if not username and identifier is not None:
+            key = self.normalize_key(identifier)
+            if key != chat_id and not key.isdigit():
+                username = key
+        
+        record = (
+            chat_id,
+            username.lower() if username else None,
+            entity.id,
+            getattr(entity, 'access_hash', None),
+            type(entity).__name__,
+            getattr(entity, 'title', None)
+        )
+        self._add(*record)
+        return record
+    
+    def forget(self, identifier):
+        """
+        Удаление записи из кэша
+        
+        Returns:
+            chat_id удаленной записи или None
+        """
+        record = self.get(identifier)
+        if record is None:
+            return None
+        
+        chat_id, username = record[0], record[1]
+        self._by_key.pop(chat_id, None)
+        if username:
+            self._by_key.pop(self.normalize_key(username), None)
+        return chat_id
+    
+    def __len__(self):
+        return len({record[0] for record in self._by_key.values()})
+
 
 class TelegramClientManager:
     """Менеджер для работы с Telegram Client API"""
     
-    def __init__(self):
+    def __init__(self, session_file=SESSION_FILE, name: str = 'main', interactive: bool = True):
+        """
+        Args:
+            session_file: Путь к файлу сессии
+            name: Имя аккаунта (ключ в пуле аккаунтов и в кэше peer'ов)
+            interactive: Разрешена ли интерактивная авторизация по коду
+        """
+        self.name = name
+        self.interactive = interactive
+        # FloodWait не обрабатывается Telethon автоматически:
+        # паузы выдерживает общий ограничитель частоты запросов
         self.client = TelegramClient(
-            str(SESSION_FILE),
+            str(session_file),
             API_ID,
-            API_HASH
+            API_HASH,
+            flood_sleep_threshold=0
         )
         self.is_authorized = False
+        # Аккаунт отключен Telegram (сессия отозвана, аккаунт заблокирован)
+        self.failed = False
+        self.last_error = None
+        self.is_running = False
         self.admin_id = ADMIN_ID
+        # Event loop, в котором работает клиент (основной loop из main.py)
+        self.loop = None
+        self._keepalive_task = None
+        self.peer_cache = PeerCache()
+        self.limiter = RateLimiter()
     
     async def start(self):
         """Запуск клиента и авторизация"""
@@ -37,9 +233,15 @@ class TelegramClientManager:
             if await self.client.is_user_authorized():
                 self.is_authorized = True
                 me = await self.client.get_me()
-                logger.info(f"Авторизован как: {me.first_name} (@{me.username})")
+                logger.info(f"[{self.name}] Авторизован как: {me.first_name} (@{me.username})")
+                self._start_keepalive()
                 return True
             
+            if not self.interactive:
+                # Дополнительные аккаунты авторизуются заранее, ввод кода для них не запрашиваем
+                logger.error(f"[{self.name}] Сессия не авторизована, аккаунт пропущен")
+                return False
+            
             # Если не авторизован, запрашиваем код
             await self.client.send_code_request(PHONE_NUMBER)
             logger.info("Код отправлен в Telegram")
@@ -72,19 +274,294 @@ class TelegramClientManager:
             me = await self.client.get_me()
             logger.info(f"Авторизован как: {me.first_name} (@{me.username})")
             
+            self._start_keepalive()
             return True
         except PhoneCodeInvalidError:
             logger.error("Неверный код подтверждения")
             return False
         except Exception as e:
-            logger.error(f"Ошибка авторизации: {e}")
+            logger.error(f"[{self.name}] Ошибка авторизации: {e}")
             return False
     
     async def stop(self):
         """Остановка клиента"""
+        self.is_running = False
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
         if self.client.is_connected():
             await self.client.disconnect()
-        logger.info("Telegram клиент отключен")
+        logger.info(f"[{self.name}] Telegram клиент отключен")
+    
+    def _start_keepalive(self):
+        """Запоминаем event loop клиента и запускаем фоновую проверку соединения"""
+        self.loop = asyncio.get_running_loop()
+        self.is_running = True
+        if self._keepalive_task is None or self._keepalive_task.done():
+            self._keepalive_task = self.loop.create_task(self._keepalive())
+    
+    async def _keepalive(self):
+        """Поддержание соединения: переподключение при обрыве, чтобы к моменту публикации клиент был готов"""
+        while self.is_running:
+            await asyncio.sleep(SENDER_KEEPALIVE_INTERVAL)
+            try:
+                await self.ensure_connected()
+            except Exception as e:
+                logger.warning(f"Ошибка проверки соединения с Telegram: {e}")
+    
+    def mark_failed(self, error):
+        """Отметка аккаунта как неработоспособного (его группы переходят к другим аккаунтам)"""
+        if not self.failed:
+            logger.error(f"[{self.name}] Аккаунт отключен: {error}")
+        self.failed = True
+        self.last_error = str(error)
+    
+    def is_healthy(self) -> bool:
+        """Аккаунт авторизован, запущен и не отключен Telegram"""
+        return self.is_authorized and self.is_running and not self.failed
+    
+    async def ensure_connected(self) -> bool:
+        """
+        Проверка соединения и переподключение при обрыве
+        
+        Returns:
+            True если клиент подключен и авторизован
+        """
+        if self.client.is_connected():
+            return True
+        
+        try:
+            logger.warning("Соединение с Telegram потеряно, переподключаемся...")
+            await self.client.connect()
+            self.is_authorized = await self.client.is_user_authorized()
+            if self.is_authorized:
+                logger.info("Соединение с Telegram восстановлено")
+            return self.is_authorized
+        except Exception as e:
+            logger.error(f"Не удалось переподключиться к Telegram: {e}")
+            return False
+    
+    async def warm_up(self) -> bool:
+        """
+        Прогрев соединения перед публикацией
+        
+        Returns:
+            True если клиент готов к отправке
+        """
+        if not await self.ensure_connected():
+            return False
+        try:
+            # Лёгкий запрос, чтобы убедиться, что соединение живое
+            await self.client.get_me()
+            return True
+        except Exception as e:
+            logger.warning(f"Ошибка прогрева соединения: {e}")
+            return False
+    
+    async def run(self, coro):
+        """
+        Выполнение корутины в event loop клиента
+        
+        Клиент Telethon привязан к loop, в котором он был запущен, поэтому
+        вызовы из других потоков (веб-сервер, планировщик) передаются туда.
+        
+        Args:
+            coro: Корутина, работающая с клиентом
+            
+        Returns:
+            Результат корутины
+        """
+        if self.loop is None or self.loop is asyncio.get_running_loop():
+            return await coro
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return await asyncio.wrap_future(future)
+    
+    async def load_peer_cache(self):
+        """Загрузка кэша peer'ов из базы данных"""
+        rows = await db.get_all_peers(self.name)
+        self.peer_cache.load(rows)
+        logger.info(f"[{self.name}] Загружено peer'ов из кэша: {len(self.peer_cache)}")
+    
+    async def _remember_peer(self, entity, identifier=None):
+        """Сохранение разрешенной entity в кэш (в памяти и в БД)"""
+        if not isinstance(entity, (Channel, Chat, User)):
+            return
+        record = self.peer_cache.put(entity, identifier)
+        await db.save_peer(self.name, *record)
+    
+    async def remember_peers(self, entities):
+        """
+        Сохранение уже полученных entity в кэш пачкой (например, из списка диалогов)
+        
+        Args:
+            entities: Entity чатов (Channel, Chat или User)
+        """
+        records = [
+            self.peer_cache.put(entity) for entity in entities
+            if isinstance(entity, (Channel, Chat, User))
+        ]
+        await db.save_peers(self.name, records)
+    
+    async def _forget_peer(self, identifier):
+        """Удаление устаревшего peer'а из кэша"""
+        chat_id = self.peer_cache.forget(identifier)
+        if chat_id is not None:
+            logger.info(f"Peer {identifier} удален из кэша, будет разрешен заново")
+            await db.delete_peer(self.name, chat_id)
+    
+    async def _get_entity(self, chat_id):
+        """Разрешение entity через Telegram (несколько вариантов идентификатора)"""
+        # Сначала пробуем как числовой ID
+        try:
+            entity_id = int(chat_id)
+            return await self.limiter.call(lambda: self.client.get_entity(entity_id))
+        except (FloodWaitError, *ACCOUNT_FAILED_ERRORS):
+            raise
+        except (ValueError, Exception):
+            pass
+        
+        # Если не получилось, пробуем как строку
+        try:
+            return await self.limiter.call(lambda: self.client.get_entity(chat_id))
+        except (FloodWaitError, *ACCOUNT_FAILED_ERRORS):
+            raise
+        except Exception:
+            pass
+        
+        # Если все еще не получилось, пробуем как username
+        try:
+            username = chat_id if chat_id.startswith('@') else f'@{chat_id}'
+            return await self.limiter.call(lambda: self.client.get_entity(username))
+        except (FloodWaitError, *ACCOUNT_FAILED_ERRORS):
+            raise
+        except Exception:
+            return None
+    
+    async def resolve_entity(self, chat_id):
+        """
+        Получение peer'а чата по ID или username
+        
+        Сначала используется кэш peer'ов, запрос к Telegram выполняется
+        только для чатов, которых в кэше нет.
+        
+        Args:
+            chat_id: ID чата или username
+            
+        Returns:
+            InputPeer или entity чата, либо None
+        """
+        input_peer = self.peer_cache.get_input_peer(chat_id)
+        if input_peer is not None:
+            return input_peer
+        
+        entity = await self._get_entity(chat_id)
+        if entity is not None:
+            await self._remember_peer(entity, chat_id)
+        return entity
+    
+    async def send_post(self, chat_id, text, file=None, entities=None):
+        """
+        Отправка поста в чат (ошибки Telegram пробрасываются вызывающему коду)
+        
+        Args:
+            chat_id: ID чата или username
+            text: Текст сообщения
+            file: Путь к изображению или уже загруженное медиа (опционально)
+            entities: Заранее разобранная разметка (если None, текст разбирается как HTML)
+            
+        Returns:
+            Отправленное сообщение
+        """
+        if not await self.ensure_connected():
+            raise Exception("Нет соединения с Telegram")
+        
+        started_at = datetime.now(timezone.utc)
+        try:
+            return await self._send_post(str(chat_id), text, file, entities)
+        except ACCOUNT_FAILED_ERRORS as e:
+            self.mark_failed(e)
+            raise
+        except asyncio.TimeoutError:
+            # Запрос уже отменен, но сообщение могло дойти до Telegram
+            raise SendStatusUnknownError(chat_id, started_at) from None
+    
+    async def _send_post(self, chat_id, text, file=None, entities=None):
+        """Разрешение peer'а и отправка (с повтором, если сохраненный peer устарел)"""
+        cached = self.peer_cache.get(chat_id) is not None
+        entity = await self.resolve_entity(chat_id)
+        if entity is None:
+            raise Exception(f"Не удалось найти канал с ID: {chat_id}")
+        
+        record = self.peer_cache.get(chat_id)
+        chat_key = record[0] if record else self.peer_cache.normalize_key(chat_id)
+        
+        try:
+            return await self._send(entity, text, file, chat_key, entities)
+        except STALE_PEER_ERRORS:
+            if not cached:
+                raise
+            # Telegram отклонил сохраненный peer: разрешаем заново и повторяем
+            await self._forget_peer(chat_id)
+            entity = await self.resolve_entity(chat_id)
+            if entity is None:
+                raise
+            return await self._send(entity, text, file, chat_key, entities)
+    
+    async def find_sent_message(self, chat_id, since: datetime):
+        """
+        Поиск сообщения, отправленного этим аккаунтом в чат после указанного времени
+        
+        Используется после таймаута отправки, чтобы не отправить пост повторно.
+        
+        Args:
+            chat_id: ID чата или username
+            since: Время начала отправки (UTC)
+            
+        Returns:
+            Найденное сообщение или None
+        """
+        entity = await self.resolve_entity(str(chat_id))
+        if entity is None:
+            raise Exception(f"Не удалось найти канал с ID: {chat_id}")
+        
+        messages = await self.limiter.call(
+            lambda: asyncio.wait_for(
+                self.client.get_messages(entity, limit=SEND_CHECK_MESSAGES),
+                timeout=SEND_TIMEOUT
+            )
+        )
+        for message in messages:
+            if message.out and message.date >= since - SEND_CHECK_CLOCK_SKEW:
+                return message
+        return None
+    
+    async def _send(self, entity, text, file=None, chat_key=None, entities=None):
+        """Отправка сообщения в уже разрешенный peer (с учетом ограничителя и таймаута)"""
+        # Таймаут действует только на сам запрос, а не на ожидание в ограничителе
+        return await self.limiter.call(
+            lambda: asyncio.wait_for(self._send_request(entity, text, file, entities), timeout=SEND_TIMEOUT),
+            chat_key
+        )
+    
+    async def _send_request(self, entity, text, file=None, entities=None):
+        """Запрос отправки сообщения (при переданных entities HTML не разбирается)"""
+        if file is not None:
+            # Отправляем фото с подписью
+            return await self.client.send_file(
+                entity,
+                file,
+                caption=text,
+                parse_mode='html',
+                formatting_entities=entities
+            )
+        
+        # Отправляем только текст
+        return await self.client.send_message(
+            entity,
+            text,
+            parse_mode='html',
+            formatting_entities=entities
+        )
     
     async def send_message(self, chat_id, text, image_path=None):
         """
@@ -99,22 +576,8 @@ class TelegramClientManager:
             True если сообщение отправлено успешно
         """
         try:
-            if image_path and image_path.exists():
-                # Отправляем фото с подписью
-                await self.client.send_file(
-                    chat_id,
-                    str(image_path),
-                    caption=text,
-                    parse_mode='html'
-                )
-            else:
-                # Отправляем только текст
-                await self.client.send_message(
-                    chat_id,
-                    text,
-                    parse_mode='html'
-                )
-            
+            file = str(image_path) if image_path and image_path.exists() else None
+            await self.send_post(chat_id, text, file)
             return True
             
         except Exception as e:
@@ -125,14 +588,38 @@ class TelegramClientManager:
         """
         Получение информации о чате
         
+        Сначала используется кэш peer'ов; запрос к Telegram (один get_entity)
+        выполняется в event loop клиента, откуда бы ни был вызван метод.
+        
         Args:
             chat_identifier: ID чата, username или ссылка
             
         Returns:
-            Кортеж (chat_id, title, chat_type) или None
+            Кортеж (chat_id, title, chat_type) или None, если чат не найден
+        
+        Raises:
+            ChatLookupError: Ограничение частоты запросов или нет соединения
         """
+        record = self.peer_cache.get(chat_identifier)
+        if record is not None:
+            chat_id, _, _, _, chat_type, title = record
+            return (chat_id, title or 'Unknown', chat_type)
+        
+        return await self.run(self._fetch_chat_info(chat_identifier))
+    
+    async def _fetch_chat_info(self, chat_identifier):
+        """Получение информации о чате из Telegram (с сохранением peer'а в кэш)"""
+        if not await self.ensure_connected():
+            raise ChatLookupError("Нет соединения с Telegram")
         try:
-            chat = await self.client.get_entity(chat_identifier)
+            # Числовой ID передаем числом, иначе Telethon ищет его как username
+            try:
+                identifier = int(chat_identifier)
+            except (TypeError, ValueError):
+                identifier = chat_identifier
+            
+            chat = await self.limiter.call(lambda: self.client.get_entity(identifier))
+            await self._remember_peer(chat, chat_identifier)
             
             chat_id = str(chat.id)
             title = getattr(chat, 'title', 'Unknown')
@@ -142,6 +629,12 @@ class TelegramClientManager:
             
             return (chat_id, title, chat_type)
             
+        except FloodWaitError as e:
+            logger.warning(f"Ограничение частоты запросов при получении информации о чате {chat_identifier}: {e.seconds} сек.")
+            raise ChatLookupError(f"Ограничение частоты запросов Telegram, повторите через {e.seconds} сек.", e.seconds)
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            logger.warning(f"Нет соединения при получении информации о чате {chat_identifier}: {e}")
+            raise ChatLookupError(f"Нет соединения с Telegram: {e}")
         except Exception as e:
             logger.error(f"Ошибка получения информации о чате {chat_identifier}: {e}")
             return None
@@ -157,17 +650,19 @@ class TelegramClientManager:
             True если есть доступ к чату
         """
         try:
-            chat = await self.client.get_entity(chat_id)
+            chat = await self.resolve_entity(str(chat_id))
+            if chat is None:
+                return False
             
             # Проверяем, можем ли мы отправлять сообщения
             if hasattr(chat, 'send_message'):
                 return True
             
             # Для каналов проверяем права
-            if isinstance(chat, Channel):
+            if isinstance(chat, (Channel, InputPeerChannel)):
                 # Проверяем, является ли пользователь участником
                 try:
-                    await self.client.get_participants(chat, limit=1)
+                    await self.limiter.call(lambda: self.client.get_participants(chat, limit=1))
                     return True
                 except:
                     return False
@@ -192,5 +687,69 @@ class TelegramClientManager:
             return None
 
 
+class AccountPool:
+    """
+    Пул аккаунтов, между которыми распределяются группы
+    
+    Основной аккаунт авторизуется интерактивно, дополнительные (EXTRA_SESSIONS)
+    должны быть авторизованы заранее. У каждого аккаунта свой клиент,
+    свой ограничитель частоты запросов и свой кэш peer'ов.
+    """
+    
+    def __init__(self, main_client: TelegramClientManager, extra_sessions=None):
+        self.main = main_client
+        self.accounts = {main_client.name: main_client}
+        for name in extra_sessions or []:
+            if name in self.accounts:
+                continue
+            self.accounts[name] = TelegramClientManager(
+                DATA_DIR / f'{name}.session',
+                name=name,
+                interactive=False
+            )
+    
+    async def start_extra(self):
+        """Запуск дополнительных аккаунтов (неавторизованные пропускаются)"""
+        for account in self.accounts.values():
+            if account is self.main:
+                continue
+            if await account.start():
+                await account.load_peer_cache()
+    
+    async def stop(self):
+        """Остановка всех аккаунтов"""
+        for account in self.accounts.values():
+            if account.is_running or account.client.is_connected():
+                await account.stop()
+    
+    def get(self, name: str):
+        """Получение аккаунта по имени"""
+        return self.accounts.get(name)
+    
+    def healthy(self) -> list:
+        """Список работоспособных аккаунтов"""
+        return [account for account in self.accounts.values() if account.is_healthy()]
+    
+    def get_status(self) -> list:
+        """
+        Состояние аккаунтов для API
+        
+        Returns:
+            Список словарей с именем, состоянием и последней ошибкой аккаунта
+        """
+        return [
+            {
+                'name': account.name,
+                'authorized': account.is_authorized,
+                'healthy': account.is_healthy(),
+                'last_error': account.last_error
+            }
+            for account in self.accounts.values()
+        ]
+
+
 # Глобальный экземпляр клиента
 telegram_client = TelegramClientManager()
+
+# Пул аккаунтов (основной + дополнительные)
+accounts = AccountPool(telegram_client, EXTRA_SESSIONS)
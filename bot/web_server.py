@@ -2,11 +2,13 @@
 Веб-сервер для управления системой публикации постов
 """
 import asyncio
+import concurrent.futures
 import json
 import logging
-from datetime import datetime, timedelta
+import queue
+import re
 from pathlib import Path
-from flask import Flask, render_template, jsonify, request, session, redirect, url_for, send_from_directory
+from flask import Flask, Response, render_template, jsonify, request, session, redirect, url_for, send_from_directory, stream_with_context
 from flask_cors import CORS
 from functools import wraps
 from threading import Thread
@@ -19,12 +21,17 @@ import pytz
 # Московский часовой пояс
 MOSCOW_TZ = pytz.timezone('Europe/Moscow')
 
-from config import ADMIN_ID, API_ID, API_HASH, SESSION_FILE, WEB_PASSWORD
+from config import (
+    WEB_PASSWORD, POST_IMAGE_FILE, WEB_ASYNC_TIMEOUT,
+    GROUP_IMPORT_MAX_ITEMS, WEB_EVENTS_KEEPALIVE
+)
 from db import db
+from events import events
 from scheduler import PostScheduler
-from telegram_client import telegram_client
+from telegram_client import telegram_client, accounts, ChatLookupError
 from handlers.post import PostHandler
-from telethon import TelegramClient
+from handlers.template import RenderContext, compile_template, validate_template
+from handlers.groups import validate_group_input, username_from_input, import_groups, dialog_discovery
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +43,8 @@ CORS(app)
 scheduler = None
 post_handler = None
 telegram_connected = False
-web_telegram_client = None
+# Event loop, в котором выполняются корутины веб-запросов (основной loop из main.py)
+main_loop = None
 
 def set_scheduler(scheduler_instance):
     """Установка экземпляра планировщика из main.py"""
@@ -44,6 +52,11 @@ def set_scheduler(scheduler_instance):
     scheduler = scheduler_instance
     logger.info("Планировщик установлен из main.py")
 
+def set_main_loop(loop):
+    """Установка основного event loop из main.py (в нем работают клиенты Telegram)"""
+    global main_loop
+    main_loop = loop
+
 def login_required(f):
     """Декоратор для защиты endpoints от несанкционированного доступа"""
     @wraps(f)
@@ -53,166 +66,69 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def validate_group_input(group_input):
+def _get_loop():
     """
-    Валидация и санитизация входных данных для группы/канала
+    Event loop для корутин веб-запросов
     
-    Args:
-        group_input: Входная строка (username, ID, ссылка)
-        
-    Returns:
-        tuple: (is_valid, sanitized_input, error_message)
+    Обычно это основной loop из main.py. Если веб-сервер запущен отдельно,
+    один раз создается фоновый loop в отдельном потоке.
     """
-    if not group_input or not isinstance(group_input, str):
-        return False, None, "Пустой ввод"
-    
-    # Удаляем пробелы
-    group_input = group_input.strip()
-    
-    if not group_input:
-        return False, None, "Пустой ввод"
-    
-    # Проверяем длину
-    if len(group_input) > 255:
-        return False, None, "Слишком длинный ввод (максимум 255 символов)"
-    
-    # Проверяем формат: username, ID или ссылка
-    # Username: @username или username
-    # ID: числовой ID (может быть отрицательным для групп)
-    # Ссылка: https://t.me/username или t.me/username
-    
-    # Очищаем от потенциально опасных символов
-    dangerous_chars = ['<', '>', '"', "'", '&', '\n', '\r']
-    for char in dangerous_chars:
-        if char in group_input:
-            return False, None, f"Недопустимый символ: {char}"
-    
-    # Нормализуем username (убираем @ если есть)
-    if group_input.startswith('@'):
-        sanitized = group_input[1:]
-    elif group_input.startswith('https://t.me/'):
-        sanitized = group_input.replace('https://t.me/', '').strip()
-    elif group_input.startswith('t.me/'):
-        sanitized = group_input.replace('t.me/', '').strip()
-    elif group_input.startswith('http://t.me/'):
-        sanitized = group_input.replace('http://t.me/', '').strip()
-    else:
-        # Проверяем, является ли это числовым ID
-        try:
-            int(group_input)
-            sanitized = group_input
-        except ValueError:
-            # Если не число, считаем что это username без @
-            sanitized = group_input
-    
-    # Проверяем формат username (только буквы, цифры, подчеркивание)
-    if sanitized and not sanitized.startswith('-') and not sanitized.lstrip('-').isdigit():
-        if not all(c.isalnum() or c == '_' for c in sanitized):
-            return False, None, "Недопустимый формат username (только буквы, цифры и подчеркивание)"
-    
-    return True, sanitized, None
+    global main_loop
+    if main_loop is None or main_loop.is_closed():
+        loop = asyncio.new_event_loop()
+        Thread(target=loop.run_forever, name='web-event-loop', daemon=True).start()
+        main_loop = loop
+    return main_loop
 
-def run_async(coro):
-    """Запуск асинхронной функции"""
-    import concurrent.futures
-    import threading
+def submit_async(coro):
+    """
+    Запуск корутины в основном event loop без ожидания результата
     
-    # Создаем новый event loop в отдельном потоке
-    def run_in_thread():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(coro)
-        finally:
-            loop.close()
+    Returns:
+        concurrent.futures.Future с результатом корутины
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_loop())
     
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future = executor.submit(run_in_thread)
-        return future.result()
-
-def get_chat_info_sync(chat_identifier):
-    """Синхронное получение информации о чате через основной клиент"""
-    import subprocess
-    import json
-    import tempfile
-    import os
+    def log_error(done):
+        if not done.cancelled() and done.exception():
+            logger.error(f"Ошибка фоновой операции: {done.exception()}")
     
-    # Создаем временный скрипт для получения информации о чате
-    script_content = f"""
-import asyncio
-import sys
-import os
-sys.path.append('/app/bot')
-from telethon import TelegramClient
-from config import API_ID, API_HASH, SESSION_FILE
+    future.add_done_callback(log_error)
+    return future
 
-async def get_chat():
-    # Создаем отдельную сессию для веб-клиента
-    web_session_file = str(SESSION_FILE).replace('.session', '_web.session')
-    client = TelegramClient(web_session_file, API_ID, API_HASH)
-    await client.connect()
-    
-    # Проверяем, авторизован ли клиент
-    if not await client.is_user_authorized():
-        # Если не авторизован, копируем данные из основной сессии
-        import shutil
-        try:
-            shutil.copy2(str(SESSION_FILE), web_session_file)
-            await client.disconnect()
-            client = TelegramClient(web_session_file, API_ID, API_HASH)
-            await client.connect()
-        except Exception as e:
-            print(f"Ошибка копирования сессии: {{e}}")
-            return {{"success": False, "error": f"Ошибка авторизации: {{e}}"}}
+def run_async(coro, timeout=WEB_ASYNC_TIMEOUT):
+    """
+    Выполнение корутины в основном event loop с ожиданием результата
     
+    Args:
+        coro: Корутина
+        timeout: Максимальное время ожидания (секунды)
+        
+    Returns:
+        Результат корутины
+        
+    Raises:
+        concurrent.futures.TimeoutError: Если корутина не завершилась за timeout (она отменяется)
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_loop())
     try:
-        chat = await client.get_entity("{chat_identifier}")
-        result = {{
-            "success": True,
-            "chat_id": str(chat.id),
-            "title": getattr(chat, 'title', 'Unknown'),
-            "chat_type": type(chat).__name__
-        }}
-    except Exception as e:
-        result = {{
-            "success": False,
-            "error": str(e)
-        }}
-    finally:
-        await client.disconnect()
-    
-    print(json.dumps(result))
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
 
-if __name__ == "__main__":
-    import json
-    asyncio.run(get_chat())
-"""
+def get_chat_info_sync(chat_identifier):
+    """
+    Синхронное получение информации о чате через уже подключенный основной клиент
+    (сначала кэш peer'ов, затем один запрос к Telegram)
     
-    # Записываем скрипт во временный файл
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-        f.write(script_content)
-        script_path = f.name
+    Returns:
+        Кортеж (chat_id, title, chat_type) или None, если чат не найден
     
-    try:
-        # Запускаем скрипт
-        result = subprocess.run([
-            'python', script_path
-        ], capture_output=True, text=True, cwd='/app/bot')
-        
-        if result.returncode == 0:
-            data = json.loads(result.stdout.strip())
-            if data['success']:
-                return (data['chat_id'], data['title'], data['chat_type'])
-            else:
-                logger.error(f"Ошибка получения информации о чате {chat_identifier}: {data['error']}")
-                return None
-        else:
-            logger.error(f"Ошибка выполнения скрипта: {result.stderr}")
-            return None
-            
-    finally:
-        # Удаляем временный файл
-        os.unlink(script_path)
+    Raises:
+        ChatLookupError: Ограничение частоты запросов или нет соединения с Telegram
+    """
+    return run_async(telegram_client.get_chat_info(chat_identifier))
 
 def _format_timestamp(timestamp):
     """Форматирование временной метки в московском часовом поясе"""
@@ -258,10 +174,12 @@ def init_web_server():
     # Инициализируем компоненты только если они еще не установлены
     if scheduler is None:
         scheduler = PostScheduler()
+        run_async(scheduler.post_handler.load_post_content())
         logger.info("Создан новый экземпляр планировщика в web_server")
     
     if post_handler is None:
         post_handler = PostHandler()
+        run_async(post_handler.load_post_content())
     
     # Проверяем подключение к Telegram
     telegram_connected = telegram_client.is_connected()
@@ -336,12 +254,15 @@ def api_login():
 def api_status():
     """API для получения статуса системы"""
     try:
-        # Получаем информацию о группах
-        groups = run_async(db.get_all_groups())
-        groups_count = len(groups)
+        # Количество групп (из реестра групп в памяти)
+        if not db.groups.loaded:
+            run_async(db.get_all_groups())
+        groups_count = db.groups.count()
         
-        # Получаем интервал публикации в минутах
-        interval_minutes = run_async(db.get_post_interval_minutes())
+        # Получаем интервал публикации в минутах (из кэша настроек, без обращения к БД)
+        interval_minutes = db.post_interval_minutes
+        if interval_minutes is None:
+            interval_minutes = run_async(db.get_post_interval_minutes())
         
         # Форматируем интервал для отображения
         if interval_minutes < 60:
@@ -371,7 +292,7 @@ def api_status():
             if status_info['next_run']:
                 # Конвертируем UTC время в московское время для отображения
                 next_run_time = status_info['next_run']
-                logger.info(f"Next run time: {next_run_time}, type: {type(next_run_time)}")
+                logger.debug(f"Next run time: {next_run_time}, type: {type(next_run_time)}")
                 
                 # Конвертируем в московское время
                 if hasattr(next_run_time, 'astimezone'):
@@ -383,7 +304,7 @@ def api_status():
                     utc_time = next_run_time.replace(tzinfo=timezone.utc)
                     moscow_time = utc_time.astimezone(MOSCOW_TZ)
                 
-                logger.info(f"Moscow time: {moscow_time}")
+                logger.debug(f"Moscow time: {moscow_time}")
                 # Форматируем время в московском часовом поясе
                 next_run = moscow_time.strftime('%d.%m.%Y %H:%M:%S')
         
@@ -398,24 +319,70 @@ def api_status():
             'scheduler_status': scheduler_status,
             'next_run': next_run,
             'post_info': post_info,
-            'publication_status': publication_status
+            'publication_status': publication_status,
+            'accounts': accounts.get_status()
         })
     except Exception as e:
         logger.error(f"Ошибка получения статуса: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/events')
+@login_required
+def api_events():
+    """
+    Поток событий для панели управления (Server-Sent Events)
+    
+    События: publication - статус публикации, run_finished - итоги завершенного
+    запуска, groups - новая версия реестра групп, status - изменилось состояние
+    планировщика. Сразу после подключения отправляется последнее событие каждого
+    типа, дальше - только новые. Данные берутся из общего снимка, поэтому
+    подписчики не обращаются к базе данных.
+    """
+    def generate():
+        # Переподключение браузера через 3 секунды после обрыва
+        yield 'retry: 3000\n\n'
+        version = 0
+        while True:
+            version, changed = events.wait(version, timeout=WEB_EVENTS_KEEPALIVE)
+            if not changed:
+                yield ': keepalive\n\n'
+                continue
+            for event, data in changed:
+                yield f'event: {event}\ndata: {app.json.dumps(data)}\n\n'
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Отключаем буферизацию ответа в nginx
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/groups')
 @login_required
 def api_groups():
-    """API для получения списка групп"""
+    """
+    API для получения списка групп
+    
+    Параметры: search - поиск по названию и username; since - версия реестра групп,
+    известная клиенту (возвращаются только изменения после нее)
+    """
     try:
-        groups = run_async(db.get_all_groups())
+        search = request.args.get('search', default='', type=str).strip()
+        since = request.args.get('since', type=int)
+        changes = None
+        if search:
+            groups = run_async(db.search_groups(search))
+        else:
+            if not db.groups.loaded:
+                run_async(db.get_all_groups())
+            changes = db.groups.changes_since(since)
+            groups = changes['groups']
+        # last_post - время последней публикации в секундах Unix (форматирует клиент)
         groups_data = []
         
-        logger.info(f"Получены группы из БД: {groups}")
+        logger.debug(f"Получены группы из БД: {groups}")
         
         for group in groups:
-            logger.info(f"Обрабатываем группу: {group}, тип: {type(group)}, длина: {len(group) if hasattr(group, '__len__') else 'N/A'}")
+            logger.debug(f"Обрабатываем группу: {group}, тип: {type(group)}, длина: {len(group) if hasattr(group, '__len__') else 'N/A'}")
             
             if isinstance(group, (list, tuple)) and len(group) >= 6:
                 # База данных возвращает: (chat_id, title, username, added_at, last_posted, is_disabled)
@@ -424,7 +391,7 @@ def api_groups():
                     'id': chat_id,
                     'title': title,
                     'username': username,
-                    'last_post': _format_timestamp(last_post_time),
+                    'last_post': last_post_time,
                     'is_disabled': bool(is_disabled)
                 })
             elif isinstance(group, (list, tuple)) and len(group) >= 5:
@@ -434,7 +401,7 @@ def api_groups():
                     'id': chat_id,
                     'title': title,
                     'username': username,
-                    'last_post': _format_timestamp(last_post_time),
+                    'last_post': last_post_time,
                     'is_disabled': False
                 })
             elif isinstance(group, (list, tuple)) and len(group) >= 4:
@@ -444,7 +411,7 @@ def api_groups():
                     'id': chat_id,
                     'title': title,
                     'username': None,
-                    'last_post': _format_timestamp(last_post_time)
+                    'last_post': last_post_time
                 })
             elif isinstance(group, (list, tuple)) and len(group) >= 3:
                 # Fallback для старого формата
@@ -452,7 +419,7 @@ def api_groups():
                 groups_data.append({
                     'id': chat_id,
                     'title': title,
-                    'last_post': _format_timestamp(last_post_time)
+                    'last_post': last_post_time
                 })
             elif isinstance(group, (list, tuple)) and len(group) > 0:
                 # Обработка случая, когда в группе меньше 3 элементов
@@ -462,17 +429,21 @@ def api_groups():
                 groups_data.append({
                     'id': chat_id,
                     'title': title,
-                    'last_post': _format_timestamp(last_post_time)
+                    'last_post': last_post_time
                 })
             else:
                 logger.warning(f"Неожиданный формат группы: {group}")
                 groups_data.append({
                     'id': "unknown",
                     'title': "Unknown",
-                    'last_post': "Никогда"
+                    'last_post': None
                 })
         
-        return jsonify({'groups': groups_data})
+        response = {'groups': groups_data}
+        if changes:
+            # full=False: в groups только измененные группы, removed - id удаленных
+            response.update(version=changes['version'], full=changes['full'], removed=changes['removed'])
+        return jsonify(response)
     except Exception as e:
         logger.error(f"Ошибка получения групп: {e}")
         return jsonify({'error': str(e)}), 500
@@ -504,21 +475,15 @@ def api_add_group():
             chat_id, title, chat_type = result
             logger.info(f"Найден чат: ID={chat_id}, Title={title}, Type={chat_type}")
             
+        except ChatLookupError as e:
+            logger.warning(f"Не удалось проверить чат '{group_input}': {e}")
+            return jsonify({'error': str(e)}), 503
         except Exception as e:
             logger.error(f"Ошибка при получении информации о чате '{group_input}': {e}")
             return jsonify({'error': f'Ошибка при получении информации о чате: {str(e)}'}), 400
         
-        # Добавляем группу в базу данных
-        # Извлекаем username из sanitized_input если это username (не числовой ID)
-        username = None
-        # Проверяем, является ли sanitized_input числовым ID
-        try:
-            int(sanitized_input.lstrip('-'))
-            # Это числовой ID, username будет None
-            username = None
-        except ValueError:
-            # Это не числовой ID, значит это username
-            username = '@' + sanitized_input if not sanitized_input.startswith('@') else sanitized_input
+        # Добавляем группу в базу данных (username - если ввод не числовой ID)
+        username = username_from_input(sanitized_input)
         
         success = run_async(db.add_group(chat_id, title, username))
         
@@ -539,6 +504,98 @@ def api_add_group():
         logger.error(f"Ошибка добавления группы: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/groups/import', methods=['POST'])
+@login_required
+def api_import_groups():
+    """
+    API для массового добавления групп
+    
+    Принимает JSON {"items": [...]} или файл (поле file) со списком username, ID
+    и ссылок t.me (через перевод строки, пробел, запятую или точку с запятой).
+    Результаты по каждому элементу передаются по мере готовности строками JSON
+    (application/x-ndjson), последняя строка - итоги с type=done.
+    """
+    try:
+        if 'file' in request.files:
+            text = request.files['file'].read().decode('utf-8', errors='replace')
+            items = re.split(r'[\s,;]+', text)
+        else:
+            data = request.get_json(silent=True) or {}
+            items = data.get('items') or []
+            if isinstance(items, str):
+                items = re.split(r'[\s,;]+', items)
+        items = [str(item).strip() for item in items if str(item).strip()]
+        
+        if not items:
+            return jsonify({'error': 'Список групп пуст'}), 400
+        if len(items) > GROUP_IMPORT_MAX_ITEMS:
+            return jsonify({'error': f'Слишком много элементов (максимум {GROUP_IMPORT_MAX_ITEMS})'}), 400
+        
+        # Импорт выполняется в основном event loop, результаты передаются через очередь
+        results = queue.Queue()
+        future = submit_async(import_groups(items, results.put))
+        logger.info(f"Запущено массовое добавление групп: {len(items)} элементов")
+        
+        def generate():
+            while True:
+                try:
+                    result = results.get(timeout=1)
+                except queue.Empty:
+                    if not future.done():
+                        continue
+                    # Импорт мог завершиться сразу после истечения ожидания:
+                    # сначала отдаем строки, оставшиеся в очереди
+                    try:
+                        result = results.get_nowait()
+                    except queue.Empty:
+                        error = 'отменено' if future.cancelled() else future.exception()
+                        if error is not None:
+                            yield json.dumps({'type': 'error', 'error': str(error)}, ensure_ascii=False) + '\n'
+                        return
+                yield json.dumps(result, ensure_ascii=False) + '\n'
+                if result['type'] == 'done':
+                    return
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+    except Exception as e:
+        logger.error(f"Ошибка массового добавления групп: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/groups/discover', methods=['POST'])
+@login_required
+def api_discover_groups():
+    """
+    API для запуска поиска групп среди диалогов аккаунта
+    
+    Параметры JSON: types - типы чатов (group, megagroup, channel), min_members -
+    минимальное число участников, title_pattern - регулярное выражение для названия
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            started = run_async(dialog_discovery.start(
+                types=data.get('types') or ('group', 'megagroup'),
+                min_members=int(data.get('min_members') or 0),
+                title_pattern=(data.get('title_pattern') or '').strip() or None
+            ))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if not started:
+            return jsonify({'error': 'Поиск групп уже выполняется', 'progress': dialog_discovery.get_progress()}), 409
+        return jsonify({'success': True, 'message': 'Поиск групп запущен', 'progress': dialog_discovery.get_progress()})
+        
+    except Exception as e:
+        logger.error(f"Ошибка запуска поиска групп: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/groups/discover', methods=['GET'])
+@login_required
+def api_discover_groups_progress():
+    """API для получения хода поиска групп среди диалогов"""
+    return jsonify({'progress': dialog_discovery.get_progress()})
+
 @app.route('/api/groups/<chat_id>', methods=['DELETE'])
 @login_required
 def api_remove_group(chat_id):
@@ -621,8 +678,8 @@ def api_post_now():
         if not scheduler:
             return jsonify({'error': 'Планировщик не инициализирован'}), 500
         
-        # Запускаем публикацию
-        run_async(scheduler.post_now())
+        # Запускаем публикацию в фоне (ответ не ждет окончания рассылки)
+        submit_async(scheduler.post_now())
         
         return jsonify({'success': True, 'message': 'Публикация запущена'})
         
@@ -638,26 +695,8 @@ def api_start_scheduler():
         if not scheduler:
             return jsonify({'error': 'Планировщик не инициализирован'}), 500
         
-        # Запускаем планировщик в отдельном потоке с постоянным event loop
-        import threading
-        def start_scheduler_thread():
-            try:
-                # Создаем новый event loop для планировщика
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                # Запускаем планировщик
-                loop.run_until_complete(scheduler.start())
-                
-                # Запускаем event loop постоянно, чтобы планировщик мог работать
-                loop.run_forever()
-            except Exception as e:
-                logger.error(f"Ошибка в потоке планировщика: {e}")
-                import traceback
-                logger.error(traceback.format_exc())
-        
-        thread = threading.Thread(target=start_scheduler_thread, daemon=True)
-        thread.start()
+        # Планировщик работает в основном event loop (там же, где клиенты Telegram)
+        run_async(scheduler.start())
         
         return jsonify({'success': True, 'message': 'Планировщик запущен'})
         
@@ -693,12 +732,12 @@ def api_reload_post():
         logger.info("Начинаем перезагрузку поста...")
         
         # Перезагружаем пост в веб-сервере
-        post_handler._load_post_content()
+        run_async(post_handler.load_post_content())
         post_info = post_handler.get_post_info()
         
         # Перезагружаем пост в планировщике (если он есть)
         if scheduler:
-            scheduler.reload_post()
+            run_async(scheduler.reload_post())
             logger.info("Пост перезагружен и в планировщике")
         
         logger.info(f"Пост успешно перезагружен: {post_info}")
@@ -732,6 +771,20 @@ def api_reset_publication_status():
         logger.error(f"Ошибка сброса статуса публикации: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/rate_limiter', methods=['GET'])
+@login_required
+def api_rate_limiter():
+    """API для получения состояния ограничителей частоты запросов к Telegram (по аккаунтам)"""
+    try:
+        return jsonify({
+            'success': True,
+            'rate_limiter': {name: account.limiter.get_state() for name, account in accounts.accounts.items()}
+        })
+        
+    except Exception as e:
+        logger.error(f"Ошибка получения состояния ограничителя: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/publication_history', methods=['GET'])
 @login_required
 def api_publication_history():
@@ -740,24 +793,33 @@ def api_publication_history():
         # Получаем параметры фильтрации
         limit = request.args.get('limit', default=100, type=int)
         offset = request.args.get('offset', default=0, type=int)
-        chat_id = request.args.get('chat_id', default=None, type=str)
-        status = request.args.get('status', default=None, type=str)
-        start_date = request.args.get('start_date', default=None, type=str)
-        end_date = request.args.get('end_date', default=None, type=str)
-        search = request.args.get('search', default=None, type=str)
-        
-        # Получаем историю
-        history = run_async(db.get_publication_history(
-            limit=limit,
-            offset=offset,
-            chat_id=chat_id,
-            status=status,
-            start_date=start_date,
-            end_date=end_date,
-            search=search
-        ))
+        cursor = request.args.get('cursor', default=None, type=str)
+        filters = {
+            'chat_id': request.args.get('chat_id', default=None, type=str),
+            'status': request.args.get('status', default=None, type=str),
+            'start_date': request.args.get('start_date', default=None, type=str),
+            'end_date': request.args.get('end_date', default=None, type=str),
+            'search': request.args.get('search', default=None, type=str)
+        }
+        
+        next_cursor = prev_cursor = None
+        if offset and not cursor:
+            # Старый режим со смещением (глубокие страницы читаются медленно)
+            history = run_async(db.get_publication_history(limit=limit, offset=offset, **filters))
+        else:
+            # Постраничный вывод по курсору: next_cursor/prev_cursor передаются в параметре cursor
+            try:
+                page = run_async(db.get_publication_history_page(limit=limit, cursor=cursor, **filters))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            history = page['records']
+            next_cursor = page['next_cursor']
+            prev_cursor = page['prev_cursor']
+        
+        # Количество записей по фильтрам (без учета страницы)
+        count = run_async(db.count_publication_history(**filters))
         
-        # Форматируем данные для ответа
+        # Форматируем данные для ответа (published_at - секунды Unix, форматирует клиент)
         history_data = []
         for record in history:
             id, chat_id_val, chat_title, chat_username, status_val, error_message, published_at, retry_count = record
@@ -768,14 +830,17 @@ def api_publication_history():
                 'chat_username': chat_username,
                 'status': status_val,
                 'error_message': error_message,
-                'published_at': _format_timestamp(published_at),
+                'published_at': published_at,
                 'retry_count': retry_count
             })
         
         return jsonify({
             'success': True,
             'history': history_data,
-            'total': len(history_data)
+            'total': count['total'],
+            'total_exact': count['exact'],
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor
         })
         
     except Exception as e:
@@ -840,14 +905,16 @@ def api_get_templates():
         
         templates_data = []
         for template in templates:
-            id, name, content, is_active, created_at, updated_at = template
+            id, name, content, is_active, created_at, updated_at, is_valid, validation = template
             templates_data.append({
                 'id': id,
                 'name': name,
                 'content': content,
                 'is_active': bool(is_active),
                 'created_at': _format_timestamp(created_at),
-                'updated_at': _format_timestamp(updated_at)
+                'updated_at': _format_timestamp(updated_at),
+                'is_valid': bool(is_valid),
+                'validation': json.loads(validation) if validation else None
             })
         
         return jsonify({
@@ -872,10 +939,12 @@ def api_create_template():
         template_id = run_async(db.add_post_template(data['name'], data['content']))
         
         if template_id:
+            validation = run_async(db.get_template_validation(template_id))
             return jsonify({
                 'success': True,
                 'message': 'Шаблон создан',
-                'template_id': template_id
+                'template_id': template_id,
+                'validation': validation
             })
         else:
             return jsonify({'error': 'Ошибка при создании шаблона'}), 500
@@ -899,11 +968,13 @@ def api_update_template(template_id):
         if success:
             # Перезагружаем пост, если это активный шаблон
             if post_handler:
-                post_handler.reload_post_content()
+                run_async(post_handler.reload_post_content())
             
+            validation = run_async(db.get_template_validation(template_id))
             return jsonify({
                 'success': True,
-                'message': 'Шаблон обновлен'
+                'message': 'Шаблон обновлен',
+                'validation': validation
             })
         else:
             return jsonify({'error': 'Ошибка при обновлении шаблона'}), 500
@@ -941,7 +1012,7 @@ def api_activate_template(template_id):
         if success:
             # Перезагружаем пост
             if post_handler:
-                post_handler.reload_post_content()
+                run_async(post_handler.reload_post_content())
             
             return jsonify({
                 'success': True,
@@ -1198,14 +1269,13 @@ def api_preview_template():
         data = request.get_json() or {}
         content = data.get('content', '')
         
-        # Создаем временный экземпляр для замены переменных
-        from handlers.post import PostHandler
-        temp_handler = PostHandler()
-        preview_text = temp_handler._replace_variables(content, '123456789', 'Тестовая группа')
+        # Переменные подставляются для тестовой группы
+        preview_text = compile_template(content).render(RenderContext(), '123456789', 'Тестовая группа')
         
         return jsonify({
             'success': True,
-            'preview': preview_text
+            'preview': preview_text,
+            'validation': validate_template(content, POST_IMAGE_FILE.exists())
         })
         
     except Exception as e: